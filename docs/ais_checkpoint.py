@@ -0,0 +1,178 @@
+"""
+AIS Processing Checkpoints
+SQLite store of per-file progress shared by process_ais_data.py and
+noaa_ais_downloader.py. Besides "this file is done" it records, while a file
+is being read, the decompressed byte offset and row count reached, the
+segments completed and the unique vessels found so far, so a run that dies at
+row 6M of a 7M-row day resumes at the last segment instead of the first row.
+
+Every update is one SQLite transaction (WAL journal), so a crash leaves either
+the previous checkpoint or the new one. Each file carries a fingerprint; if
+the file on disk no longer matches, its progress is discarded.
+"""
+
+import io
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+import pandas as pd
+
+CHECKPOINT_DB = os.path.join(os.path.dirname(__file__), 'ais_checkpoints.sqlite')
+
+# Bytes hashed from each end of a file for its fingerprint
+FINGERPRINT_BYTES = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job TEXT NOT NULL,
+    name TEXT NOT NULL,
+    fingerprint TEXT,
+    status TEXT NOT NULL DEFAULT 'in_progress',
+    byte_offset INTEGER NOT NULL DEFAULT 0,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    segments_done INTEGER NOT NULL DEFAULT 0,
+    vessels TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job, name)
+)
+"""
+
+
+def file_fingerprint(path: str) -> str:
+    """Size plus SHA-256 of the first and last MiB (cheap on multi-GB days, catches replaced files)"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(f.read(FINGERPRINT_BYTES))
+    return f"{size}:{digest.hexdigest()}"
+
+
+class Checkpoint:
+    """Progress of one file: where to resume and what was found before that point"""
+
+    def __init__(self, byte_offset: int = 0, rows_done: int = 0, segments_done: int = 0,
+                 vessels: pd.DataFrame = None):
+        self.byte_offset = byte_offset
+        self.rows_done = rows_done
+        self.segments_done = segments_done
+        self.vessels = vessels if vessels is not None else pd.DataFrame()
+
+
+class CheckpointStore:
+    """
+    Per-job file progress.
+
+        store = CheckpointStore('process_ais_data', legacy_file=TRACKING_FILE)
+        if not store.is_done(name):
+            checkpoint = store.resume(name, fingerprint)
+            ...store.save_progress(name, fingerprint, offset, rows, segments, vessels)...
+            store.mark_done(name, fingerprint)
+
+    legacy_file is a JSON list of finished names (the old processed_files.json /
+    noaa_processed_urls.json); it is imported once when the job has no rows yet.
+
+    A store may be used from another thread than the one that opened it (the
+    threaded pipeline saves progress from its dedup stage); calls are serialized.
+    """
+
+    def __init__(self, job: str, path: str = CHECKPOINT_DB, legacy_file: str = None):
+        self.job = job
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute(SCHEMA)
+        if legacy_file:
+            self._import_legacy(legacy_file)
+
+    def close(self):
+        self._conn.close()
+
+    def _import_legacy(self, legacy_file: str):
+        """Seed finished files from an old JSON tracking list (only for a job with no rows)"""
+        if not os.path.exists(legacy_file):
+            return
+        if self._conn.execute('SELECT 1 FROM checkpoints WHERE job = ? LIMIT 1', (self.job,)).fetchone():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                names = json.load(f)
+        except Exception as e:
+            print(f"  [Warning] Could not import {os.path.basename(legacy_file)}: {e}")
+            return
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO checkpoints (job, name, status, updated_at) VALUES (?, ?, 'done', ?)",
+                [(self.job, name, now) for name in names],
+            )
+        print(f"Imported {len(names)} finished files from {os.path.basename(legacy_file)}")
+
+    def done(self) -> set:
+        """Names of every finished file"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM checkpoints WHERE job = ? AND status = 'done'", (self.job,))
+            return {name for (name,) in rows}
+
+    def is_done(self, name: str) -> bool:
+        with self._lock:
+            row = self._conn.execute('SELECT status FROM checkpoints WHERE job = ? AND name = ?',
+                                     (self.job, name)).fetchone()
+        return row is not None and row[0] == 'done'
+
+    def resume(self, name: str, fingerprint: str = None) -> Checkpoint:
+        """Saved progress for an unfinished file, or a fresh Checkpoint (also when the file changed)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, byte_offset, rows_done, segments_done, vessels FROM checkpoints "
+                "WHERE job = ? AND name = ? AND status = 'in_progress'", (self.job, name)).fetchone()
+        if row is None:
+            return Checkpoint()
+        saved_fingerprint, byte_offset, rows_done, segments_done, vessels = row
+        if fingerprint and saved_fingerprint and fingerprint != saved_fingerprint:
+            print(f"  {name} changed since its last checkpoint; starting over")
+            self.discard(name)
+            return Checkpoint()
+        frame = pd.read_json(io.StringIO(vessels), orient='split', dtype=False) if vessels else None
+        return Checkpoint(byte_offset, rows_done, segments_done, frame)
+
+    def save_progress(self, name: str, fingerprint: str, byte_offset: int, rows_done: int,
+                      segments_done: int, vessels: pd.DataFrame):
+        """Record the position reached and the unique vessels found up to it (one transaction)"""
+        payload = vessels.to_json(orient='split', index=False) if vessels is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO checkpoints (job, name, fingerprint, status, byte_offset, rows_done, segments_done, "
+                "vessels, updated_at) VALUES (?, ?, ?, 'in_progress', ?, ?, ?, ?, ?) "
+                "ON CONFLICT (job, name) DO UPDATE SET fingerprint = excluded.fingerprint, status = 'in_progress', "
+                "byte_offset = excluded.byte_offset, rows_done = excluded.rows_done, "
+                "segments_done = excluded.segments_done, vessels = excluded.vessels, updated_at = excluded.updated_at",
+                (self.job, name, fingerprint, byte_offset, rows_done, segments_done, payload, time.time()),
+            )
+
+    def mark_done(self, names, fingerprint: str = None):
+        """Mark one file (or a list of files) finished and drop their partial results"""
+        if isinstance(names, str):
+            names = [names]
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO checkpoints (job, name, fingerprint, status, updated_at) VALUES (?, ?, ?, 'done', ?) "
+                "ON CONFLICT (job, name) DO UPDATE SET status = 'done', vessels = NULL, "
+                "fingerprint = COALESCE(excluded.fingerprint, checkpoints.fingerprint), updated_at = excluded.updated_at",
+                [(self.job, name, fingerprint, now) for name in names],
+            )
+
+    def discard(self, name: str):
+        """Forget a file's progress so it is read from the start"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM checkpoints WHERE job = ? AND name = ?', (self.job, name))
@@ -0,0 +1,205 @@
+"""
+NOAA AIS Download Scheduler
+Fetches daily .csv.zst archives into a local spool with a bounded number of
+concurrent days over one pooled HTTP session. Partial downloads are kept as
+*.part files and resumed with HTTP Range requests, so a dropped connection
+costs only the bytes in flight.
+"""
+
+import os
+import time
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bulk_upsert import RETRY_STATUSES, retry_after
+
+NOAA_BASE_URL = 'https://coast.noaa.gov/htdata/CMSP/AISDataHandler'
+
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), 'ais_spool')
+
+# Concurrent days; NOAA serves single streams well below a typical link's capacity
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+# Bytes per read from the response body
+DOWNLOAD_CHUNK = 1 << 20
+
+# Attempts per day (each attempt resumes where the previous one stopped)
+DOWNLOAD_RETRIES = 6
+
+# Days downloading or spooled but not yet processed, beyond the download workers
+# (one day being processed while every worker keeps downloading)
+SPOOL_HEADROOM = 1
+
+
+def _parse_date(value) -> datetime.date:
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def ais_day_urls(start, end=None, base_url: str = NOAA_BASE_URL):
+    """
+    NOAA daily archive URLs for every day from start to end inclusive, e.g.
+    https://coast.noaa.gov/htdata/CMSP/AISDataHandler/2025/ais-2025-01-01.csv.zst
+    """
+    day = _parse_date(start)
+    last = _parse_date(end) if end else day
+    while day <= last:
+        yield f"{base_url.rstrip('/')}/{day.year}/ais-{day.isoformat()}.csv.zst"
+        day += datetime.timedelta(days=1)
+
+
+def make_session(pool_size: int = DEFAULT_DOWNLOAD_WORKERS) -> requests.Session:
+    """One session shared by all download threads, with a connection pool per host sized to the workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def spool_path(url: str, spool_dir: str = SPOOL_DIR) -> str:
+    """Local spool file for a URL (the archive's own file name)"""
+    return os.path.join(spool_dir, os.path.basename(url.split('?', 1)[0]))
+
+
+def _total_size(response) -> int:
+    """Full object size from Content-Range (206/416) or Content-Length (200); -1 when unknown"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else -1
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else -1
+
+
+def download_day(url: str, session: requests.Session = None, spool_dir: str = SPOOL_DIR,
+                 retries: int = DOWNLOAD_RETRIES, timeout: float = 30) -> str:
+    """
+    Download one archive into the spool and return its path.
+
+    An existing *.part file is resumed with a Range request; servers that ignore
+    Range (200 instead of 206) restart the file. The completed file is renamed into
+    place only after its size matches the advertised total, so a spool file without
+    the .part suffix is always complete.
+
+    5xx and 429 responses are retried like dropped connections (after Retry-After
+    when the server sends one); other 4xx, e.g. a day NOAA has not published, raise
+    requests.HTTPError at once.
+    """
+    session = session or make_session(1)
+    final_path = spool_path(url, spool_dir)
+    if os.path.exists(final_path):
+        return final_path
+    os.makedirs(spool_dir, exist_ok=True)
+    part_path = final_path + '.part'
+
+    last_error = None
+    for attempt in range(retries):
+        wait_s = None
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Nothing left to fetch: the part file already holds the whole object
+                    total = _total_size(response)
+                    if total == offset:
+                        break
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+                if response.status_code == 200:
+                    offset = 0
+                total = _total_size(response)
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for block in response.iter_content(DOWNLOAD_CHUNK):
+                        f.write(block)
+            size = os.path.getsize(part_path)
+            if total < 0 or size == total:
+                break
+            last_error = IOError(f"short read: {size} of {total} bytes")
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is None or (status < 500 and status not in RETRY_STATUSES):
+                raise
+            last_error = e
+            wait_s = retry_after(e.response)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            last_error = e
+        if attempt < retries - 1:
+            time.sleep(wait_s if wait_s is not None else min(2 ** attempt, 30) * 0.5)
+    else:
+        raise IOError(f"Download failed after {retries} attempts: {url} ({last_error})")
+
+    os.replace(part_path, final_path)
+    return final_path
+
+
+def download_days(urls, workers: int = DEFAULT_DOWNLOAD_WORKERS, spool_dir: str = SPOOL_DIR,
+                  session: requests.Session = None, max_spooled: int = None):
+    """
+    Download many days with at most `workers` in flight over one pooled session.
+
+    Yields (url, path, error) as each day finishes, so the caller can process a
+    day while the rest are still downloading. path is None when the day failed.
+
+    At most max_spooled days (default workers + SPOOL_HEADROOM) are downloading
+    or finished but not yet processed. A day keeps its slot until the caller asks
+    for the next one, i.e. until it has processed (and removed) the spooled file,
+    so a slow consumer pauses the downloads instead of filling the disk.
+    """
+    urls = iter(urls)
+    session = session or make_session(workers)
+    limit = max(1, max_spooled or workers + SPOOL_HEADROOM)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {}
+
+        def fill():
+            while len(pending) < limit:
+                url = next(urls, None)
+                if url is None:
+                    return
+                pending[executor.submit(download_day, url, session, spool_dir)] = url
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending[future]
+                try:
+                    path, error = future.result(), None
+                except Exception as e:
+                    path, error = None, e
+                yield url, path, error
+                # Back for the next day: this one has been processed, its slot is free
+                del pending[future]
+                fill()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download NOAA AIS days into the local spool")
+    parser.add_argument('start', help="First day (YYYY-MM-DD)")
+    parser.add_argument('end', nargs='?', help="Last day (YYYY-MM-DD), default: start")
+    parser.add_argument('--workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS, help="Concurrent days")
+    parser.add_argument('--spool-dir', default=SPOOL_DIR)
+    parser.add_argument('--base-url', default=NOAA_BASE_URL)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    total_bytes = 0
+    for url, path, error in download_days(ais_day_urls(args.start, args.end, args.base_url),
+                                          args.workers, args.spool_dir):
+        if error:
+            print(f"  [ERROR] {os.path.basename(url)}: {error}")
+            continue
+        size = os.path.getsize(path)
+        total_bytes += size
+        print(f"  {os.path.basename(path)}: {size / 1e6:.1f} MB")
+    elapsed = time.perf_counter() - started
+    print(f"Downloaded {total_bytes / 1e6:.1f} MB in {elapsed:.1f}s ({total_bytes / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
@@ -0,0 +1,356 @@
+"""
+AIS Streaming Pipeline
+Runs one AIS day through bounded stages, each on its own thread:
+
+    network -> decompress -> parse -> dedup -> upsert
+
+A slow parser no longer stalls the TCP stream and a slow link no longer idles
+the parser, so a day takes roughly max(network, CPU) instead of their sum.
+Socket reads, zstd and the Arrow CSV reader release the GIL, which is what
+lets threads overlap here. Every stage records throughput, busy time and the
+depth of its input queue.
+
+A file on disk can instead be run with checkpoints: it is read in resumable
+segments (ais_reader.iter_cargo_segments, Arrow's native zstd and CSV reader
+on one thread) and the dedup stage saves the offset and the vessels found
+after each segment, so an interrupted day resumes at its last segment:
+
+    segments -> dedup (+ checkpoint) -> upsert
+"""
+
+import io
+import os
+import time
+import queue
+import threading
+
+import pandas as pd
+import zstandard as zstd
+
+from ais_reader import DEFAULT_CHUNKSIZE, iter_cargo_blocks, iter_cargo_segments
+from ais_checkpoint import file_fingerprint
+from vessel_index import VesselIndex
+
+# Bytes per network read and per decompressed block
+NETWORK_CHUNK = 1 << 20
+DECOMPRESS_CHUNK = 1 << 20
+
+# Bounded input queue per stage (items, not bytes: ~1 MB blocks, then parsed frames)
+QUEUE_SIZES = {'decompress': 32, 'parse': 32, 'dedup': 8, 'upsert': 8}
+
+# Parsed segments waiting for dedup in checkpointed runs (each holds the cargo rows of SEGMENT_BYTES of CSV)
+SEGMENT_QUEUE_SIZE = 2
+
+# Cargo rows coalesced per dedup call (Arrow's 1 MB blocks carry only a few thousand,
+# and VesselIndex.add has a fixed per-call cost)
+DEDUP_BATCH_ROWS = 50000
+
+# Vessels handed to the sink per call
+UPSERT_BATCH_ROWS = 5000
+
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+class StageStats:
+    """Counters for one pipeline stage"""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.wait_in_s = 0.0
+        self.wait_out_s = 0.0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.depth_samples = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def busy_s(self) -> float:
+        """Time spent working rather than waiting on either queue"""
+        return max(self.elapsed_s - self.wait_in_s - self.wait_out_s, 0.0)
+
+    def sample_depth(self, depth: int):
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.depth_samples += 1
+
+    def summary(self) -> str:
+        elapsed = max(self.elapsed_s, 1e-9)
+        if self.unit == 'bytes':
+            amount, rate = f"{self.units / 1e6:9.1f} MB", f"{self.units / 1e6 / elapsed:8.1f} MB/s"
+        else:
+            amount, rate = f"{self.units:>9} {self.unit}", f"{self.units / elapsed:8.0f} /s"
+        depth = f"{self.depth_sum / self.depth_samples:5.1f}/{self.depth_max:<3d}" if self.depth_samples else "    -    "
+        return (f"  {self.name:<11}{self.items:>8}{amount:>14}{rate:>16}"
+                f"{self.busy_s / elapsed:>8.0%}{self.wait_in_s:>9.1f}s{self.wait_out_s:>9.1f}s   {depth}")
+
+
+def format_stats(stats: list, elapsed_s: float) -> str:
+    """Per-stage table: items, volume, rate, busy share, time blocked on input/output, input queue avg/max"""
+    lines = [f"  {'stage':<11}{'items':>8}{'volume':>14}{'rate':>16}{'busy':>8}{'wait in':>10}{'wait out':>10}   queue"]
+    lines += [s.summary() for s in stats]
+    lines.append(f"  end-to-end {elapsed_s:.1f}s")
+    return '\n'.join(lines)
+
+
+class _IterReader(io.RawIOBase):
+    """Raw stream over an iterator of byte blocks"""
+
+    def __init__(self, blocks):
+        self._blocks = iter(blocks)
+        self._view = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._view):
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._view = memoryview(block)
+        n = min(len(buffer), len(self._view))
+        buffer[:n] = self._view[:n]
+        self._view = self._view[n:]
+        return n
+
+
+class _Stage(threading.Thread):
+    """
+    One pipeline stage: runs transform(inputs) and forwards every output downstream.
+    Queue waits are polled against the shared abort event so a failure anywhere
+    unwinds every stage instead of leaving threads blocked on a full queue.
+    """
+
+    def __init__(self, name, transform, inbox, outbox, measure, unit, abort):
+        super().__init__(name=f'ais-{name}', daemon=True)
+        self.transform = transform
+        self.inbox = inbox
+        self.outbox = outbox
+        self.measure = measure
+        self.abort = abort
+        self.stats = StageStats(name, unit)
+        self.error = None
+
+    def _get(self):
+        start = time.perf_counter()
+        while True:
+            if self.abort.is_set():
+                raise PipelineAborted()
+            try:
+                item = self.inbox.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        self.stats.wait_in_s += time.perf_counter() - start
+        return item
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while True:
+            if self.abort.is_set():
+                raise PipelineAborted()
+            try:
+                self.outbox.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stats.wait_out_s += time.perf_counter() - start
+
+    def _inputs(self):
+        while True:
+            self.stats.sample_depth(self.inbox.qsize())
+            item = self._get()
+            if item is _DONE:
+                return
+            yield item
+
+    def run(self):
+        self.stats.started = time.perf_counter()
+        try:
+            for out in self.transform(self._inputs() if self.inbox is not None else None):
+                self.stats.items += 1
+                self.stats.units += self.measure(out)
+                if self.outbox is not None:
+                    self._put(out)
+            if self.outbox is not None:
+                self._put(_DONE)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self.error = e
+            self.abort.set()
+        finally:
+            self.stats.finished = time.perf_counter()
+
+
+def run_ais_pipeline(source, sink=None, policy: str = 'first', engine: str = 'auto',
+                     chunksize: int = DEFAULT_CHUNKSIZE, compressed: bool = True,
+                     batch_rows: int = UPSERT_BATCH_ROWS, checkpoints=None, checkpoint_name: str = None):
+    """
+    Stream one AIS day through the threaded pipeline.
+
+    Args:
+        source: Path or binary file-like of (zstd-compressed) CSV, e.g. an HTTP response body
+        sink: Called with each batch DataFrame of vessels (mmsi / vessel_name / imo / ship_type);
+              returns False when the batch failed. None only collects the vessels.
+        policy: VesselIndex dedup policy. With 'first' every vessel is final when first
+                seen, so batches reach the sink while the day is still downloading;
+                other policies hand the whole day to the sink once parsing ends.
+        compressed: False for plain .csv input
+        checkpoints: ais_checkpoint.CheckpointStore; needs a path source, which is then
+                     read in checkpointed segments and resumed from its last checkpoint.
+                     The caller marks the day done once it is satisfied with the result.
+        checkpoint_name: Key of the day in the store (default: the file name)
+
+    Returns (vessels DataFrame, ok, list of StageStats). Errors from any stage are re-raised.
+    """
+    if checkpoints is not None and not isinstance(source, str):
+        raise ValueError("Checkpointed pipeline runs need a file path to resume from")
+    own_source = isinstance(source, str) and checkpoints is None
+    raw = open(source, 'rb') if own_source else source
+    index = VesselIndex(key='vessel_name', policy=policy)
+    emit_new = policy == 'first'
+    ok = [True]
+
+    if checkpoints is not None:
+        checkpoint_name = checkpoint_name or os.path.basename(source)
+        fingerprint = file_fingerprint(source)
+        checkpoint = checkpoints.resume(checkpoint_name, fingerprint)
+        progress = {'rows': checkpoint.rows_done, 'segments': checkpoint.segments_done}
+        if checkpoint.byte_offset:
+            index.add(checkpoint.vessels)
+            print(f"  Resuming after {checkpoint.rows_done} rows ({checkpoint.segments_done} segments, "
+                  f"{len(index)} vessels)")
+
+    def network(_):
+        read = raw.read
+        while True:
+            block = read(NETWORK_CHUNK)
+            if not block:
+                return
+            yield block
+
+    def decompress(blocks):
+        if not compressed:
+            yield from blocks
+            return
+        reader = zstd.ZstdDecompressor().stream_reader(_IterReader(blocks), read_across_frames=True)
+        while True:
+            block = reader.read(DECOMPRESS_CHUNK)
+            if not block:
+                return
+            yield block
+
+    def parse(blocks):
+        stream = io.BufferedReader(_IterReader(blocks), buffer_size=1 << 20)
+        scanned, frames, buffered = 0, [], 0
+        for n_rows, frame in iter_cargo_blocks(stream, chunksize, engine):
+            scanned += n_rows
+            if not frame.empty:
+                frames.append(frame)
+                buffered += len(frame)
+            if buffered >= DEDUP_BATCH_ROWS:
+                yield scanned, pd.concat(frames, ignore_index=True), None
+                scanned, frames, buffered = 0, [], 0
+        if scanned:
+            yield scanned, pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(), None
+
+    def segments(_):
+        for offset, scanned, frame in iter_cargo_segments(source, start=checkpoint.byte_offset,
+                                                          chunksize=chunksize, engine=engine):
+            yield scanned, frame, offset
+
+    def save_progress(offset: int, scanned: int):
+        progress['rows'] += scanned
+        progress['segments'] += 1
+        checkpoints.save_progress(checkpoint_name, fingerprint, offset, progress['rows'], progress['segments'],
+                                  index.to_frame())
+
+    def dedup(chunks):
+        if emit_new and len(index):
+            # Vessels restored from a checkpoint may not have reached the sink before the interruption
+            yield index.to_frame()
+        for scanned, frame, offset in chunks:
+            start = len(index)
+            if not frame.empty:
+                index.add(frame)
+            if offset is not None:
+                save_progress(offset, scanned)
+            if emit_new and len(index) > start:
+                yield index.to_frame(start)
+        if not emit_new and len(index):
+            yield index.to_frame()
+
+    def upsert(frames):
+        pending, rows = [], 0
+
+        def flush():
+            batch = pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True)
+            if sink is not None and sink(batch) is False:
+                ok[0] = False
+            return len(batch)
+
+        for frame in frames:
+            pending.append(frame)
+            rows += len(frame)
+            if rows >= batch_rows:
+                yield flush()
+                pending, rows = [], 0
+        if pending:
+            yield flush()
+
+    abort = threading.Event()
+    if checkpoints is not None:
+        plan = [('segments', segments, 'rows', lambda out: out[0])]
+    else:
+        plan = [
+            ('network', network, 'bytes', len),
+            ('decompress', decompress, 'bytes', len),
+            ('parse', parse, 'rows', lambda out: out[0]),
+        ]
+    plan += [
+        ('dedup', dedup, 'ships', len),
+        ('upsert', upsert, 'ships', int),
+    ]
+    sizes = dict(QUEUE_SIZES, dedup=SEGMENT_QUEUE_SIZE) if checkpoints is not None else QUEUE_SIZES
+    queues = [None] + [queue.Queue(maxsize=sizes[name]) for name, *_ in plan[1:]] + [None]
+    stages = [
+        _Stage(name, transform, queues[i], queues[i + 1], measure, unit, abort)
+        for i, (name, transform, unit, measure) in enumerate(plan)
+    ]
+
+    started = time.perf_counter()
+    try:
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            while stage.is_alive():
+                stage.join(0.5)
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        if own_source:
+            raw.close()
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+
+    stats = [stage.stats for stage in stages]
+    print(format_stats(stats, time.perf_counter() - started))
+    return index.to_frame(), ok[0], stats
@@ -0,0 +1,498 @@
+"""
+AIS CSV Reader
+Column-projected reader for NOAA AIS daily files (.csv.zst).
+Resolves the header once, parses only the identity columns and drops
+non-cargo rows as soon as each block is parsed. A decompressed day can also
+be split on row boundaries so each byte range is parsed independently.
+"""
+
+import os
+import csv
+import io
+import zstandard as zstd
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+# Vessel types for Cargo/Container ships (70-79 inclusive)
+CARGO_TYPE_MIN = 70
+CARGO_TYPE_MAX = 79
+
+# Known header spellings per logical column (union of both AIS scripts)
+COLUMN_ALIASES = {
+    'MMSI': ['MMSI', 'mmsi'],
+    'VesselName': ['VesselName', 'Vessel Name', 'vessel_name', 'NAME', 'name'],
+    'IMO': ['IMO', 'imo'],
+    'VesselType': ['VesselType', 'Vessel Type', 'vessel_type', 'TYPE', 'type'],
+}
+
+# Output column names used by vessel_master
+OUTPUT_NAMES = {
+    'MMSI': 'mmsi',
+    'VesselName': 'vessel_name',
+    'IMO': 'imo',
+    'VesselType': 'ship_type',
+}
+
+# Narrow dtypes for the projected columns (MMSI fits exactly in float64 even with gaps)
+PANDAS_DTYPES = {
+    'MMSI': 'float64',
+    'VesselName': 'str',
+    'IMO': 'str',
+    'VesselType': 'float32',
+}
+
+DEFAULT_CHUNKSIZE = 100000
+# Small Arrow blocks keep peak RSS low without costing throughput
+ARROW_BLOCK_SIZE = 1 << 20
+
+# Decompressed bytes per resumable segment (see iter_cargo_segments)
+SEGMENT_BYTES = 64 << 20
+
+
+def resolve_columns(header: list, targets: dict = None) -> dict:
+    """Map logical column -> raw header name, matching aliases on stripped names"""
+    targets = targets or COLUMN_ALIASES
+    stripped = {c.strip(): c for c in header}
+    actual_cols = {}
+    for target, aliases in targets.items():
+        for alias in aliases:
+            if alias in stripped:
+                actual_cols[target] = stripped[alias]
+                break
+    return actual_cols
+
+
+def open_ais_stream(source):
+    """
+    Open a buffered, decompressed byte stream over an AIS file.
+
+    Args:
+        source: Path to a .csv.zst / .csv file, or a binary file-like object
+                yielding zstd-compressed bytes (e.g. an HTTP response body)
+    """
+    if isinstance(source, str):
+        raw = open(source, 'rb')
+        if not source.endswith('.zst'):
+            return io.BufferedReader(raw)
+    else:
+        raw = source
+    reader = zstd.ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True, closefd=isinstance(source, str)
+    )
+    return io.BufferedReader(reader, buffer_size=1 << 20)
+
+
+def read_header(stream) -> list:
+    """Consume and parse the CSV header line from a buffered byte stream"""
+    line = stream.readline().decode('utf-8-sig').rstrip('\r\n')
+    return next(csv.reader([line]), [])
+
+
+def _iter_pandas(stream, header, actual_cols, chunksize):
+    """Chunked pandas reader over the projected columns"""
+    usecols = list(actual_cols.values())
+    dtypes = {actual_cols[t]: PANDAS_DTYPES[t] for t in actual_cols}
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8')
+    chunk_iter = pd.read_csv(
+        text_stream,
+        header=None,
+        names=list(header),
+        usecols=usecols,
+        dtype=dtypes,
+        chunksize=chunksize,
+    )
+    type_col = actual_cols['VesselType']
+    for chunk in chunk_iter:
+        mask = chunk[type_col].between(CARGO_TYPE_MIN, CARGO_TYPE_MAX)
+        yield len(chunk), chunk[mask]
+
+
+def _iter_arrow(stream, header, actual_cols):
+    """Streaming pyarrow reader; the cargo filter runs on each Arrow batch before pandas conversion"""
+    usecols = list(actual_cols.values())
+    arrow_types = {
+        'MMSI': pa.float64(),
+        'VesselName': pa.string(),
+        'IMO': pa.string(),
+        'VesselType': pa.float32(),
+    }
+    reader = pa_csv.open_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(column_names=list(header), block_size=ARROW_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=usecols,
+            strings_can_be_null=True,
+            column_types={actual_cols[t]: arrow_types[t] for t in actual_cols},
+        ),
+    )
+    type_col = actual_cols['VesselType']
+    for batch in reader:
+        vt = batch.column(type_col)
+        mask = pc.and_(pc.greater_equal(vt, CARGO_TYPE_MIN), pc.less_equal(vt, CARGO_TYPE_MAX))
+        filtered = batch.filter(pc.fill_null(mask, False))
+        yield batch.num_rows, filtered.to_pandas()
+
+
+def _open_arrow_native(file_path: str):
+    """Open a path with Arrow's own zstd decoder, positioned after the header line"""
+    stream = pa.input_stream(file_path, compression='zstd' if file_path.endswith('.zst') else None)
+    header = b''
+    while not header.endswith(b'\n'):
+        byte = stream.read(1)
+        if not byte:
+            break
+        header += byte
+    return stream, header
+
+
+def _iter_blocks(stream, header, chunksize, engine):
+    """Resolve columns for a header and yield renamed cargo blocks from a positioned stream"""
+    actual_cols = resolve_columns(header)
+
+    if 'VesselType' not in actual_cols or 'MMSI' not in actual_cols:
+        print(f"  [Warning] Required columns missing from header: {list(header)}")
+        return
+
+    rename_map = {actual_cols[t]: OUTPUT_NAMES[t] for t in actual_cols}
+    if engine == 'pyarrow':
+        blocks = _iter_arrow(stream, header, actual_cols)
+    else:
+        blocks = _iter_pandas(stream, header, actual_cols, chunksize)
+
+    for n_rows, chunk in blocks:
+        yield n_rows, chunk.rename(columns=rename_map)
+
+
+def iter_cargo_chunks(source, chunksize: int = DEFAULT_CHUNKSIZE, engine: str = 'auto'):
+    """
+    Stream cargo-vessel rows from an AIS file.
+
+    Yields (rows_scanned, DataFrame) per parsed block. The DataFrame holds only
+    cargo rows with columns renamed to mmsi / vessel_name / imo / ship_type.
+
+    Args:
+        source: Path or compressed binary stream (see open_ais_stream)
+        chunksize: Rows per block for the pandas engine
+        engine: 'pyarrow', 'pandas' or 'auto' (pyarrow when installed)
+    """
+    if engine == 'auto':
+        engine = 'pyarrow' if pa is not None else 'pandas'
+
+    stream, header = _open_source(source, engine)
+    try:
+        yield from _iter_blocks(stream, header, chunksize, engine)
+    finally:
+        stream.close()
+
+
+def iter_cargo_blocks(stream, chunksize: int = DEFAULT_CHUNKSIZE, engine: str = 'auto'):
+    """
+    Like iter_cargo_chunks, but over an already decompressed binary stream that
+    starts at the header line (used by the threaded pipeline in ais_pipeline).
+    """
+    if engine == 'auto':
+        engine = 'pyarrow' if pa is not None else 'pandas'
+    header = read_header(stream)
+    yield from _iter_blocks(stream, header, chunksize, engine)
+
+
+def _row_end(view: memoryview, last: bool = True) -> int:
+    """Index just past the last (or first) newline in a buffer, 0 if it has none; scans small windows only"""
+    size, window = len(view), 1 << 16
+    while True:
+        window = min(window, size)
+        if last:
+            found = bytes(view[size - window:]).rfind(b'\n')
+            if found >= 0:
+                return size - window + found + 1
+        else:
+            found = bytes(view[:window]).find(b'\n')
+            if found >= 0:
+                return found + 1
+        if window == size:
+            return 0
+        window *= 2
+
+
+def _parse_segment(pieces: list, header: list, chunksize: int, engine: str) -> tuple:
+    """Parse the byte pieces of one segment -> (rows scanned, cargo DataFrame)"""
+    rows, frames = 0, []
+    for piece in pieces:
+        if not len(piece):
+            continue
+        stream = pa.BufferReader(pa.py_buffer(piece)) if engine == 'pyarrow' else io.BytesIO(piece)
+        for n_rows, chunk in _iter_blocks(stream, header, chunksize, engine):
+            rows += n_rows
+            if not chunk.empty:
+                frames.append(chunk)
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(OUTPUT_NAMES.values()))
+    return rows, frame
+
+
+def iter_cargo_segments(source, start: int = 0, segment_bytes: int = SEGMENT_BYTES,
+                        chunksize: int = DEFAULT_CHUNKSIZE, engine: str = 'auto'):
+    """
+    Stream cargo-vessel rows from an AIS file in resumable segments.
+
+    The decompressed text is cut into segments of about segment_bytes that end
+    on row boundaries. Yields (offset, rows_scanned, DataFrame) per segment,
+    where offset is the decompressed byte position just past the segment.
+    Passing a previous offset as start skips everything before it without
+    parsing it (it still has to be decompressed: zstd streams cannot seek).
+
+    With the pyarrow engine a path is decompressed by Arrow's native zstd
+    decoder and segments are parsed from its buffers without copying them; only
+    the row straddling two reads is joined and parsed on its own.
+    """
+    if engine == 'auto':
+        engine = 'pyarrow' if pa is not None else 'pandas'
+
+    if engine == 'pyarrow' and isinstance(source, str):
+        stream = pa.input_stream(source, compression='zstd' if source.endswith('.zst') else None)
+        read = stream.read_buffer
+    else:
+        stream = open_ais_stream(source)
+        read = stream.read
+    try:
+        # Arrow's compressed streams have no readline; the header is cut from the first reads
+        pending = b''
+        while b'\n' not in pending:
+            block = bytes(read(1 << 16))
+            if not block:
+                break
+            pending += block
+        header_line, _, pending = pending.partition(b'\n')
+        header = next(csv.reader([header_line.decode('utf-8-sig').rstrip('\r')]), [])
+        actual_cols = resolve_columns(header)
+        if 'VesselType' not in actual_cols or 'MMSI' not in actual_cols:
+            print(f"  [Warning] Required columns missing from header: {list(header)}")
+            return
+
+        offset = len(header_line) + 1
+        if start > offset:
+            skip = start - offset
+            while len(pending) < skip:
+                skip -= len(pending)
+                pending = bytes(read(min(16 << 20, skip)))
+                if not pending:
+                    return
+            pending, offset = pending[skip:], start
+
+        while True:
+            view = memoryview(read(segment_bytes))
+            if not len(view):
+                # Last row without a trailing newline
+                if pending:
+                    rows, frame = _parse_segment([pending], header, chunksize, engine)
+                    yield offset + len(pending), rows, frame
+                return
+            cut = _row_end(view)
+            if not cut:
+                pending += bytes(view)
+                continue
+            # The partial row left over from the previous read ends at this read's first newline
+            first = _row_end(view, last=False) if pending else 0
+            pieces = [pending + bytes(view[:first]), view[first:cut]]
+            pending = bytes(view[cut:])
+            offset += len(pieces[0]) + len(pieces[1])
+            rows, frame = _parse_segment(pieces, header, chunksize, engine)
+            yield offset, rows, frame
+    finally:
+        stream.close()
+
+
+def _open_source(source, engine: str):
+    """Open a source for the given engine and consume its header -> (stream, header)"""
+    if engine == 'pyarrow' and isinstance(source, str):
+        # Decompress natively in Arrow instead of through a Python file wrapper
+        stream, header_line = _open_arrow_native(source)
+        return stream, next(csv.reader([header_line.decode('utf-8-sig').rstrip('\r\n')]), [])
+    stream = open_ais_stream(source)
+    try:
+        return stream, read_header(stream)
+    except Exception:
+        stream.close()
+        raise
+
+
+# ---------------------------------------------------------------------------
+# Position reader: per-report kinematics for a set of MMSIs
+# ---------------------------------------------------------------------------
+
+POSITION_ALIASES = {
+    'MMSI': ['MMSI', 'mmsi'],
+    'BaseDateTime': ['BaseDateTime', 'base_date_time', 'Timestamp', 'TIMESTAMP'],
+    'LAT': ['LAT', 'Latitude', 'lat'],
+    'LON': ['LON', 'Longitude', 'lon'],
+    'SOG': ['SOG', 'sog'],
+    'COG': ['COG', 'cog'],
+    'Heading': ['Heading', 'heading'],
+}
+
+# Output columns of iter_position_chunks and their dtypes
+POSITION_COLUMNS = {
+    'mmsi': 'int64',
+    'ts': 'int64',         # epoch seconds (UTC)
+    'lat': 'float32',
+    'lon': 'float32',
+    'sog': 'float32',
+    'cog': 'float32',
+    'heading': 'float32',
+}
+
+_POSITION_OUTPUT = {
+    'MMSI': 'mmsi', 'BaseDateTime': 'ts', 'LAT': 'lat', 'LON': 'lon',
+    'SOG': 'sog', 'COG': 'cog', 'Heading': 'heading',
+}
+
+
+def _position_frame(frame: pd.DataFrame, actual_cols: dict) -> pd.DataFrame:
+    """Rename, coerce and order a filtered position block to POSITION_COLUMNS"""
+    frame = frame.rename(columns={actual_cols[t]: _POSITION_OUTPUT[t] for t in actual_cols})
+    ts = frame['ts']
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts, format='ISO8601', utc=True, errors='coerce')
+    elif ts.dt.tz is None:
+        ts = ts.dt.tz_localize('UTC')
+    out = pd.DataFrame({'mmsi': frame['mmsi'].to_numpy(dtype='int64')})
+    out['ts'] = ts.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[s]').astype('int64')
+    for col in ('lat', 'lon', 'sog', 'cog', 'heading'):
+        out[col] = frame[col].to_numpy(dtype='float32') if col in frame else pd.NA
+    return out.astype(POSITION_COLUMNS)
+
+
+def iter_position_chunks(source, mmsis, chunksize: int = DEFAULT_CHUNKSIZE, engine: str = 'auto'):
+    """
+    Stream position reports for the given MMSIs from an AIS file.
+
+    Yields (rows_scanned, DataFrame) per parsed block with POSITION_COLUMNS.
+    Rows for other MMSIs are dropped as each block is parsed, so memory follows
+    the tracked fleet rather than global traffic.
+    """
+    if engine == 'auto':
+        engine = 'pyarrow' if pa is not None else 'pandas'
+    mmsi_values = sorted({int(m) for m in mmsis})
+
+    stream, header = _open_source(source, engine)
+    try:
+        actual_cols = resolve_columns(header, POSITION_ALIASES)
+        missing = [c for c in ('MMSI', 'BaseDateTime', 'LAT', 'LON') if c not in actual_cols]
+        if missing:
+            print(f"  [Warning] Position columns missing from header: {missing}")
+            return
+        usecols = list(actual_cols.values())
+        mmsi_col = actual_cols['MMSI']
+
+        if engine == 'pyarrow':
+            types = {actual_cols[t]: (pa.int64() if t == 'MMSI' else
+                                      pa.timestamp('s') if t == 'BaseDateTime' else pa.float32())
+                     for t in actual_cols}
+            reader = pa_csv.open_csv(
+                stream,
+                read_options=pa_csv.ReadOptions(column_names=list(header), block_size=ARROW_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(include_columns=usecols, column_types=types),
+            )
+            value_set = pa.array(mmsi_values, type=pa.int64())
+            for batch in reader:
+                mask = pc.is_in(batch.column(mmsi_col), value_set=value_set)
+                yield batch.num_rows, _position_frame(batch.filter(mask).to_pandas(), actual_cols)
+        else:
+            dtypes = {actual_cols[t]: ('str' if t == 'BaseDateTime' else 'float64' if t == 'MMSI' else 'float32')
+                      for t in actual_cols}
+            text_stream = io.TextIOWrapper(stream, encoding='utf-8')
+            chunk_iter = pd.read_csv(text_stream, header=None, names=list(header), usecols=usecols,
+                                     dtype=dtypes, chunksize=chunksize)
+            for chunk in chunk_iter:
+                mask = chunk[mmsi_col].isin(mmsi_values)
+                yield len(chunk), _position_frame(chunk[mask], actual_cols)
+    finally:
+        stream.close()
+
+
+# ---------------------------------------------------------------------------
+# Split mode: one decompressed day parsed as independent byte ranges
+# ---------------------------------------------------------------------------
+
+class _RangeReader(io.RawIOBase):
+    """Raw reader limited to the byte range [start, end) of a file"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        n = self._file.readinto(view)
+        self._remaining -= n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def decompress_to_file(source: str, dest_path: str) -> int:
+    """Decompress a .csv.zst once into a plain CSV spool file; returns bytes written"""
+    with open(source, 'rb') as raw, open(dest_path, 'wb') as out:
+        reader = zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        written = 0
+        while True:
+            block = reader.read(16 << 20)
+            if not block:
+                break
+            out.write(block)
+            written += len(block)
+    return written
+
+
+def split_row_ranges(csv_path: str, parts: int):
+    """
+    Split a plain CSV into roughly equal byte ranges that start and end on row boundaries.
+
+    Returns (header, [(start, end), ...]) with the header line excluded from every range.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        header = read_header(f)
+        data_start = f.tell()
+        step = max(1, (size - data_start) // max(1, parts))
+        bounds = [data_start]
+        for k in range(1, parts):
+            target = data_start + k * step
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            # Finish the row that straddles the target so the next range starts clean
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+        bounds.append(size)
+    return header, [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def iter_cargo_range(csv_path: str, start: int, end: int, header: list,
+                     chunksize: int = DEFAULT_CHUNKSIZE, engine: str = 'auto'):
+    """Stream cargo-vessel rows from one byte range of a decompressed AIS CSV"""
+    if engine == 'auto':
+        engine = 'pyarrow' if pa is not None else 'pandas'
+
+    stream = io.BufferedReader(_RangeReader(csv_path, start, end), buffer_size=1 << 20)
+    try:
+        yield from _iter_blocks(stream, header, chunksize, engine)
+    finally:
+        stream.close()
@@ -0,0 +1,225 @@
+"""
+AIS Parquet Staging Cache
+Converts each raw NOAA AIS day (.csv.zst) once into a typed Parquet file under
+ais_staged/date=YYYY-MM-DD/. Row groups are written per vessel-type bucket so
+their VesselType statistics let later runs skip every non-cargo row group and
+read only the projected columns.
+"""
+
+import os
+import re
+
+from ais_reader import (
+    CARGO_TYPE_MIN, CARGO_TYPE_MAX, COLUMN_ALIASES, OUTPUT_NAMES,
+    open_ais_stream, read_header, resolve_columns, pa,
+)
+
+if pa is not None:
+    import pyarrow.csv as pa_csv
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+STAGING_DIR = os.path.join(os.path.dirname(__file__), 'ais_staged')
+
+# Rows buffered per vessel-type bucket before a row group is flushed
+ROW_GROUP_ROWS = 250000
+
+# Typed NOAA columns (anything else in the header is left to Arrow inference)
+STAGED_TYPES = {
+    'MMSI': 'int64',
+    'BaseDateTime': 'timestamp[s]',
+    'LAT': 'float64',
+    'LON': 'float64',
+    'SOG': 'float32',
+    'COG': 'float32',
+    'Heading': 'float32',
+    'VesselName': 'string',
+    'IMO': 'string',
+    'CallSign': 'string',
+    'VesselType': 'float32',
+    'Status': 'float32',
+    'Length': 'float32',
+    'Width': 'float32',
+    'Draft': 'float32',
+    'Cargo': 'float32',
+    'TransceiverClass': 'string',
+}
+
+
+def require_pyarrow():
+    """Staging needs pyarrow; fail with a clear message when it is missing"""
+    if pa is None:
+        raise RuntimeError("AIS staging requires pyarrow (pip install pyarrow)")
+
+
+def date_key_for(name: str) -> str:
+    """Partition key for an AIS file name or URL, e.g. ais-2025-01-01.csv.zst -> 2025-01-01"""
+    base = os.path.basename(name)
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', base)
+    if match:
+        return match.group(1)
+    return base.split('.')[0]
+
+
+def staged_path(date_key: str, staging_dir: str = STAGING_DIR) -> str:
+    """Parquet path for a staged AIS day"""
+    return os.path.join(staging_dir, f'date={date_key}', 'part-0.parquet')
+
+
+def is_staged(date_key: str, staging_dir: str = STAGING_DIR) -> bool:
+    """True when the day has already been converted"""
+    return os.path.exists(staged_path(date_key, staging_dir))
+
+
+def _canonical_names(header: list) -> list:
+    """Stripped header names, with the known aliases mapped to NOAA's canonical spelling"""
+    canonical = {raw: target for target, raw in resolve_columns(header, COLUMN_ALIASES).items()}
+    return [canonical.get(c, c.strip()) for c in header]
+
+
+def _type_bucket(batch):
+    """Vessel-type decade per row (70-79 -> 7); nulls and out-of-range types go to bucket -1"""
+    vt = pc.cast(batch.column('VesselType'), pa.float32())
+    bucket = pc.cast(pc.floor(pc.divide(vt, 10.0)), pa.int8(), safe=False)
+    valid = pc.and_(pc.is_valid(vt), pc.and_(pc.greater_equal(vt, 0), pc.less(vt, 100)))
+    return pc.if_else(pc.fill_null(valid, False), bucket, pa.scalar(-1, pa.int8()))
+
+
+def stage_ais_file(source, date_key: str = None, staging_dir: str = STAGING_DIR) -> str:
+    """
+    Convert one AIS day into the Parquet staging cache.
+
+    Args:
+        source: Path to a .csv.zst file or a compressed binary stream (HTTP response body)
+        date_key: Partition key; derived from the file name when source is a path
+        staging_dir: Root of the staging cache
+
+    Returns the staged Parquet path. The file is written under a temporary name and
+    renamed into place, so an interrupted run never leaves a half-written day behind.
+    """
+    require_pyarrow()
+    if date_key is None:
+        date_key = date_key_for(source)
+
+    out_path = staged_path(date_key, staging_dir)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + '.tmp'
+
+    stream = open_ais_stream(source)
+    writer = None
+    try:
+        header = read_header(stream)
+        names = _canonical_names(header)
+        if 'VesselType' not in names or 'MMSI' not in names:
+            raise ValueError(f"Required columns missing from header: {header}")
+
+        reader = pa_csv.open_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(column_names=names, block_size=1 << 20),
+            convert_options=pa_csv.ConvertOptions(
+                strings_can_be_null=True,
+                column_types={c: STAGED_TYPES[c] for c in names if c in STAGED_TYPES},
+            ),
+        )
+
+        buffers = {}
+        buffered_rows = {}
+        rows = 0
+
+        def flush(bucket):
+            table = pa.Table.from_batches(buffers.pop(bucket))
+            buffered_rows.pop(bucket)
+            writer.write_table(table, row_group_size=len(table))
+
+        for batch in reader:
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, batch.schema, compression='zstd')
+            rows += batch.num_rows
+            buckets = _type_bucket(batch)
+            for bucket in pc.unique(buckets).to_pylist():
+                part = batch.filter(pc.equal(buckets, bucket))
+                buffers.setdefault(bucket, []).append(part)
+                buffered_rows[bucket] = buffered_rows.get(bucket, 0) + part.num_rows
+                if buffered_rows[bucket] >= ROW_GROUP_ROWS:
+                    flush(bucket)
+
+        for bucket in sorted(buffers):
+            flush(bucket)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        stream.close()
+
+    if writer is None:
+        raise ValueError(f"No rows found while staging {date_key}")
+    writer.close()
+    os.replace(tmp_path, out_path)
+    print(f"  Staged {rows} rows -> {os.path.relpath(out_path, os.path.dirname(staging_dir))}")
+    return out_path
+
+
+def iter_staged_chunks(date_key: str, columns: list = None, type_range: tuple = (CARGO_TYPE_MIN, CARGO_TYPE_MAX),
+                       staging_dir: str = STAGING_DIR, rename: bool = True):
+    """
+    Stream rows of a staged day, skipping row groups whose VesselType statistics
+    fall outside type_range and reading only the requested columns.
+
+    Yields (rows_read, DataFrame) per row group that survives pruning. With
+    rename=True the identity columns come back as mmsi / vessel_name / imo / ship_type,
+    matching ais_reader.iter_cargo_chunks.
+    """
+    require_pyarrow()
+    columns = list(columns or COLUMN_ALIASES.keys())
+    parquet = pq.ParquetFile(staged_path(date_key, staging_dir))
+    schema = parquet.schema_arrow
+    columns = [c for c in columns if c in schema.names]
+    type_idx = schema.get_field_index('VesselType')
+    lo, hi = type_range
+
+    read_cols = columns if 'VesselType' in columns else columns + ['VesselType']
+    for rg in range(parquet.num_row_groups):
+        stats = parquet.metadata.row_group(rg).column(type_idx).statistics
+        if stats is not None and stats.has_min_max and (stats.max < lo or stats.min > hi):
+            continue
+        table = parquet.read_row_group(rg, columns=read_cols)
+        vt = table.column('VesselType')
+        mask = pc.fill_null(pc.and_(pc.greater_equal(vt, lo), pc.less_equal(vt, hi)), False)
+        frame = table.filter(mask).select(columns).to_pandas()
+        if rename:
+            frame = frame.rename(columns={c: OUTPUT_NAMES[c] for c in columns if c in OUTPUT_NAMES})
+        yield table.num_rows, frame
+
+
+def staged_dates(staging_dir: str = STAGING_DIR) -> list:
+    """All staged date keys, sorted"""
+    if not os.path.exists(staging_dir):
+        return []
+    return sorted(
+        d.split('=', 1)[1] for d in os.listdir(staging_dir)
+        if d.startswith('date=') and os.path.exists(os.path.join(staging_dir, d, 'part-0.parquet'))
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Stage raw AIS .csv.zst days into the Parquet cache")
+    parser.add_argument('files', nargs='+', help="AIS .csv.zst files to stage")
+    parser.add_argument('--force', action='store_true', help="Re-stage days that are already cached")
+    args = parser.parse_args()
+
+    for path in args.files:
+        key = date_key_for(path)
+        if is_staged(key) and not args.force:
+            print(f"Skipping already staged day: {key}")
+            continue
+        start = time.perf_counter()
+        stage_ais_file(path, key)
+        print(f"  {key} staged in {time.perf_counter() - start:.1f}s")
+
+    print(f"Staged days: {len(staged_dates())}")
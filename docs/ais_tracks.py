@@ -0,0 +1,221 @@
+"""
+AIS Position History
+Extracts per-MMSI trajectories for the vessels we track (shipments / vessel_master)
+from NOAA AIS days into a local columnar store:
+    ais_tracks/date=YYYY-MM-DD/tracks.parquet
+Columns are array-backed (mmsi/ts int64, lat/lon/sog/cog/heading float32) and
+each row group is sorted by (mmsi, ts), so the dashboard backfill can read a
+vessel's day without touching the raw feed.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from ais_reader import POSITION_ALIASES, POSITION_COLUMNS, iter_position_chunks, resolve_columns, pa
+from ais_staging import date_key_for, is_staged, staged_path, require_pyarrow
+from track_simplify import SIMPLIFY_TOLERANCE_M, simplify_sorted_block
+
+if pa is not None:
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+TRACKS_DIR = os.path.join(os.path.dirname(__file__), 'ais_tracks')
+
+# Buffered position rows before a sorted row group is spilled to disk
+FLUSH_ROWS = 1000000
+
+# Page size for vessel_master / shipments reads (PostgREST caps responses at 1000 rows)
+PAGE_SIZE = 1000
+
+
+def tracks_path(date_key: str, tracks_dir: str = TRACKS_DIR) -> str:
+    """Parquet path for one day of trajectories"""
+    return os.path.join(tracks_dir, f'date={date_key}', 'tracks.parquet')
+
+
+def _select_all(supabase, table: str, columns: str, not_null: str = None) -> list:
+    """Read every row of a table in PAGE_SIZE pages"""
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if not_null:
+            query = query.not_.is_(not_null, 'null')
+        page = query.range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def load_tracked_mmsis(supabase, include_vessel_master: bool = False) -> set:
+    """MMSIs worth keeping positions for: all booked shipments, optionally the whole vessel_master"""
+    mmsis = set()
+    sources = [('shipments', 'mmsi')]
+    if include_vessel_master:
+        sources.append(('vessel_master', 'mmsi'))
+    for table, column in sources:
+        try:
+            for row in _select_all(supabase, table, column, not_null=column):
+                value = str(row.get(column) or '').strip()
+                if value.isdigit():
+                    mmsis.add(int(value))
+        except Exception as e:
+            print(f"  [Error] Failed to load MMSIs from {table}: {e}")
+    return mmsis
+
+
+class TrackWriter:
+    """
+    Buffers position blocks as typed NumPy arrays and spills them to Parquet as
+    row groups sorted by (mmsi, ts). Memory is bounded by FLUSH_ROWS regardless
+    of how much traffic the day contains. Each spilled block is simplified per
+    vessel to within tolerance_m (0 stores every report).
+    """
+
+    def __init__(self, out_path: str, flush_rows: int = FLUSH_ROWS,
+                 tolerance_m: float = SIMPLIFY_TOLERANCE_M, bucket_s: int = 0):
+        require_pyarrow()
+        self.out_path = out_path
+        self.tmp_path = out_path + '.tmp'
+        self.flush_rows = flush_rows
+        self.tolerance_m = tolerance_m
+        self.bucket_s = bucket_s
+        self.rows_in = 0
+        self.rows = 0
+        self._buffers = {c: [] for c in POSITION_COLUMNS}
+        self._buffered = 0
+        self._schema = pa.schema([(c, pa.from_numpy_dtype(np.dtype(t))) for c, t in POSITION_COLUMNS.items()])
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression='zstd')
+
+    def add(self, frame: pd.DataFrame):
+        """Append a block of positions (POSITION_COLUMNS layout)"""
+        if frame.empty:
+            return
+        for c, dtype in POSITION_COLUMNS.items():
+            self._buffers[c].append(frame[c].to_numpy(dtype=dtype))
+        self._buffered += len(frame)
+        if self._buffered >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Sort the buffered positions and write them as one row group"""
+        if not self._buffered:
+            return
+        arrays = {c: np.concatenate(parts) for c, parts in self._buffers.items()}
+        order = np.lexsort((arrays['ts'], arrays['mmsi']))
+        arrays = {c: a[order] for c, a in arrays.items()}
+        kept = simplify_sorted_block(arrays['mmsi'], arrays['ts'], arrays['lat'], arrays['lon'],
+                                     self.tolerance_m, self.bucket_s)
+        table = pa.table({c: arrays[c][kept] for c in POSITION_COLUMNS}, schema=self._schema)
+        self._writer.write_table(table, row_group_size=len(table))
+        self.rows_in += self._buffered
+        self.rows += len(kept)
+        self._buffers = {c: [] for c in POSITION_COLUMNS}
+        self._buffered = 0
+
+    def close(self) -> int:
+        """Flush, close and atomically move the file into place; returns rows written"""
+        self.flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.out_path)
+        return self.rows
+
+    def abort(self):
+        """Discard a partially written day"""
+        self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _iter_staged_positions(date_key: str, mmsis):
+    """Position blocks from the Parquet staging cache (projected columns, MMSI filter in Arrow)"""
+    parquet = pq.ParquetFile(staged_path(date_key))
+    actual_cols = resolve_columns(parquet.schema_arrow.names, POSITION_ALIASES)
+    value_set = pa.array(sorted(int(m) for m in mmsis), type=pa.int64())
+    rename = {
+        'MMSI': 'mmsi', 'BaseDateTime': 'ts', 'LAT': 'lat', 'LON': 'lon',
+        'SOG': 'sog', 'COG': 'cog', 'Heading': 'heading',
+    }
+    for rg in range(parquet.num_row_groups):
+        table = parquet.read_row_group(rg, columns=list(actual_cols.values()))
+        n_rows = table.num_rows
+        table = table.filter(pc.is_in(pc.cast(table.column(actual_cols['MMSI']), pa.int64()), value_set=value_set))
+        frame = table.to_pandas().rename(columns={actual_cols[t]: rename[t] for t in actual_cols})
+        ts = frame['ts'].to_numpy(dtype='datetime64[s]').astype('int64')
+        frame = frame.assign(ts=ts)
+        for col in POSITION_COLUMNS:
+            if col not in frame:
+                frame[col] = np.nan
+        yield n_rows, frame[list(POSITION_COLUMNS)].astype(POSITION_COLUMNS)
+
+
+def extract_tracks(file_path: str, mmsis, date_key: str = None, tracks_dir: str = TRACKS_DIR,
+                   engine: str = 'auto', tolerance_m: float = SIMPLIFY_TOLERANCE_M) -> int:
+    """
+    Extract one AIS day's positions for the given MMSIs into the track store.
+
+    Reads from the Parquet staging cache when the day is staged, otherwise streams
+    the raw .csv.zst. Tracks are simplified to within tolerance_m metres.
+    Returns the number of positions written.
+    """
+    if date_key is None:
+        date_key = date_key_for(file_path)
+    if not mmsis:
+        print("  No tracked MMSIs - nothing to extract")
+        return 0
+
+    if is_staged(date_key):
+        chunks = _iter_staged_positions(date_key, mmsis)
+    else:
+        chunks = iter_position_chunks(file_path, mmsis, engine=engine)
+
+    writer = TrackWriter(tracks_path(date_key, tracks_dir), tolerance_m=tolerance_m)
+    rows_scanned = 0
+    try:
+        for n_rows, frame in chunks:
+            rows_scanned += n_rows
+            writer.add(frame)
+    except Exception:
+        writer.abort()
+        raise
+    written = writer.close()
+    print(f"  {date_key}: {writer.rows_in} of {rows_scanned} positions matched {len(mmsis)} tracked MMSIs, "
+          f"{written} stored after simplification")
+    return written
+
+
+def read_tracks(date_key: str, mmsis=None, tracks_dir: str = TRACKS_DIR) -> dict:
+    """
+    Load a day's trajectories as {mmsi: {column: ndarray}} with each track sorted by ts.
+    Arrays are views into one sorted block, so this costs a single read and sort.
+    """
+    require_pyarrow()
+    path = tracks_path(date_key, tracks_dir)
+    if not os.path.exists(path):
+        return {}
+    filters = [('mmsi', 'in', [int(m) for m in mmsis])] if mmsis else None
+    table = pq.read_table(path, filters=filters)
+    arrays = {c: table.column(c).to_numpy() for c in POSITION_COLUMNS}
+    order = np.lexsort((arrays['ts'], arrays['mmsi']))
+    arrays = {c: a[order] for c, a in arrays.items()}
+
+    unique, starts = np.unique(arrays['mmsi'], return_index=True)
+    ends = np.append(starts[1:], len(arrays['mmsi']))
+    return {
+        int(m): {c: a[s:e] for c, a in arrays.items() if c != 'mmsi'}
+        for m, s, e in zip(unique, starts, ends)
+    }
+
+
+def track_dates(tracks_dir: str = TRACKS_DIR) -> list:
+    """All extracted date keys, sorted"""
+    if not os.path.exists(tracks_dir):
+        return []
+    return sorted(
+        d.split('=', 1)[1] for d in os.listdir(tracks_dir)
+        if d.startswith('date=') and os.path.exists(os.path.join(tracks_dir, d, 'tracks.parquet'))
+    )
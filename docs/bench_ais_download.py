@@ -0,0 +1,133 @@
+"""
+AIS Download Benchmark
+Serves synthetic archives from a local HTTP stand-in for the NOAA server
+(Range support, a per-connection bandwidth cap and optional mid-transfer
+drops) and compares download throughput at several concurrency levels.
+Every spooled file is checked byte-for-byte against the served payload.
+
+Usage:
+    python docs/bench_ais_download.py --days 8 --size-mb 16 --rate-mb 8 --workers 1 4 8 --drop
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import datetime
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ais_download import ais_day_urls, download_days, make_session
+
+
+def make_handler(payloads: dict, rate_bytes: float, drop: bool):
+    """Request handler serving payloads[path] with Range, throttling and one dropped transfer per file"""
+    dropped = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = payloads.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            start = 0
+            match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(body)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(body) - start))
+            self.end_headers()
+
+            with lock:
+                cut = drop and self.path not in dropped
+                dropped.add(self.path)
+            stop = start + (len(body) - start) // 2 if cut else len(body)
+            step = 64 * 1024
+            t0 = time.perf_counter()
+            sent = 0
+            for offset in range(start, stop, step):
+                self.wfile.write(body[offset:min(offset + step, stop)])
+                sent += min(step, stop - offset)
+                ahead = sent / rate_bytes - (time.perf_counter() - t0)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if cut:
+                # Simulate a dropped connection half way through the first transfer
+                self.close_connection = True
+                self.connection.shutdown(2)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NOAA AIS downloader against a local server")
+    parser.add_argument('--days', type=int, default=8)
+    parser.add_argument('--size-mb', type=float, default=16, help="Size of each served archive")
+    parser.add_argument('--rate-mb', type=float, default=8, help="Per-connection bandwidth cap (MB/s)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--drop', action='store_true', help="Drop every file's first transfer half way")
+    args = parser.parse_args()
+
+    days = _days(args.days)
+    urls_paths = [f'/{d.year}/ais-{d.isoformat()}.csv.zst' for d in days]
+    size = int(args.size_mb * 1e6)
+    payloads = {p: os.urandom(size) for p in urls_paths}
+    digests = {os.path.basename(p): hashlib.sha256(b).hexdigest() for p, b in payloads.items()}
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(payloads, args.rate_mb * 1e6, args.drop))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f"Serving {args.days} x {args.size_mb:.0f} MB at {args.rate_mb:.0f} MB/s per connection "
+          f"{'(first transfer of each file dropped)' if args.drop else ''}")
+    print(f"\n{'workers':>8}{'seconds':>10}{'MB/s':>10}{'failed':>8}{'verified':>10}")
+
+    for workers in args.workers:
+        spool = tempfile.mkdtemp(prefix='ais_spool_')
+        # Fresh server-side drop state per run
+        server.RequestHandlerClass = make_handler(payloads, args.rate_mb * 1e6, args.drop)
+        start = time.perf_counter()
+        failed = verified = 0
+        for url, path, error in download_days(ais_day_urls(days[0], days[-1], base_url),
+                                              workers, spool, make_session(workers)):
+            if error:
+                failed += 1
+                continue
+            with open(path, 'rb') as f:
+                verified += hashlib.sha256(f.read()).hexdigest() == digests[os.path.basename(path)]
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8}{elapsed:>10.2f}{args.days * size / 1e6 / elapsed:>10.1f}{failed:>8}{verified:>10}")
+        shutil.rmtree(spool)
+
+    server.shutdown()
+
+
+def _days(n: int):
+    """n consecutive dates starting 2025-01-01"""
+    first = datetime.date(2025, 1, 1)
+    return [first + datetime.timedelta(days=i) for i in range(n)]
+
+
+if __name__ == '__main__':
+    main()
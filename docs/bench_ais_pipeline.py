@@ -0,0 +1,120 @@
+"""
+AIS Pipeline Benchmark
+Feeds a synthetic NOAA day through a bandwidth-throttled reader (standing in
+for the HTTP response) and a sink with per-batch latency (standing in for the
+Supabase upsert), then compares the old inline loop with the threaded
+ais_pipeline. The pipeline should land near max(network, CPU) rather than
+their sum.
+
+Usage:
+    python docs/bench_ais_pipeline.py --rows 2000000 --rate-mb 20 --upsert-ms 50
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ais_reader import generate_synthetic_file
+from ais_reader import iter_cargo_chunks
+from ais_pipeline import run_ais_pipeline
+from vessel_index import VesselIndex
+
+
+class ThrottledReader:
+    """Binary reader that delivers a file at a fixed byte rate"""
+
+    def __init__(self, path: str, rate_bytes: float):
+        self._file = open(path, 'rb')
+        self._rate = rate_bytes
+        self._sent = 0
+        self._start = time.perf_counter()
+
+    def read(self, n=-1):
+        block = self._file.read(n if n and n > 0 else 1 << 20)
+        self._sent += len(block)
+        ahead = self._sent / self._rate - (time.perf_counter() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+        return block
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._file.close()
+
+
+def make_sink(latency_s: float, batch_rows: int):
+    """Sink that sleeps per 1000-row request like upsert_to_vessel_master"""
+    def sink(frame):
+        time.sleep(latency_s * max(1, -(-len(frame) // batch_rows)))
+        return True
+    return sink
+
+
+def run_inline(path: str, rate: float, sink, engine: str) -> float:
+    """The previous shape: parse straight off the response, upsert after the day"""
+    start = time.perf_counter()
+    index = VesselIndex()
+    for _, frame in iter_cargo_chunks(ThrottledReader(path, rate), engine=engine):
+        index.add(frame)
+    vessels = index.to_frame()
+    for k in range(0, len(vessels), 5000):
+        sink(vessels.iloc[k:k + 5000])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the threaded AIS pipeline")
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--vessels', type=int, default=200000)
+    parser.add_argument('--file', help="Use an existing .csv.zst instead of generating one")
+    parser.add_argument('--rate-mb', type=float, default=20, help="Simulated network rate (MB/s)")
+    parser.add_argument('--upsert-ms', type=float, default=50, help="Simulated latency per 1000-row upsert")
+    parser.add_argument('--engine', choices=['auto', 'pyarrow', 'pandas'], default='auto')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.file
+    if not path:
+        tmp_dir = tempfile.mkdtemp(prefix='ais_bench_')
+        path = os.path.join(tmp_dir, 'ais-2025-01-01.csv.zst')
+        print(f"Generating {args.rows} synthetic rows...")
+        generate_synthetic_file(path, args.rows, args.vessels)
+
+    try:
+        size = os.path.getsize(path)
+        rate = args.rate_mb * 1e6
+        sink = make_sink(args.upsert_ms / 1000, 1000)
+
+        start = time.perf_counter()
+        cpu_vessels, _, _ = run_ais_pipeline(path, engine=args.engine)
+        cpu_only = time.perf_counter() - start
+        network_only = size / rate
+
+        print("\nInline (parse off the stream, then upsert):")
+        inline = run_inline(path, rate, sink, args.engine)
+        print(f"  {inline:.1f}s")
+
+        print("\nPipeline:")
+        start = time.perf_counter()
+        vessels, ok, _ = run_ais_pipeline(ThrottledReader(path, rate), sink=sink, engine=args.engine)
+        piped = time.perf_counter() - start
+
+        print(f"\n{size / 1e6:.0f} MB compressed, {len(vessels)} vessels ({len(cpu_vessels)} without throttling)")
+        print(f"  network only     {network_only:6.1f}s")
+        print(f"  CPU only         {cpu_only:6.1f}s")
+        print(f"  inline           {inline:6.1f}s")
+        print(f"  pipeline         {piped:6.1f}s  ({inline / piped:.2f}x)")
+    finally:
+        if tmp_dir:
+            os.remove(path)
+            os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+AIS Reader Benchmark
+Generates a synthetic NOAA-style .csv.zst day and compares the legacy
+full-column reader against the column-projected ais_reader engines.
+Each variant runs in its own subprocess so peak RSS is measured in isolation.
+
+Usage:
+    python docs/bench_ais_reader.py --rows 2000000 --vessels 200000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+import zstandard as zstd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+NOAA_HEADER = [
+    'MMSI', 'BaseDateTime', 'LAT', 'LON', 'SOG', 'COG', 'Heading', 'VesselName', 'IMO',
+    'CallSign', 'VesselType', 'Status', 'Length', 'Width', 'Draft', 'Cargo', 'TransceiverClass',
+]
+
+
+def generate_synthetic_file(path: str, rows: int, vessels: int = 20000, seed: int = 42):
+    """Write a synthetic NOAA AIS day with the real column layout"""
+    rng = np.random.default_rng(seed)
+    fleet_mmsi = rng.integers(200000000, 775999999, size=vessels)
+    fleet_type = rng.choice([30, 31, 37, 52, 60, 70, 71, 74, 79, 80, 89, 90], size=vessels)
+    fleet_name = np.array([f"VESSEL {i:05d}" for i in range(vessels)])
+    fleet_imo = np.array([f"IMO{9000000 + i}" if i % 3 else '' for i in range(vessels)])
+
+    cctx = zstd.ZstdCompressor(level=3)
+    block = 200000
+    with open(path, 'wb') as f, cctx.stream_writer(f) as writer:
+        writer.write((','.join(NOAA_HEADER) + '\n').encode('utf-8'))
+        for start in range(0, rows, block):
+            n = min(block, rows - start)
+            idx = rng.integers(0, vessels, size=n)
+            df = pd.DataFrame({
+                'MMSI': fleet_mmsi[idx],
+                'BaseDateTime': '2025-01-01T00:00:00',
+                'LAT': rng.uniform(-60, 60, n).round(5),
+                'LON': rng.uniform(-180, 180, n).round(5),
+                'SOG': rng.uniform(0, 25, n).round(1),
+                'COG': rng.uniform(0, 360, n).round(1),
+                'Heading': rng.integers(0, 511, n),
+                'VesselName': fleet_name[idx],
+                'IMO': fleet_imo[idx],
+                'CallSign': 'ABCD1',
+                'VesselType': fleet_type[idx],
+                'Status': rng.integers(0, 15, n),
+                'Length': 200,
+                'Width': 32,
+                'Draft': 10.5,
+                'Cargo': 70,
+                'TransceiverClass': 'A',
+            })
+            writer.write(df.to_csv(index=False, header=False).encode('utf-8'))
+
+
+def run_legacy(path: str) -> int:
+    """The original process_ais_file read path: all columns, aliases resolved per chunk"""
+    import io
+    dctx = zstd.ZstdDecompressor()
+    unique_vessels = pd.DataFrame()
+    with open(path, 'rb') as f:
+        with dctx.stream_reader(f) as reader:
+            with io.TextIOWrapper(reader, encoding='utf-8') as text_stream:
+                for chunk in pd.read_csv(text_stream, chunksize=100000):
+                    chunk.columns = [c.strip() for c in chunk.columns]
+                    mask = chunk['VesselType'].isin(range(70, 80))
+                    filtered = chunk[mask].copy()
+                    if filtered.empty:
+                        continue
+                    filtered = filtered[['MMSI', 'VesselName', 'IMO', 'VesselType']].rename(columns={
+                        'MMSI': 'mmsi', 'VesselName': 'vessel_name', 'IMO': 'imo', 'VesselType': 'ship_type'})
+                    unique_vessels = pd.concat([unique_vessels, filtered]).drop_duplicates(subset=['vessel_name'])
+    return len(unique_vessels)
+
+
+def run_projected(path: str, engine: str) -> int:
+    """The column-projected reader with the same incremental dedup as process_ais_file"""
+    from ais_reader import iter_cargo_chunks
+    from vessel_index import VesselIndex
+    unique_vessels = VesselIndex()
+    for _, filtered in iter_cargo_chunks(path, engine=engine):
+        unique_vessels.add(filtered)
+    return len(unique_vessels)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    # VmHWM is reset on exec; ru_maxrss would inherit the generator's peak on Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms KB
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_variant(variant: str, path: str):
+    """Run a single variant and print a JSON result line"""
+    start = time.perf_counter()
+    if variant == 'legacy':
+        vessels = run_legacy(path)
+    else:
+        vessels = run_projected(path, engine=variant)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'variant': variant, 'seconds': elapsed, 'vessels': vessels, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AIS file readers")
+    parser.add_argument('--rows', type=int, default=1000000, help="Synthetic rows to generate")
+    parser.add_argument('--vessels', type=int, default=20000, help="Distinct vessels in the synthetic fleet")
+    parser.add_argument('--file', help="Use an existing .csv.zst instead of generating one")
+    parser.add_argument('--variant', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.file)
+        return
+
+    tmp_dir = None
+    path = args.file
+    if not path:
+        tmp_dir = tempfile.mkdtemp(prefix='ais_bench_')
+        path = os.path.join(tmp_dir, 'ais-synthetic.csv.zst')
+        print(f"Generating {args.rows} synthetic rows -> {path}")
+        generate_synthetic_file(path, args.rows, vessels=args.vessels)
+        print(f"  Compressed size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+    variants = ['legacy', 'pandas']
+    try:
+        import pyarrow  # noqa: F401
+        variants.append('pyarrow')
+    except ImportError:
+        print("pyarrow not installed - skipping pyarrow engine")
+
+    results = []
+    for variant in variants:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--variant', variant, '--file', path],
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    base = results[0]
+    print(f"\n{'variant':<10}{'seconds':>10}{'speedup':>10}{'peak RSS MB':>14}{'vessels':>10}")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else 'n/a'
+        print(f"{r['variant']:<10}{r['seconds']:>10.2f}{base['seconds'] / r['seconds']:>9.1f}x{rss:>14}{r['vessels']:>10}")
+
+    if tmp_dir:
+        os.remove(path)
+        os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Booking Watcher Benchmark
+Runs BookingWatcher (polling) on a temporary inbox against the local PostgREST
+stand-in from bench_bulk_upsert, then drops copies of the sample PDFs into the
+inbox the way a slow network copy would (first half, a pause, the rest) plus
+one unreadable PDF. Reports the time from arrival to the row being stored and
+checks that every copy ended in done/, the unreadable one in failed/, and every
+sample booking reached the table.
+
+Usage:
+    python docs/bench_booking_watcher.py --pdfs 30 --workers 2
+"""
+
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_bulk_upsert import StandIn
+from booking_watcher import BookingWatcher, DONE_DIR, FAILED_DIR
+from extract_bookings import BOOKING_DIR, extract_booking_fields
+
+
+def drop(path: str, data: bytes, pause_s: float):
+    """Write a file in two halves, like a copy still in progress"""
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+        f.flush()
+        time.sleep(pause_s)
+        f.write(data[len(data) // 2:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the booking inbox watcher against a local PostgREST stand-in")
+    parser.add_argument('--pdfs', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--interval-ms', type=float, default=100, help="Time between arrivals")
+    parser.add_argument('--rtt-ms', type=float, default=80, help="Fixed latency per upsert request")
+    parser.add_argument('--settle', type=float, default=0.5)
+    args = parser.parse_args()
+
+    samples = sorted(os.path.join(BOOKING_DIR, f) for f in os.listdir(BOOKING_DIR) if f.lower().endswith('.pdf'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = {extract_booking_fields(p)['booking_no'] for p in samples}
+
+    store = StandIn(args.rtt_ms / 1000, 200 / 1e6, 0.0, key='booking_no')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), store.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    inbox = tempfile.mkdtemp(prefix='booking_inbox_')
+    watcher = BookingWatcher([inbox], base_url, 'test-key', workers=args.workers,
+                             settle_s=args.settle, poll_s=0.2, use_events=False)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        runner = threading.Thread(target=watcher.run)
+        runner.start()
+        start = time.perf_counter()
+        for i in range(args.pdfs):
+            sample = samples[i % len(samples)]
+            with open(sample, 'rb') as f:
+                drop(os.path.join(inbox, f"{i:04d}_{os.path.basename(sample)}"), f.read(), args.settle / 2)
+            time.sleep(args.interval_ms / 1000)
+        drop(os.path.join(inbox, 'unreadable.pdf'), b'%PDF-1.4\nnot really a pdf\n%%EOF\n', 0)
+        while watcher.done + watcher.failed < args.pdfs + 1 and time.perf_counter() - start < 600:
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - start
+        watcher.stop()
+        runner.join()
+    server.shutdown()
+
+    done = len([f for f in os.listdir(os.path.join(inbox, DONE_DIR)) if f.lower().endswith('.pdf')])
+    failed = sorted(f for f in os.listdir(os.path.join(inbox, FAILED_DIR)) if f.lower().endswith('.pdf'))
+    latencies = sorted(watcher.latencies_s)
+    print(f"{args.pdfs} PDFs arriving every {args.interval_ms:.0f} ms, {args.workers} workers, "
+          f"{args.rtt_ms:.0f} ms upsert RTT, settle {args.settle:g}s")
+    print(f"  all processed in {elapsed:.1f}s; arrival to stored p50 {latencies[len(latencies) // 2]:.2f}s, "
+          f"p90 {latencies[int(len(latencies) * 0.9)]:.2f}s, max {latencies[-1]:.2f}s")
+    print(f"  done {done}/{args.pdfs}, failed {failed}, sample bookings stored: {expected <= set(store.rows)}, "
+          f"upsert requests {store.requests}")
+    shutil.rmtree(inbox)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Bulk Upsert Benchmark
+Runs BulkUpserter against a local stand-in for the PostgREST endpoint that
+adds a fixed round-trip latency plus a per-row cost, fails a share of requests
+with 503, and rejects rows whose key (vessel_name) contains 'INVALID' with a 400.
+Compares the old serial 1000-row loop with the concurrent engine and checks
+that every valid row landed and every invalid row was dead-lettered.
+
+Usage:
+    python docs/bench_bulk_upsert.py --rows 50000 --rtt-ms 80 --concurrency 1 4 8
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_upsert import BulkUpserter, make_session, read_dead_letters
+
+
+class StandIn:
+    """In-memory table (vessel_master by default) behind a PostgREST-shaped HTTP endpoint"""
+
+    def __init__(self, rtt_s: float, per_row_s: float, fail_rate: float, key: str = 'vessel_name'):
+        self.rows = {}
+        self.key = key
+        self.lock = threading.Lock()
+        self.rtt_s = rtt_s
+        self.per_row_s = per_row_s
+        self.fail_rate = fail_rate
+        self.requests = 0
+
+    def handler(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes = b''):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                rows = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                with store.lock:
+                    store.requests += 1
+                time.sleep(store.rtt_s + store.per_row_s * len(rows))
+                if random.random() < store.fail_rate:
+                    self._reply(503, b'{"message":"upstream unavailable"}')
+                    return
+                bad = [r[store.key] for r in rows if 'INVALID' in r[store.key]]
+                if bad:
+                    self._reply(400, json.dumps({'code': '22P02', 'message': f'invalid input: {bad[0]}'}).encode())
+                    return
+                with store.lock:
+                    for r in rows:
+                        store.rows[r[store.key]] = r
+                self._reply(201)
+
+        return Handler
+
+
+def serial_loop(base_url: str, records: list) -> float:
+    """The previous shape: one 1000-row request at a time, failures printed and dropped"""
+    session = make_session(1)
+    start = time.perf_counter()
+    for k in range(0, len(records), 1000):
+        session.post(f'{base_url}/rest/v1/vessel_master', params={'on_conflict': 'vessel_name'},
+                     data=json.dumps(records[k:k + 1000]), headers={'Content-Type': 'application/json'})
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BulkUpserter against a local PostgREST stand-in")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--invalid', type=int, default=5, help="Rows the stand-in rejects")
+    parser.add_argument('--rtt-ms', type=float, default=80, help="Fixed latency per request")
+    parser.add_argument('--row-us', type=float, default=100, help="Server cost per row (microseconds)")
+    parser.add_argument('--fail-rate', type=float, default=0.05, help="Share of requests answered with 503")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    records = [{'vessel_name': f'VESSEL {i:06d}', 'mmsi': str(200000000 + i), 'imo': None,
+                'ship_type': '70.0', 'updated_at': '2025-01-01T00:00:00+00:00'} for i in range(args.rows)]
+    for i in random.Random(1).sample(range(args.rows), args.invalid):
+        records[i]['vessel_name'] = f'INVALID {i:06d}'
+    valid = {r['vessel_name'] for r in records if 'INVALID' not in r['vessel_name']}
+
+    store = StandIn(args.rtt_ms / 1000, args.row_us / 1e6, args.fail_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), store.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    serial = serial_loop(base_url, records)
+    lost = len(valid - set(store.rows))
+    print(f"{args.rows} rows, {args.invalid} invalid, {args.rtt_ms:.0f} ms RTT, {args.fail_rate:.0%} 503s")
+    print(f"  serial 1000-row loop: {serial:6.2f}s ({args.rows / serial:,.0f} rows/s), {lost} valid rows lost")
+
+    for concurrency in args.concurrency:
+        store.rows.clear()
+        dead_path = os.path.join(tempfile.mkdtemp(prefix='dead_letters_'), 'vessel_master.jsonl')
+        start = time.perf_counter()
+        with BulkUpserter('vessel_master', 'vessel_name', base_url, 'test-key', concurrency=concurrency,
+                          target_latency_s=0.5, dead_letter_path=dead_path) as upserter:
+            upserter.submit(records)
+        elapsed = time.perf_counter() - start
+        dead = {r['vessel_name'] for r in read_dead_letters(dead_path)}
+        complete = valid <= set(store.rows) and dead == {r['vessel_name'] for r in records} - valid
+        print(f"  engine x{concurrency}: {elapsed:6.2f}s ({args.rows / elapsed:,.0f} rows/s), "
+              f"dead-lettered {len(dead)}, all valid rows stored: {complete}")
+        print(f"    {upserter.stats.summary(upserter.batch_size)}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Carrier Spec Regression Harness
+Runs every sample PDF in docs/Booking through the carrier field specs and
+compares the result with docs/Booking/expected_fields.json (the output of the
+per-field re.search parsers the specs replaced), both on the full document
+text and through the staged page reader. Then times the field extraction
+alone over the cached page text and reports extractions per second per
+carrier template, and times classification of the first pages against the
+registered templates and against a registry padded to --templates carriers.
+
+Exits with status 1 on any difference. After an intended parser change,
+review the diff and rewrite the expected output with --update.
+
+Usage:
+    python docs/bench_carrier_specs.py --seconds 2
+    python docs/bench_carrier_specs.py --update
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import contextlib
+
+import pdfplumber
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract_bookings import BOOKING_DIR, read_pdf_text, read_booking_pages, detect_booking_type
+from carrier_specs import CarrierSpec
+from carrier_templates import REGISTRY, UNKNOWN, CarrierTemplate, TemplateRegistry
+
+EXPECTED_FILE = os.path.join(BOOKING_DIR, 'expected_fields.json')
+
+
+def extract_samples() -> dict:
+    """{file: (booking type, full text, fields from the full text, fields from the staged reader, page 1 text)}"""
+    samples = {}
+    for name in sorted(f for f in os.listdir(BOOKING_DIR) if f.lower().endswith('.pdf')):
+        path = os.path.join(BOOKING_DIR, name)
+        text = read_pdf_text(path)
+        booking_type = detect_booking_type(text)
+        fields = REGISTRY[booking_type].spec.extract(text) if booking_type != UNKNOWN else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            staged = read_booking_pages(path)
+        with pdfplumber.open(path) as pdf:
+            first_page = pdf.pages[0].extract_text() or ''
+        samples[name] = (booking_type, text, fields, staged, first_page)
+    return samples
+
+
+def padded_registry(total: int) -> TemplateRegistry:
+    """The real templates plus made-up carriers with 2-3 signatures each, `total` in all"""
+    rng = random.Random(11)
+    registry = TemplateRegistry()
+    for template in REGISTRY:
+        registry.register(template)
+    empty = CarrierSpec('PADDING', {}, [])
+    while len(registry) < total:
+        name = ''.join(rng.choice(string.ascii_uppercase) for _ in range(4))
+        words = [name + 'U', f"{name} LINE", f"{name} BOOKING CONFIRMATION"][:rng.randint(2, 3)]
+        registry.register(CarrierTemplate(name, [(w,) for w in words], empty))
+    return registry
+
+
+def time_classify(registry: TemplateRegistry, texts: list, seconds: float) -> float:
+    """Microseconds per classification"""
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for text in texts:
+            registry.classify(text)
+        runs += len(texts)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def diff(expected: dict, actual: dict) -> dict:
+    expected, actual = expected or {}, actual or {}
+    return {k: (expected.get(k), actual.get(k)) for k in sorted(set(expected) | set(actual))
+            if expected.get(k) != actual.get(k)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check carrier field specs against the sample bookings")
+    parser.add_argument('--seconds', type=float, default=2.0, help="Time spent on the throughput loop")
+    parser.add_argument('--templates', type=int, default=24, help="Registry size for the classification scaling run")
+    parser.add_argument('--update', action='store_true', help="Rewrite expected_fields.json from the current specs")
+    args = parser.parse_args()
+
+    samples = extract_samples()
+    if args.update:
+        expected = {name: {'booking_type': booking_type, 'fields': fields}
+                    for name, (booking_type, _, fields, _, _) in samples.items()}
+        with open(EXPECTED_FILE, 'w') as f:
+            json.dump(expected, f, indent=2)
+        print(f"Wrote {len(expected)} expected results to {EXPECTED_FILE}")
+        return
+
+    with open(EXPECTED_FILE, 'r') as f:
+        expected = json.load(f)
+    failures = 0
+    for name in sorted(set(expected) | set(samples)):
+        if name not in samples or name not in expected:
+            print(f"  [FAIL] {name}: {'no expected output' if name in samples else 'sample PDF missing'}")
+            failures += 1
+            continue
+        booking_type, _, fields, staged, _ = samples[name]
+        want = expected[name]
+        problems = []
+        if booking_type != want['booking_type']:
+            problems.append(f"type {want['booking_type']} -> {booking_type}")
+        if diff(want['fields'], fields):
+            problems.append(f"full text {diff(want['fields'], fields)}")
+        if diff(want['fields'], staged):
+            problems.append(f"staged {diff(want['fields'], staged)}")
+        if problems:
+            failures += 1
+            print(f"  [FAIL] {name}: " + '; '.join(problems))
+        else:
+            print(f"  [OK] {name} ({booking_type})")
+
+    texts = [(REGISTRY[t], text) for t, text, _, _, _ in samples.values() if t != UNKNOWN]
+    for template in REGISTRY:
+        template.extractions, template.seconds = 0, 0.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        for template, text in texts:
+            template.extract(text)
+    print("Extraction over the full document text:")
+    for name, extractions, seconds in REGISTRY.stats():
+        if extractions:
+            print(f"  {name:10s} {extractions / seconds:9,.0f} extractions/s ({seconds / extractions * 1e6:.0f} us each)")
+
+    first_pages = [page for _, _, _, _, page in samples.values()]
+    padded = padded_registry(args.templates)
+    print(f"Classification of first pages: {len(REGISTRY)} templates "
+          f"{time_classify(REGISTRY, first_pages, args.seconds / 2):.0f} us, "
+          f"{len(padded)} templates {time_classify(padded, first_pages, args.seconds / 2):.0f} us")
+
+    if failures:
+        print(f"{failures} sample(s) differ from {os.path.basename(EXPECTED_FILE)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Booking Extraction Benchmark
+Parses the sample PDFs in docs/Booking repeated up to --pdfs files through
+extract_bookings.iter_booking_fields at several worker counts (the parsing
+half of extract_booking_batch; no vessel lookups) and reports PDFs per second.
+Every run's fields are checked against the single-process run. Before that,
+each sample is timed with every page extracted against the staged
+read_booking_pages, which stops once the carrier's fields are found.
+
+Usage:
+    python docs/bench_extract_bookings.py --pdfs 60 --workers 1 2 4 8
+"""
+
+import os
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pdfplumber
+
+from extract_bookings import BOOKING_DIR, iter_booking_fields, read_pdf_text, read_booking_pages, parse_booking_text
+
+
+def compare_staged(samples: list):
+    """Per-file latency of whole-document text vs the staged page reader"""
+    for path in samples:
+        with pdfplumber.open(path) as pdf:
+            pages = len(pdf.pages)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            full = parse_booking_text(read_pdf_text(path))
+            full_s = time.perf_counter() - start
+            start = time.perf_counter()
+            staged = read_booking_pages(path)
+            staged_s = time.perf_counter() - start
+        print(f"  {os.path.basename(path)[:32]:32s} {pages} pages: all pages {full_s * 1000:5.0f} ms, "
+              f"staged {staged_s * 1000:5.0f} ms, same fields: {full == staged}")
+
+
+def run(paths: list, workers: int) -> tuple:
+    results = [None] * len(paths)
+    start = time.perf_counter()
+    # Parsers log as they go; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, data, _ in iter_booking_fields(paths, workers):
+            results[i] = data
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel booking PDF extraction")
+    parser.add_argument('--pdfs', type=int, default=60)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    samples = sorted(os.path.join(BOOKING_DIR, f) for f in os.listdir(BOOKING_DIR) if f.lower().endswith('.pdf'))
+    paths = [samples[i % len(samples)] for i in range(args.pdfs)]
+    compare_staged(samples)
+    print(f"{len(paths)} PDFs ({len(samples)} samples), {os.cpu_count()} CPUs")
+
+    baseline = None
+    for workers in args.workers:
+        elapsed, results = run(paths, workers)
+        if baseline is None:
+            baseline = (elapsed, results)
+        print(f"  workers={workers:2d}: {elapsed:6.2f}s, {len(paths) / elapsed:6.1f} PDFs/s, "
+              f"{baseline[0] / elapsed:.1f}x, same fields: {results == baseline[1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+COPY Writer Benchmark
+Loads synthetic vessel rows into a scratch copy of vessel_master on a real
+Postgres twice: through the REST writer (bulk_upsert.BulkUpserter, the
+writer='rest' path of upsert_to_vessel_master) and through pg_copy.copy_merge
+(COPY into a temp table + one merge). The REST writer talks to a small
+PostgREST-shaped endpoint in front of the same database that runs the statement
+PostgREST generates for an upsert (INSERT ... SELECT FROM
+json_populate_recordset ... ON CONFLICT DO UPDATE), one transaction per request.
+
+A second pass over the loaded table times the update path. After every run the
+full table (every column, NULLs and updated_at included) is compared between
+the two writers, and a last check merges a block with repeated vessel names to
+confirm the last row wins.
+
+Usage (any Postgres, e.g. `docker run -e POSTGRES_PASSWORD=pg -p 5432:5432 postgres`
+or `pip install pgserver`):
+    python docs/bench_pg_copy.py --dsn postgresql://postgres:pg@localhost:5432/postgres --rows 200000
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_upsert import BulkUpserter
+from pg_copy import copy_merge, require_psycopg2, database_url
+from vessel_records import RECORD_FIELDS, to_records
+
+TABLE = 'vessel_master_bench'
+
+
+class PostgrestShim:
+    """POST /rest/v1/<table>?on_conflict=... applied to Postgres the way PostgREST does"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.local = threading.local()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def connection(self):
+        import psycopg2
+
+        if getattr(self.local, 'conn', None) is None:
+            self.local.conn = psycopg2.connect(self.dsn)
+        return self.local.conn
+
+    def handler(self):
+        shim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes = b''):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                import psycopg2
+
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                with shim.lock:
+                    shim.requests += 1
+                columns = ', '.join(RECORD_FIELDS)
+                updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in RECORD_FIELDS[1:])
+                conn = shim.connection()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(f"INSERT INTO {TABLE} ({columns}) "
+                                    f"SELECT {columns} FROM json_populate_recordset(NULL::{TABLE}, %s) "
+                                    f"ON CONFLICT (vessel_name) DO UPDATE SET {updates}", (body,))
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    self._reply(400, json.dumps({'code': e.pgcode, 'message': str(e)}).encode())
+                    return
+                self._reply(201)
+
+        return Handler
+
+
+def reset_table(conn):
+    """Scratch table with the vessel_master schema"""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"""
+            CREATE TABLE {TABLE} (
+                vessel_name TEXT PRIMARY KEY,
+                mmsi TEXT NOT NULL,
+                imo TEXT,
+                ship_type TEXT,
+                updated_at TIMESTAMPTZ DEFAULT NOW()
+            )""")
+    conn.commit()
+
+
+def rest_upsert(base_url: str, clean: pd.DataFrame, updated_at: str, concurrency: int) -> float:
+    """upsert_to_vessel_master(writer='rest') without the snapshot: to_records -> BulkUpserter"""
+    dead_letters = os.path.join(tempfile.gettempdir(), f'{TABLE}_dead.jsonl')
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with BulkUpserter(TABLE, 'vessel_name', base_url, 'bench-key', concurrency=concurrency,
+                          dead_letter_path=dead_letters) as upserter:
+            upserter.submit(to_records(clean, updated_at))
+    elapsed = time.perf_counter() - start
+    if not upserter.ok:
+        raise RuntimeError(f"REST writer dead-lettered {upserter.stats.rows_dead} rows ({dead_letters})")
+    return elapsed
+
+
+def table_contents(conn) -> pd.DataFrame:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(RECORD_FIELDS)} FROM {TABLE} ORDER BY vessel_name")
+        return pd.DataFrame(cur.fetchall(), columns=list(RECORD_FIELDS))
+
+
+def row_set(frame: pd.DataFrame) -> set:
+    """Rows as tuples with None for missing values (independent of row order and dtype)"""
+    columns = [frame[c].to_numpy(dtype=object, na_value=None) for c in ('vessel_name', 'mmsi', 'imo', 'ship_type')]
+    return set(zip(*columns))
+
+
+def synthetic(rows: int, generation: int) -> pd.DataFrame:
+    """
+    Cleaned vessel rows; a new generation changes ship_type (and some imo) so the
+    merge has to update. Names with quotes, commas, backslashes and non-ASCII
+    text, missing imo and an empty ship_type exercise the CSV encoding.
+    """
+    def name(i):
+        if i % 97 == 0:
+            return f'VESSEL "{i:07d}", LTD'
+        if i % 89 == 0:
+            return f'VESSEL\\{i:07d} ÅLESUND'
+        return f'VESSEL {i:07d}'
+
+    return pd.DataFrame({
+        'vessel_name': pd.array([name(i) for i in range(rows)], dtype='string'),
+        'mmsi': pd.array([str(200000000 + i) for i in range(rows)], dtype='string'),
+        'imo': pd.array([str(9000000 + i) if (i + generation) % 3 else pd.NA for i in range(rows)], dtype='string'),
+        'ship_type': [('' if i % 101 == 0 else f'{70 + (i + generation) % 10}.0') for i in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark COPY + merge against the REST writer on a real Postgres")
+    parser.add_argument('--dsn', default=database_url(), help="Postgres connection string (default: SUPABASE_DB_URL)")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--concurrency', type=int, default=4, help="REST writer requests in flight")
+    args = parser.parse_args()
+
+    require_psycopg2()
+    import psycopg2
+
+    if not args.dsn:
+        parser.error("--dsn is required (or set SUPABASE_DB_URL)")
+    conn = psycopg2.connect(args.dsn)
+    with conn.cursor() as cur:
+        cur.execute("SHOW server_version")
+        version = cur.fetchone()[0]
+    conn.commit()
+
+    shim = PostgrestShim(args.dsn)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), shim.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    updated_at = pd.Timestamp.now(tz='UTC').isoformat()
+    print(f"{args.rows} rows into {TABLE} on PostgreSQL {version}")
+
+    for generation, label in ((0, 'insert'), (1, 'update')):
+        clean = synthetic(args.rows, generation)
+
+        reset_table(conn)
+        if generation:
+            rest_upsert(base_url, synthetic(args.rows, 0), updated_at, args.concurrency)
+        rest = rest_upsert(base_url, clean, updated_at, args.concurrency)
+        rest_table = table_contents(conn)
+
+        reset_table(conn)
+        if generation:
+            copy_merge(synthetic(args.rows, 0), args.dsn, table=TABLE, updated_at=updated_at)
+        start = time.perf_counter()
+        merged = copy_merge(clean, args.dsn, table=TABLE, updated_at=updated_at)
+        copied = time.perf_counter() - start
+        copy_table = table_contents(conn)
+
+        print(f"  {label}: REST writer {rest:6.2f}s ({args.rows / rest:,.0f} rows/s, x{args.concurrency}), "
+              f"COPY + merge {copied:6.2f}s ({args.rows / copied:,.0f} rows/s, {merged} merged), {rest / copied:.1f}x")
+        print(f"    tables identical: {copy_table.equals(rest_table)} ({len(copy_table)} rows, "
+              f"{int(copy_table['imo'].isna().sum())} NULL imo, {int((copy_table['ship_type'] == '').sum())} empty ship_type)")
+
+    # Repeated names in one merge: the last occurrence wins
+    repeated = synthetic(1000, 0)
+    later = synthetic(1000, 1).iloc[::2]
+    block = pd.concat([repeated, later], ignore_index=True)
+    reset_table(conn)
+    copy_merge(block, args.dsn, table=TABLE, updated_at=updated_at)
+    expected = row_set(block.drop_duplicates('vessel_name', keep='last'))
+    print(f"  repeated names ({len(block)} rows, {len(expected)} vessels): last row wins: "
+          f"{row_set(table_contents(conn)) == expected}")
+
+    server.shutdown()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Port Geofence Benchmark
+Random worldwide positions plus booked vessels watching POL/POD fences; reports
+PositionGrid build time, per-port query latency and GeofenceMonitor throughput.
+
+Usage:
+    python docs/bench_port_geofence.py --rows 20000000 --watches 500
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from port_geofence import PORTS, GeofenceMonitor, PositionGrid, build_watches, haversine_nm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark port geofence queries")
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--watches', type=int, default=500, help="Booked shipments (two fences each)")
+    parser.add_argument('--block', type=int, default=1000000, help="Monitor feed block size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(-60, 60, args.rows).astype(np.float32)
+    lon = rng.uniform(-180, 180, args.rows).astype(np.float32)
+    mmsi = rng.integers(200000000, 200000000 + 50000, args.rows)
+    ts = np.sort(rng.integers(1735689600, 1735689600 + 86400, args.rows))
+    ports = list(PORTS)
+    shipments = [{'id': i, 'booking_no': f'BK{i}', 'mmsi': 200000000 + i,
+                  'pod_name': ports[i % len(ports)], 'port_of_loading': ports[(i + 7) % len(ports)]}
+                 for i in range(args.watches)]
+    watches = build_watches(shipments)
+    print(f"{args.rows:,} positions, {len(watches)} fences")
+
+    start = time.perf_counter()
+    for w in watches[:20]:
+        haversine_nm(lat, lon, w['lat'], w['lon']) <= w['radius_nm']
+    brute = (time.perf_counter() - start) / min(len(watches), 20)
+
+    start = time.perf_counter()
+    grid = PositionGrid(lat, lon)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    found = sum(len(grid.query(w['lat'], w['lon'], w['radius_nm'])) for w in watches)
+    queried = (time.perf_counter() - start) / max(len(watches), 1)
+
+    start = time.perf_counter()
+    monitor = GeofenceMonitor(watches)
+    n_events = 0
+    for s in range(0, args.rows, args.block):
+        e = s + args.block
+        n_events += len(monitor.feed(mmsi[s:e], ts[s:e], lat[s:e], lon[s:e]))
+    streamed = time.perf_counter() - start
+
+    print(f"  brute-force haversine: {brute * 1000:8.1f} ms/port")
+    print(f"  grid build:            {built:8.2f} s ({args.rows / built:,.0f} pos/s)")
+    print(f"  grid query:            {queried * 1000:8.2f} ms/port ({found} positions in fences)")
+    print(f"  monitor feed:          {streamed:8.2f} s ({args.rows / streamed:,.0f} pos/s, {n_events} events)")
+
+
+if __name__ == '__main__':
+    main()
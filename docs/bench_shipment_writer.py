@@ -0,0 +1,106 @@
+"""
+Shipment Writer Benchmark
+Upserts synthetic bookings into the local PostgREST stand-in from
+bench_bulk_upsert (fixed round-trip latency, per-row cost, a share of 503s,
+rows with 'INVALID' in booking_no rejected with 400). Compares the previous
+one-request-per-record loop (timed on --baseline records and extrapolated)
+with upsert_shipments and with records streamed one by one through
+ShipmentWriter.submit, as auto-commit does, and checks that every valid
+booking landed and exactly the invalid ones were reported as failed.
+
+Usage:
+    python docs/bench_shipment_writer.py --bookings 1000 --rtt-ms 80
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_bulk_upsert import StandIn
+from bulk_upsert import make_session
+from carrier_specs import BOOKING_FIELDS
+from shipment_writer import ShipmentWriter, upsert_shipments, shipment_row
+
+
+def make_bookings(n: int, invalid: int) -> list:
+    rng = random.Random(1)
+    records = []
+    for i in range(n):
+        record = dict.fromkeys(BOOKING_FIELDS, 'X' * 20)
+        record.update(booking_no=f'BKG{i:07d}', mmsi=float(200000000 + i) if i % 3 else float('nan'),
+                      source_file=f'booking_{i}.pdf')
+        records.append(record)
+    for i in rng.sample(range(n), invalid):
+        records[i]['booking_no'] = f'INVALID{i:07d}'
+    return records
+
+
+def per_record_loop(base_url: str, records: list) -> float:
+    """The previous shape: one upsert request per booking"""
+    session = make_session(1)
+    start = time.perf_counter()
+    for record in records:
+        session.post(f'{base_url}/rest/v1/shipments', params={'on_conflict': 'booking_no'},
+                     data=json.dumps([shipment_row(record)]), headers={'Content-Type': 'application/json'})
+    return time.perf_counter() - start
+
+
+def report(label: str, elapsed: float, writer: ShipmentWriter, store: StandIn, valid: set, invalid: set):
+    complete = valid <= set(store.rows) and set(writer.failed) == invalid
+    print(f"  {label}: {elapsed:6.2f}s ({len(valid | invalid) / elapsed:,.0f} bookings/s), "
+          f"failed {len(writer.failed)}, all valid stored and only invalid reported: {complete}")
+    print(f"    {writer.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched shipments upserts against a local PostgREST stand-in")
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--invalid', type=int, default=3, help="Bookings the stand-in rejects")
+    parser.add_argument('--baseline', type=int, default=50, help="Bookings timed with the per-record loop")
+    parser.add_argument('--rtt-ms', type=float, default=80, help="Fixed latency per request")
+    parser.add_argument('--row-us', type=float, default=200, help="Server cost per row (microseconds)")
+    parser.add_argument('--fail-rate', type=float, default=0.05, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    records = make_bookings(args.bookings, args.invalid)
+    invalid = {r['booking_no'] for r in records if 'INVALID' in r['booking_no']}
+    valid = {r['booking_no'] for r in records} - invalid
+
+    store = StandIn(args.rtt_ms / 1000, args.row_us / 1e6, 0.0, key='booking_no')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), store.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    sample = [r for r in records if 'INVALID' not in r['booking_no']][:args.baseline]
+    per_record = per_record_loop(base_url, sample) * len(records) / len(sample)
+    print(f"{len(records)} bookings, {len(invalid)} invalid, {args.rtt_ms:.0f} ms RTT, {args.fail_rate:.0%} 503s")
+    print(f"  one request per booking: ~{per_record:6.2f}s (extrapolated from {len(sample)})")
+
+    store.fail_rate = args.fail_rate
+    dead_dir = tempfile.mkdtemp(prefix='dead_letters_')
+    store.rows.clear()
+    start = time.perf_counter()
+    writer = upsert_shipments(records, base_url, 'test-key', dead_letter_path=os.path.join(dead_dir, 'batch.jsonl'))
+    report("upsert_shipments", time.perf_counter() - start, writer, store, valid, invalid)
+
+    store.rows.clear()
+    start = time.perf_counter()
+    with ShipmentWriter(base_url, 'test-key', dead_letter_path=os.path.join(dead_dir, 'shipments.jsonl')) as writer:
+        for record in records:
+            writer.submit([record])
+    report("streamed submit ", time.perf_counter() - start, writer, store, valid, invalid)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Track Simplification Benchmark
+Builds synthetic AIS tracks (cruising legs with course changes, speed changes,
+port stays and GPS jitter, reporting every few seconds) and reports points
+in/out, positional error and throughput of track_simplify.
+
+Usage:
+    python docs/bench_track_simplify.py --vessels 200 --hours 24 --tolerance 50
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from track_simplify import EARTH_RADIUS_M, simplify_sorted_block, track_error_m
+
+
+def synthetic_tracks(vessels: int, hours: float, interval_s: float = 6.0, seed: int = 7):
+    """Concatenated (mmsi, ts, lat, lon) arrays sorted by (mmsi, ts)"""
+    rng = np.random.default_rng(seed)
+    mmsi_parts, ts_parts, lat_parts, lon_parts = [], [], [], []
+    start = 1735689600
+    for v in range(vessels):
+        n = int(hours * 3600 / interval_s)
+        ts = start + np.cumsum(rng.uniform(0.5, 1.5, n) * interval_s).astype(np.int64)
+        # Piecewise-constant course and speed: a new leg every ~2 hours, some legs in port
+        legs = np.cumsum(rng.random(n) < interval_s / 7200.0)
+        n_legs = legs[-1] + 1
+        course = rng.uniform(0, 2 * np.pi, n_legs)[legs]
+        speed = np.where(rng.random(n_legs) < 0.15, 0.0, rng.uniform(8, 22, n_legs))[legs] * 0.514444
+        dt = np.diff(ts, prepend=ts[0]).astype(np.float64)
+        north = np.cumsum(speed * dt * np.cos(course))
+        east = np.cumsum(speed * dt * np.sin(course))
+        lat0, lon0 = rng.uniform(-50, 50), rng.uniform(-170, 170)
+        lat = lat0 + np.rad2deg(north / EARTH_RADIUS_M)
+        lon = lon0 + np.rad2deg(east / (EARTH_RADIUS_M * np.cos(np.deg2rad(lat0))))
+        # ~5 m GPS jitter
+        lat += rng.normal(0, 5 / 111000, n)
+        lon += rng.normal(0, 5 / 111000, n)
+        mmsi_parts.append(np.full(n, 200000000 + v, dtype=np.int64))
+        ts_parts.append(ts)
+        lat_parts.append(lat.astype(np.float32))
+        lon_parts.append(lon.astype(np.float32))
+    return (np.concatenate(mmsi_parts), np.concatenate(ts_parts),
+            np.concatenate(lat_parts), np.concatenate(lon_parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AIS track simplification")
+    parser.add_argument('--vessels', type=int, default=200)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--interval', type=float, default=6.0, help="Mean seconds between reports")
+    parser.add_argument('--tolerance', type=float, nargs='+', default=[10.0, 25.0, 50.0, 100.0])
+    parser.add_argument('--bucket', type=int, default=0, help="Optional time-bucket pre-thinning (seconds)")
+    args = parser.parse_args()
+
+    mmsi, ts, lat, lon = synthetic_tracks(args.vessels, args.hours, args.interval)
+    print(f"Synthetic tracks: {args.vessels} vessels, {len(ts)} points")
+    print(f"\n{'tol m':>7}{'points in':>12}{'points out':>12}{'reduction':>11}{'max err m':>11}"
+          f"{'p99 err m':>11}{'pts/sec':>14}")
+
+    _, starts = np.unique(mmsi, return_index=True)
+    ends = np.append(starts[1:], len(mmsi))
+    for tolerance in args.tolerance:
+        start = time.perf_counter()
+        kept = simplify_sorted_block(mmsi, ts, lat, lon, tolerance, args.bucket)
+        elapsed = time.perf_counter() - start
+
+        keep_mask = np.zeros(len(ts), dtype=bool)
+        keep_mask[kept] = True
+        errors = np.concatenate([
+            track_error_m(ts[s:e], lat[s:e], lon[s:e], np.flatnonzero(keep_mask[s:e]))
+            for s, e in zip(starts, ends)
+        ])
+        print(f"{tolerance:>7.0f}{len(ts):>12}{len(kept):>12}{1 - len(kept) / len(ts):>10.1%}"
+              f"{errors.max():>11.1f}{np.percentile(errors, 99):>11.1f}{len(ts) / elapsed:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Tracking Sync Benchmark
+Runs tracking_sync against a local mock of the AIS Vessel Finder API: each
+/getAisData call takes a fixed latency, the mock enforces its own rate limit
+(429 with Retry-After beyond it) and a share of MMSIs have no data. Compares
+the sync route's shape (one request per shipment, in sequence) with the
+deduplicated, rate-limited worker, including a run configured above the
+mock's limit, and checks every shipment got the position of its own vessel.
+
+Usage:
+    python docs/bench_tracking_sync.py --shipments 200 --vessels 40 --limit 10
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tracking_sync import TokenBucket, api_headers, build_tracking_rows, fetch_vessel, sync_positions, SyncStats
+from bulk_upsert import make_session
+
+
+class MockVesselAPI:
+    """getAisData for a fixed fleet, with latency and a server-side rate limit"""
+
+    def __init__(self, fleet: dict, latency_s: float, limit: float):
+        self.fleet = fleet
+        self.latency_s = latency_s
+        self.limit = TokenBucket(limit, max(1, int(limit)))
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload, headers: dict = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with api.lock:
+                    api.requests += 1
+                url = urlparse(self.path)
+                if url.path != '/getAisData' or not self.headers.get('x-rapidapi-key'):
+                    self._reply(404 if url.path != '/getAisData' else 401, {'message': 'not found'})
+                    return
+                # The API rejects instead of queueing
+                if not api.limit.try_acquire():
+                    with api.lock:
+                        api.throttled += 1
+                    self._reply(429, {'message': 'Too many requests'}, {'Retry-After': '1'})
+                    return
+                time.sleep(api.latency_s)
+                mmsi = parse_qs(url.query).get('mmsi', [''])[0]
+                vessel = api.fleet.get(mmsi)
+                self._reply(200, [vessel] if vessel else [])
+
+        return Handler
+
+
+def make_fleet(vessels: int, missing: int) -> dict:
+    fleet = {}
+    for i in range(vessels):
+        mmsi = str(440000000 + i)
+        if i < missing:
+            continue
+        fleet[mmsi] = {'mmsi': mmsi, 'imo': str(9000000 + i), 'vesselName': f'VESSEL {i}', 'vesselType': 'Container Ship',
+                       'latitude': 35.0 + i / 100, 'longitude': 129.0 - i / 100, 'speedKnots': 14.2, 'course': 90,
+                       'status': 'Under way', 'updatedAt': '2025-01-01T00:00:00Z',
+                       'nextPort': {'name': 'TACOMA', 'time': '2025-01-10T00:00:00Z'}}
+    return fleet
+
+
+def per_shipment_loop(api_url: str, shipments: list) -> tuple:
+    """The sync route's shape: one request per shipment, awaited in turn"""
+    stats = SyncStats()
+    session = make_session(1)
+    bucket = TokenBucket(1e9, 10 ** 9)
+    positions = {}
+    start = time.perf_counter()
+    for shipment in shipments:
+        positions[shipment['mmsi']] = fetch_vessel(session, api_url, api_headers('test-key'), shipment['mmsi'],
+                                                   bucket, stats)
+    return time.perf_counter() - start, positions, stats
+
+
+def check(shipments: list, fleet: dict, rows: list) -> bool:
+    """Every shipment whose vessel has data got exactly its own vessel's row"""
+    by_shipment = {r['shipment_id']: r for r in rows}
+    expected = {s['id'] for s in shipments if s['mmsi'] in fleet}
+    return (set(by_shipment) == expected and len(rows) == len(expected)
+            and all(by_shipment[s['id']]['mmsi'] == s['mmsi'] for s in shipments if s['id'] in by_shipment))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tracking sync worker against a mock vessel API")
+    parser.add_argument('--shipments', type=int, default=200)
+    parser.add_argument('--vessels', type=int, default=40)
+    parser.add_argument('--missing', type=int, default=4, help="Vessels the API has no data for")
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--limit', type=float, default=10, help="Mock API requests per second")
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    fleet = make_fleet(args.vessels, args.missing)
+    shipments = [{'id': f'shipment-{i}', 'booking_no': f'BKG{i:05d}', 'mmsi': str(440000000 + i % args.vessels)}
+                 for i in range(args.shipments)]
+
+    api = MockVesselAPI(fleet, args.latency_ms / 1000, args.limit)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), api.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f"{args.shipments} shipments on {args.vessels} vessels ({args.missing} without data), "
+          f"{args.latency_ms:.0f} ms API latency, mock limit {args.limit:g}/s")
+
+    elapsed, positions, stats = per_shipment_loop(api_url, shipments)
+    rows, _ = build_tracking_rows(shipments, positions)
+    print(f"  one request per shipment: {elapsed:6.2f}s, {stats.requests} requests, "
+          f"{stats.throttled} throttled, positions correct: {check(shipments, fleet, rows)}")
+
+    for rate in (args.limit, args.limit * 3):
+        api.requests = api.throttled = 0
+        time.sleep(1)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows, details, stats = sync_positions(shipments, api_url, 'test-key', rate=rate, burst=int(args.limit),
+                                                  concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        print(f"  worker at {rate:g}/s x{args.concurrency}: {elapsed:6.2f}s, {api.requests} requests "
+              f"({api.throttled} answered 429), positions correct: {check(shipments, fleet, rows)}")
+        print(f"    {stats.summary()}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
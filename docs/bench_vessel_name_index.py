@@ -0,0 +1,108 @@
+"""
+Vessel Name Index Benchmark
+Builds VesselNameIndex over the names in vessels_list.csv padded with synthetic
+vessel names up to --vessels (recombined words of the real names plus hull
+numbers), then times an incremental add of the last 1%, and resolves
+queries with booking-style noise (trailing dots, doubled spaces, M/V prefixes,
+a dropped or swapped letter). Reports build time, per-lookup latency
+percentiles, and how many matches were accepted (rightly or wrongly) or left
+for review.
+
+Usage:
+    python docs/bench_vessel_name_index.py --vessels 100000 --queries 5000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vessel_name_index import VesselNameIndex, canonical_name
+from vessel_lookup import VESSELS_CSV
+
+
+def synthetic_names(real: list, count: int, seed: int = 7) -> list:
+    """Real names plus made-up ones built from their words, count in total"""
+    rng = random.Random(seed)
+    vocab = sorted({w for n in real for w in canonical_name(n).split() if len(w) > 1 and not w.isdigit()})
+    names = set(real)
+    while len(names) < count:
+        words = rng.sample(vocab, rng.choice([1, 2, 2, 2, 3]))
+        suffix = rng.choice(['', '', f' {rng.randint(1, 99)}'])
+        names.add(' '.join(words) + suffix)
+    return sorted(names)
+
+
+def add_noise(name: str, rng: random.Random) -> str:
+    kind = rng.randrange(6)
+    if kind == 0:
+        return name + '.'
+    if kind == 1:
+        return name.replace(' ', '  ', 1)
+    if kind == 2:
+        return 'M/V ' + name.title()
+    letters = [i for i, ch in enumerate(name) if ch.isalpha()]
+    if len(letters) < 6:
+        return name.lower()
+    i = rng.choice(letters[1:-1])
+    if kind == 3:
+        return name[:i] + name[i + 1:]
+    if kind == 4 and i + 1 < len(name):
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name.replace(' ', '', 1)
+
+
+def percentiles(samples: list) -> str:
+    us = np.array(samples) * 1e6
+    return f"p50 {np.percentile(us, 50):6.0f} us, p99 {np.percentile(us, 99):6.0f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VesselNameIndex build and lookup latency")
+    parser.add_argument('--vessels', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=5000)
+    args = parser.parse_args()
+
+    real = pd.read_csv(VESSELS_CSV, dtype=str)['vessel_name'].dropna().str.strip().str.upper().unique().tolist()
+    names = synthetic_names(real, args.vessels)
+    rows = [{'vessel_name': n, 'mmsi': str(200000000 + i), 'imo': None, 'ship_type': '70'} for i, n in enumerate(names)]
+    tail = len(rows) // 100
+
+    index = VesselNameIndex()
+    start = time.perf_counter()
+    index.add(rows[:-tail])
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    index.add(rows[-tail:])
+    incremental = time.perf_counter() - start
+    print(f"{len(index)} vessels: build {build:.2f}s, incremental add of {tail} in {incremental * 1000:.0f} ms")
+
+    rng = random.Random(1)
+    picks = [rng.randrange(len(names)) for _ in range(args.queries)]
+    for label, make in (('exact', lambda n: n), ('noisy', lambda n: add_noise(n, rng))):
+        queries = [make(names[i]) for i in picks]
+        timings, correct, wrong, review, unresolved = [], 0, 0, 0, 0
+        for i, query in zip(picks, queries):
+            start = time.perf_counter()
+            match = index.resolve(query)
+            timings.append(time.perf_counter() - start)
+            if match is None:
+                unresolved += 1
+            elif not match['accepted']:
+                review += 1
+            elif match['mmsi'] == rows[i]['mmsi']:
+                correct += 1
+            else:
+                wrong += 1
+        print(f"  {label:5s} lookups: {percentiles(timings)}; accepted correct {correct / len(queries):.1%}, "
+              f"accepted wrong {wrong}, left for review {review}, unresolved {unresolved}")
+
+
+if __name__ == '__main__':
+    main()
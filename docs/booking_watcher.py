@@ -0,0 +1,333 @@
+"""
+Booking Inbox Watcher
+Long-running ingestion for booking PDFs: watches one or more inbox folders
+(inotify through watchdog when it is installed, otherwise a directory poll),
+waits until a new PDF has stopped changing and ends with its %%EOF marker,
+parses it on a process pool, attaches the vessel MMSI and upserts it into
+shipments through ShipmentWriter. Once its row is stored the PDF is moved to
+<inbox>/done; PDFs that cannot be parsed or stored go to <inbox>/failed with
+a .error note next to them.
+
+The inbox is the queue: at most workers * IN_FLIGHT_PER_WORKER PDFs are being
+parsed and everything else waits on disk, so a burst of thousands of files
+costs no memory. Files still in an inbox after a restart (including ones that
+were in flight) are simply picked up again; the upsert on booking_no makes
+that harmless.
+
+Usage:
+    python docs/booking_watcher.py docs/Booking/inbox --workers 4
+"""
+
+import os
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from extract_bookings import (BOOKING_DIR, DEFAULT_WORKERS, SUPABASE_URL, SUPABASE_KEY, UNKNOWN_BOOKING,
+                              extract_fields_worker, attach_vessel_mmsi, get_supabase_client, get_vessel_lookup)
+from shipment_writer import ShipmentWriter
+
+DEFAULT_INBOX = os.path.join(BOOKING_DIR, 'inbox')
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+
+# A PDF is picked up once its size and mtime have not changed for this long
+SETTLE_S = 2.0
+
+# ...and it ends with %%EOF; a settled file without one is tried anyway after this long
+INCOMPLETE_WAIT_S = 60.0
+
+# Bytes at the end of a PDF searched for %%EOF
+EOF_WINDOW = 1024
+
+# Directory poll interval (also the tick while files are settling or in flight)
+POLL_S = 1.0
+
+# With inotify events, a full rescan still runs this often in case an event was missed
+RESCAN_S = 30.0
+
+# Queued PDFs per extraction process; beyond that new files wait in the inbox
+IN_FLIGHT_PER_WORKER = 2
+
+# Read failures are retried (the copy may not have been finished) before a PDF is failed
+MAX_ATTEMPTS = 3
+
+# Partial upsert batches are sent at least this often
+FLUSH_S = 1.0
+
+
+def is_booking_pdf(name: str) -> bool:
+    """PDF names to pick up (hidden and Office/editor temp files are skipped)"""
+    return name.lower().endswith('.pdf') and not name.startswith(('.', '~'))
+
+
+def pdf_complete(path: str) -> bool:
+    """Whether a PDF ends with its %%EOF marker (a copy in progress usually does not)"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(os.fstat(f.fileno()).st_size - EOF_WINDOW, 0))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+class _InboxEvents(FileSystemEventHandler):
+    """Wakes the watcher on any change in an inbox"""
+
+    def __init__(self, wake: threading.Event):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class BookingWatcher:
+    """
+    Inbox folders -> shipments, until stop() is called.
+
+        watcher = BookingWatcher([inbox], SUPABASE_URL, SUPABASE_KEY, supabase=client)
+        watcher.run()       # blocks; stop() from a signal handler or another thread
+
+    On stop, PDFs already being parsed are finished and upserted; nothing new
+    is started.
+    """
+
+    def __init__(self, inboxes: list, base_url: str, api_key: str, workers: int = DEFAULT_WORKERS,
+                 supabase=None, lookup=None, settle_s: float = SETTLE_S, poll_s: float = POLL_S,
+                 use_events: bool = True):
+        self.inboxes = [os.path.abspath(p) for p in inboxes]
+        self.supabase = supabase
+        self.lookup = lookup or get_vessel_lookup(supabase)
+        self.workers = max(1, workers)
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.use_events = use_events and Observer is not None
+        self.writer = ShipmentWriter(base_url, api_key, on_settled=self._settled)
+        self.done = 0
+        self.failed = 0
+        self.latencies_s = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._seen = {}         # path -> ((size, mtime_ns), unchanged since, first seen)
+        self._attempts = {}     # path -> read failures so far
+        self._in_flight = {}    # future -> (path, first seen)
+        self._awaiting = {}     # booking_no -> [(path, first seen)] parsed, upsert not settled yet
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _start_observer(self):
+        if not self.use_events:
+            return None
+        observer = Observer()
+        for inbox in self.inboxes:
+            observer.schedule(_InboxEvents(self._wake), inbox, recursive=False)
+        observer.start()
+        return observer
+
+    def _busy(self) -> set:
+        with self._lock:
+            awaiting = {path for waiting in self._awaiting.values() for path, _ in waiting}
+        return awaiting | {path for path, _ in self._in_flight.values()}
+
+    def _scan(self, now: float) -> list:
+        """Settled PDFs in the inboxes that are not being processed yet, oldest first"""
+        busy = self._busy()
+        present, ready = set(), []
+        for inbox in self.inboxes:
+            try:
+                entries = list(os.scandir(inbox))
+            except OSError as e:
+                print(f"  [Error] Cannot read inbox {inbox}: {e}")
+                continue
+            for entry in entries:
+                if not is_booking_pdf(entry.name):
+                    continue
+                path = entry.path
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                present.add(path)
+                if path in busy:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                seen = self._seen.get(path)
+                if seen is None or seen[0] != signature:
+                    self._seen[path] = (signature, now, seen[2] if seen else now)
+                    continue
+                unchanged_s = now - seen[1]
+                if stat.st_size and unchanged_s >= self.settle_s and (
+                        unchanged_s >= INCOMPLETE_WAIT_S or pdf_complete(path)):
+                    ready.append(path)
+        for path in list(self._seen):
+            if path not in present:
+                del self._seen[path]
+                self._attempts.pop(path, None)
+        return sorted(ready, key=lambda p: self._seen[p][2])
+
+    def _dispatch(self, executor: ProcessPoolExecutor, ready: list):
+        capacity = self.workers * IN_FLIGHT_PER_WORKER - len(self._in_flight)
+        for path in ready[:max(capacity, 0)]:
+            self._in_flight[executor.submit(extract_fields_worker, path)] = (path, self._seen[path][2])
+
+    def _collect(self) -> tuple:
+        """Handle finished parses -> (bookings submitted, whether the pool broke)"""
+        submitted, broken = 0, False
+        for future in [f for f in self._in_flight if f.done()]:
+            path, first_seen = self._in_flight.pop(future)
+            name = os.path.basename(path)
+            try:
+                data, error = future.result()
+            except BrokenProcessPool as e:
+                data, error, broken = None, f"Worker failed: {e}", True
+            except Exception as e:
+                data, error = None, f"Worker failed: {e}"
+
+            if error and error != UNKNOWN_BOOKING:
+                self._attempts[path] = self._attempts.get(path, 0) + 1
+                if self._attempts[path] < MAX_ATTEMPTS:
+                    print(f"  [Retry] {name}: {error}")
+                    # It has to settle again before the next attempt
+                    self._seen.pop(path, None)
+                    continue
+            if not error and not data.get('booking_no'):
+                error = "No booking number found"
+            if error:
+                self._finish(path, first_seen, error)
+                continue
+
+            attach_vessel_mmsi(data, self.supabase, self.lookup)
+            with self._lock:
+                self._awaiting.setdefault(data['booking_no'], []).append((path, first_seen))
+            self.writer.submit([data])
+            submitted += 1
+        return submitted, broken
+
+    def _settled(self, booking_nos: list, error: str):
+        """ShipmentWriter callback (upserter threads): move the PDFs behind a settled batch"""
+        files = []
+        with self._lock:
+            for booking_no in booking_nos:
+                waiting = self._awaiting.get(booking_no)
+                if waiting:
+                    files.append(waiting.pop(0))
+                    if not waiting:
+                        del self._awaiting[booking_no]
+        for path, first_seen in files:
+            self._finish(path, first_seen, error and f"Upsert failed: {error}")
+
+    def _finish(self, path: str, first_seen: float, error: str = None):
+        """Move a PDF to done/ (or failed/ with an .error note) and count it"""
+        name = os.path.basename(path)
+        folder = os.path.join(os.path.dirname(path), FAILED_DIR if error else DONE_DIR)
+        stem, ext = os.path.splitext(name)
+        target, n = os.path.join(folder, name), 1
+        try:
+            os.makedirs(folder, exist_ok=True)
+            while os.path.exists(target):
+                target, n = os.path.join(folder, f"{stem}.{n}{ext}"), n + 1
+            os.replace(path, target)
+            if error:
+                with open(target + '.error', 'w', encoding='utf-8') as f:
+                    f.write(error + '\n')
+        except OSError as e:
+            print(f"  [Error] Could not move {name} to {os.path.basename(folder)}: {e}")
+            return
+        latency = time.monotonic() - first_seen
+        with self._lock:
+            if error:
+                self.failed += 1
+            else:
+                self.done += 1
+            self.latencies_s.append(latency)
+        if error:
+            print(f"  [FAILED] {name}: {error}")
+        else:
+            print(f"  [OK] {name} stored ({latency:.1f}s after arrival)")
+
+    def run(self):
+        """Watch and ingest until stop(); then drain what is in flight"""
+        for inbox in self.inboxes:
+            os.makedirs(inbox, exist_ok=True)
+        observer = self._start_observer()
+        print(f"Watching {', '.join(self.inboxes)} ({'inotify' if observer else f'polling every {self.poll_s:g}s'}, "
+              f"{self.workers} extraction processes)")
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        last_scan = last_flush = 0.0
+        unflushed = 0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                woken = self._wake.is_set()
+                self._wake.clear()
+                if observer is None or woken or self._seen or now - last_scan >= RESCAN_S:
+                    self._dispatch(executor, self._scan(now))
+                    last_scan = now
+                submitted, broken = self._collect()
+                unflushed += submitted
+                if broken:
+                    print("  [Error] Extraction pool died; restarting it")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=self.workers)
+                # Full batches go out on their own; send the rest promptly once the pool is idle
+                if unflushed and (not self._in_flight or now - last_flush >= FLUSH_S):
+                    self.writer.flush()
+                    unflushed, last_flush = 0, time.monotonic()
+                self._wake.wait(self.poll_s if observer is None or self._in_flight or self._seen else RESCAN_S)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            executor.shutdown(wait=True)
+            self._collect()
+            self.writer.close()
+            print(self.summary())
+
+    def summary(self) -> str:
+        latencies = sorted(self.latencies_s)
+        timing = ""
+        if latencies:
+            timing = (f", arrival to stored p50 {latencies[len(latencies) // 2]:.1f}s, "
+                      f"max {latencies[-1]:.1f}s")
+        return f"{self.done} bookings stored, {self.failed} PDFs failed{timing}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch inbox folders and ingest booking PDFs into shipments")
+    parser.add_argument('inboxes', nargs='*', default=[DEFAULT_INBOX],
+                        help=f"Folders to watch (default: {DEFAULT_INBOX}); processed PDFs go to done/ and failed/ inside")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Processes parsing PDFs in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--settle', type=float, default=SETTLE_S,
+                        help=f"Seconds a PDF must stay unchanged before it is picked up (default: {SETTLE_S:g})")
+    parser.add_argument('--poll', action='store_true', help="Poll the folders even if watchdog (inotify) is installed")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("ERROR: Supabase credentials not found in environment variables")
+        return
+
+    watcher = BookingWatcher(args.inboxes, SUPABASE_URL, SUPABASE_KEY, workers=args.workers,
+                             supabase=get_supabase_client(), settle_s=args.settle, use_events=not args.poll)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: watcher.stop())
+    watcher.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+"""
+Bulk Upsert Engine
+Concurrent, retrying bulk writes to a Supabase (PostgREST) table.
+
+- Several batches in flight at once over one pooled HTTP session
+- Batch size adapts to observed latency (grows while round trips are fast,
+  shrinks when they slow down or the payload is rejected as too large)
+- Transient failures (connection errors, timeouts, 429, 5xx) are retried with
+  exponential backoff and jitter, or after the server's Retry-After
+- Rows with different key sets go out as separate requests (never padded with nulls)
+- Batches rejected as invalid are bisected until the offending rows are
+  isolated; those rows go to a JSONL dead-letter file instead of being lost
+- Auth, routing and schema errors (bad key, missing table or column) stop the
+  upserter after one request; everything still queued is dead-lettered unsent
+
+Rows are POSTed straight to {SUPABASE_URL}/rest/v1/{table} with
+Prefer: resolution=merge-duplicates,return=minimal, so the server never echoes
+the batch back. Any base URL works, e.g. a local PostgREST stand-in.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEAD_LETTER_DIR = os.path.join(os.path.dirname(__file__), 'dead_letters')
+
+# Batches in flight at once
+DEFAULT_CONCURRENCY = 4
+
+# Batch size bounds and starting point (rows)
+DEFAULT_BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 5000
+
+# Round trip the batch size is steered towards (seconds)
+TARGET_LATENCY_S = 1.0
+
+# Attempts per batch for transient errors
+MAX_RETRIES = 5
+
+# HTTP statuses worth retrying as-is
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Statuses that blame the payload: the batch is bisected to isolate the bad rows.
+# Anything else (401/403 bad key, 404 missing table, ...) fails every row alike,
+# so the upserter stops sending and dead-letters the rest without requests.
+BISECT_STATUSES = {400, 409, 413, 422}
+
+# Error codes for a column the table does not have (PostgREST schema cache / Postgres);
+# every row carrying it fails alike, so these stop the upserter instead of bisecting
+MISSING_COLUMN_CODES = ('PGRST204', '42703')
+
+# Longest Retry-After honoured on 429/503 (seconds)
+MAX_RETRY_AFTER_S = 60
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """requests session whose connection pool matches the number of in-flight batches"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def retry_after(response: requests.Response) -> float:
+    """Seconds from a Retry-After header (delta form), capped at MAX_RETRY_AFTER_S; None when absent"""
+    try:
+        return min(max(float(response.headers['Retry-After']), 0.0), MAX_RETRY_AFTER_S)
+    except (KeyError, ValueError):
+        return None
+
+
+def missing_column(status, error: str) -> bool:
+    """True for a 400 caused by a column the table lacks (e.g. a migration not yet run)"""
+    return status == 400 and any(code in (error or '') for code in MISSING_COLUMN_CODES)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def shared_session(pool_size: int) -> requests.Session:
+    """Process-wide session per pool size, so successive upserters reuse warm connections"""
+    with _sessions_lock:
+        if pool_size not in _sessions:
+            _sessions[pool_size] = make_session(pool_size)
+        return _sessions[pool_size]
+
+
+class UpsertStats:
+    """Counters for one BulkUpserter"""
+
+    def __init__(self):
+        self.rows_ok = 0
+        self.rows_dead = 0
+        self.requests = 0
+        self.batches_ok = 0
+        self.retries = 0
+        self.splits = 0
+        self.latency_s = 0.0
+        self.started = time.perf_counter()
+
+    def summary(self, batch_size: int) -> str:
+        elapsed = time.perf_counter() - self.started
+        avg = self.latency_s / self.batches_ok if self.batches_ok else 0.0
+        return (f"{self.rows_ok} rows upserted in {self.batches_ok} batches ({self.rows_ok / max(elapsed, 1e-9):,.0f} rows/s), "
+                f"{self.retries} retries, {self.splits} splits, {self.rows_dead} dead-lettered; "
+                f"avg round trip {avg:.2f}s, batch size now {batch_size}")
+
+
+class BulkUpserter:
+    """
+    Buffered concurrent upserts into one table.
+
+        with BulkUpserter('vessel_master', 'vessel_name', SUPABASE_URL, SUPABASE_KEY) as upserter:
+            upserter.submit(records)
+
+    submit() blocks once `concurrency` batches are already waiting, so a fast
+    producer cannot queue unbounded memory. Batches may land out of order; a key
+    submitted twice in one run should carry the same payload (inputs here are
+    deduplicated per run).
+
+    on_settled(rows, error) is called from the worker threads for every batch
+    that was written (error None) and every batch that was dead-lettered.
+    After an auth or routing error, `fatal` holds it and ok is False.
+    """
+
+    def __init__(self, table: str, on_conflict: str, base_url: str, api_key: str,
+                 concurrency: int = DEFAULT_CONCURRENCY, batch_size: int = DEFAULT_BATCH_SIZE,
+                 min_batch: int = MIN_BATCH_SIZE, max_batch: int = MAX_BATCH_SIZE,
+                 target_latency_s: float = TARGET_LATENCY_S, max_retries: int = MAX_RETRIES,
+                 timeout: float = 60, dead_letter_path: str = None, session: requests.Session = None,
+                 on_settled=None):
+        self.table = table
+        self.url = f"{base_url.rstrip('/')}/rest/v1/{table}"
+        self.params = {'on_conflict': on_conflict} if on_conflict else {}
+        self.headers = {
+            'apikey': api_key or '',
+            'Authorization': f'Bearer {api_key or ""}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates,return=minimal',
+        }
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_latency_s = target_latency_s
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.dead_letter_path = dead_letter_path or os.path.join(DEAD_LETTER_DIR, f'{table}.jsonl')
+        self.session = session or shared_session(self.concurrency)
+        self.stats = UpsertStats()
+        self.on_settled = on_settled
+        self.fatal = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency * 2)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'upsert-{table}')
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def ok(self) -> bool:
+        """True while no row has been dead-lettered"""
+        return self.stats.rows_dead == 0 and self.fatal is None
+
+    def submit(self, records: list):
+        """Queue rows; full batches are dispatched immediately"""
+        self._buffer.extend(records)
+        while len(self._buffer) >= self.batch_size:
+            size = self.batch_size
+            batch, self._buffer = self._buffer[:size], self._buffer[size:]
+            self._dispatch(batch)
+
+    def flush(self) -> bool:
+        """Send any partial batch and wait for everything in flight; returns self.ok"""
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._dispatch(batch)
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return self.ok
+
+    def close(self) -> bool:
+        """Flush and release the worker threads"""
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _dispatch(self, batch: list):
+        self._slots.acquire()
+        future = self._executor.submit(self._send, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+        # Drop settled futures but keep failed ones so flush() re-raises their errors
+        self._futures = [f for f in self._futures if not f.done() or f.exception() is not None]
+        self._futures.append(future)
+
+    def _adapt(self, latency: float, rows: int):
+        """Steer the batch size towards target_latency_s"""
+        with self._lock:
+            if rows < self.batch_size // 2:
+                return
+            if latency > self.target_latency_s * 1.5:
+                self.batch_size = max(self.min_batch, int(self.batch_size * 0.7))
+            elif latency < self.target_latency_s * 0.5:
+                self.batch_size = min(self.max_batch, int(self.batch_size * 1.25) + 1)
+
+    def _post(self, rows: list):
+        """One request -> (status or None, error text or None, latency, Retry-After seconds or None)"""
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, params=self.params, headers=self.headers,
+                                         data=json.dumps(rows), timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            return None, str(e), time.perf_counter() - start, None
+        finally:
+            with self._lock:
+                self.stats.requests += 1
+        latency = time.perf_counter() - start
+        if response.status_code < 300:
+            return response.status_code, None, latency, None
+        return response.status_code, response.text[:500], latency, retry_after(response)
+
+    def _send(self, rows: list):
+        """Send one batch with retries; bisect rejected batches; dead-letter what cannot be written"""
+        if self.fatal:
+            self._dead_letter(rows, None, self.fatal, quiet=True)
+            return
+        # PostgREST wants the same keys on every row of a request; rows with fewer keys
+        # go in their own request rather than being padded with nulls that would overwrite
+        groups = {}
+        for row in rows:
+            groups.setdefault(frozenset(row), []).append(row)
+        if len(groups) > 1:
+            for group in groups.values():
+                self._send(group)
+            return
+        status, error = None, None
+        for attempt in range(self.max_retries + 1):
+            status, error, latency, wait_s = self._post(rows)
+            if error is None:
+                self._adapt(latency, len(rows))
+                with self._lock:
+                    self.stats.rows_ok += len(rows)
+                    self.stats.batches_ok += 1
+                    self.stats.latency_s += latency
+                if self.on_settled:
+                    self.on_settled(rows, None)
+                return
+            if status is not None and status not in RETRY_STATUSES:
+                break
+            if attempt < self.max_retries:
+                with self._lock:
+                    self.stats.retries += 1
+                if wait_s is None:
+                    wait_s = min(0.25 * 2 ** attempt, 10) * (0.5 + random.random())
+                time.sleep(wait_s)
+
+        if (status is not None and status not in RETRY_STATUSES
+                and (status not in BISECT_STATUSES or missing_column(status, error))):
+            with self._lock:
+                first = self.fatal is None
+                if first:
+                    self.fatal = f"status {status}: {(error or '')[:200]}"
+            if first:
+                print(f"  [Error] Upserts to {self.table} stopped (status {status}): {(error or '')[:200]}")
+            self._dead_letter(rows, status, error, quiet=True)
+            return
+
+        # Payload too large or rejected rows: split to find what the server will take
+        if status in BISECT_STATUSES and len(rows) > 1:
+            if status == 413:
+                with self._lock:
+                    self.batch_size = max(self.min_batch, min(self.batch_size, len(rows) // 2))
+            with self._lock:
+                self.stats.splits += 1
+            half = len(rows) // 2
+            self._send(rows[:half])
+            self._send(rows[half:])
+            return
+        self._dead_letter(rows, status, error)
+
+    def _dead_letter(self, rows: list, status, error: str, quiet: bool = False):
+        """Append permanently failed rows to the dead-letter JSONL file"""
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        with self._lock:
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps({'table': self.table, 'status': status, 'error': error,
+                                        'failed_at': stamp, 'row': row}) + '\n')
+            self.stats.rows_dead += len(rows)
+        if self.on_settled:
+            self.on_settled(rows, error or f"status {status}")
+        if not quiet:
+            print(f"  [Error] {len(rows)} rows dead-lettered to {os.path.basename(self.dead_letter_path)} "
+                  f"(status {status}): {(error or '')[:200]}")
+
+
+def read_dead_letters(path: str) -> list:
+    """Rows stored in a dead-letter file"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['row'] for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
+
+    parser = argparse.ArgumentParser(description="Replay a dead-letter file into its table")
+    parser.add_argument('path', help="Dead-letter JSONL file, e.g. docs/dead_letters/vessel_master.jsonl")
+    parser.add_argument('--table', default='vessel_master')
+    parser.add_argument('--on-conflict', default='vessel_name')
+    args = parser.parse_args()
+
+    rows = read_dead_letters(args.path)
+    if not rows:
+        print("Nothing to replay.")
+    else:
+        # Move the file aside first so rows that fail again land in a fresh one
+        replay_path = args.path + '.replaying'
+        os.replace(args.path, replay_path)
+        url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+        key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
+        with BulkUpserter(args.table, args.on_conflict, url, key, dead_letter_path=args.path) as upserter:
+            upserter.submit(rows)
+        print(upserter.stats.summary(upserter.batch_size))
+        os.remove(replay_path)
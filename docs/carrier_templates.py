@@ -0,0 +1,191 @@
+"""
+Carrier Template Registry
+Every booking layout the extractor understands, as a CarrierTemplate: its
+detection signatures, its field spec (carrier_specs), the fields that must be
+found before the staged reader stops, and how many pages can hold them.
+Adding a carrier is one register() call; nothing else dispatches on names.
+
+Classification scans the text once for every signature of every template:
+with pyahocorasick installed through an Aho-Corasick automaton, otherwise
+through one compiled alternation of all signatures (longest first, restarted
+one character after each hit so overlapping signatures are all found). The
+first registered template whose signature group is fully present wins, which
+keeps the priority of the old if/elif chain.
+
+Each template counts its extractions and the time they took, so throughput
+can be compared per carrier (see bench_carrier_specs.py).
+"""
+
+import re
+import time
+import threading
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+from carrier_specs import CarrierSpec, HMM, MSC, EVERGREEN, OOCL
+
+UNKNOWN = 'UNKNOWN'
+
+# Pages that can hold a carrier's booking details unless a template says otherwise
+DEFAULT_PAGES = 2
+
+
+def trie_pattern(words) -> str:
+    """
+    Regex matching any of words, shaped like their trie ("EGLV", "EVER", "EVERGREEN"
+    -> "E(?:GLV|VER(?:GREEN)?)"): each position branches on one character instead
+    of trying every word, and the greedy optional tails return the longest word.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        terminal = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            return ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+        return body
+
+    return build(trie)
+
+
+class CarrierTemplate:
+    """
+    One carrier booking layout.
+
+        CarrierTemplate('EVERGREEN', signatures=[('EVERGREEN',), ('EGLV',)], spec=EVERGREEN, pages=2)
+
+    signatures: groups of literal strings; the template matches when every
+    string of any one group occurs in the text. required: fields that end the
+    staged page read once filled (default: every field the spec extracts).
+    """
+
+    def __init__(self, name: str, signatures, spec: CarrierSpec, required=None, pages: int = DEFAULT_PAGES):
+        self.name = name
+        self.signatures = tuple((group,) if isinstance(group, str) else tuple(group) for group in signatures)
+        self.spec = spec
+        self.required = tuple(required) if required is not None else spec.field_keys
+        self.pages = pages
+        self.extractions = 0
+        self.seconds = 0.0
+
+    def matches(self, present: set) -> bool:
+        return any(all(s in present for s in group) for group in self.signatures)
+
+    def extract(self, text: str) -> dict:
+        start = time.perf_counter()
+        data = self.spec.extract(text)
+        self.extractions += 1
+        self.seconds += time.perf_counter() - start
+        return data
+
+    def complete(self, data: dict) -> bool:
+        """Whether every required field has been found"""
+        return bool(data) and all(data.get(field) for field in self.required)
+
+
+class TemplateRegistry:
+    """Carrier templates in priority order, with one-pass signature classification"""
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._scanner = None
+
+    def register(self, template: CarrierTemplate) -> CarrierTemplate:
+        """Add a template (replacing one of the same name in place; new names go last)"""
+        with self._lock:
+            self._templates[template.name] = template
+            self._scanner = None
+        return template
+
+    def __getitem__(self, name: str) -> CarrierTemplate:
+        return self._templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def __iter__(self):
+        return iter(list(self._templates.values()))
+
+    def __len__(self):
+        return len(self._templates)
+
+    def _build_scanner(self):
+        signatures = sorted({s for t in self._templates.values() for group in t.signatures for s in group},
+                            key=lambda s: (-len(s), s))
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for signature in signatures:
+                automaton.add_word(signature, signature)
+            automaton.make_automaton()
+            return lambda text: {signature for _, signature in automaton.iter(text)} if signatures else set()
+
+        # The pattern reports the longest signature at each hit; shorter ones starting
+        # there are its prefixes, so they are present too
+        pattern = re.compile(trie_pattern(signatures)) if signatures else None
+        prefixes = {s: {p for p in signatures if s.startswith(p)} for s in signatures}
+
+        def scan(text: str) -> set:
+            present = set()
+            pos = 0
+            while pattern is not None:
+                match = pattern.search(text, pos)
+                if match is None:
+                    break
+                present |= prefixes[match.group()]
+                pos = match.start() + 1
+            return present
+        return scan
+
+    def signatures_in(self, text: str) -> set:
+        """Every registered signature that occurs in text (one scan)"""
+        with self._lock:
+            if self._scanner is None:
+                self._scanner = self._build_scanner()
+            scanner = self._scanner
+        return scanner(text)
+
+    def classify(self, text: str) -> str:
+        """Name of the first template whose signatures are in text, or UNKNOWN"""
+        present = self.signatures_in(text)
+        for template in self:
+            if template.matches(present):
+                return template.name
+        return UNKNOWN
+
+    def stats(self) -> list:
+        """(name, extractions, seconds) per template"""
+        return [(t.name, t.extractions, t.seconds) for t in self]
+
+
+REGISTRY = TemplateRegistry()
+
+# Registration order is detection priority (the order of the former if/elif chain)
+REGISTRY.register(CarrierTemplate('HMM', [('Carrier Scac Code', 'HDMU')], HMM, pages=2, required=(
+    'booking_no', 'main_vessel_name', 'voyage_no', 'pod_name', 'eta_at_pod', 'shipper_name', 'consignee_name',
+    'agent_company', 'etd_at_pol', 'port_of_loading', 'origin', 'place_of_receipt', 'final_destination')))
+REGISTRY.register(CarrierTemplate('MSC', [('BOOKING REF', 'MSC')], MSC, pages=2, required=(
+    'booking_no', 'main_vessel_name', 'voyage_no', 'pod_name', 'eta_at_pod', 'shipper_name', 'consignee_name',
+    'etd_at_pol', 'origin', 'port_of_loading', 'final_destination')))
+REGISTRY.register(CarrierTemplate('EVERGREEN', [('EVERGREEN',), ('EGLV',)], EVERGREEN, pages=2, required=(
+    'booking_no', 'main_vessel_name', 'voyage_no', 'pod_name', 'eta_at_pod', 'shipper_name', 'consignee_name',
+    'etd_at_pol', 'port_of_loading', 'place_of_receipt', 'final_destination', 'origin')))
+REGISTRY.register(CarrierTemplate('OOCL', [('OOCL',), ('Booking Acknowledgement',)], OOCL, pages=3, required=(
+    'booking_no', 'main_vessel_name', 'voyage_no', 'etd_at_pol', 'pod_name', 'eta_at_pod', 'shipper_name',
+    'port_of_loading', 'origin', 'place_of_receipt', 'final_destination')))
+
+
+def register(template: CarrierTemplate) -> CarrierTemplate:
+    """Add a carrier template to the shared registry"""
+    return REGISTRY.register(template)
@@ -5,12 +5,26 @@ Includes smart MMSI lookup with caching via vessel_master table.
 """
 
 import pdfplumber
-import re
 import os
+import inspect
+import hashlib
+import argparse
+import threading
 import requests
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from vessel_lookup import VesselLookup, default_lookup
+from vessel_name_index import canonical_name, default_index, resolve_with_candidates
+from extraction_cache import ExtractionCache
+from shipment_writer import ShipmentWriter, upsert_shipments
+import carrier_specs
+import carrier_templates
+from carrier_specs import HMM, MSC, EVERGREEN, OOCL, parse_date
+from carrier_templates import REGISTRY, UNKNOWN
+
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
@@ -26,6 +40,13 @@ HARDCODED_VESSELS = {
     'EVER WEB': {'mmsi': '563237400', 'carrier_scac': 'EGLV', 'imo': None},
 }
 
+# Bump to invalidate cached extractions when parsing changes outside the parser functions
+# (their source is hashed into extractor_version() automatically)
+EXTRACTOR_VERSION = 1
+
+# Extraction processes for a batch from the command line (pdfplumber is CPU-bound)
+DEFAULT_WORKERS = os.cpu_count() or 1
+
 # Ship types to filter for cargo vessels
 CARGO_SHIP_TYPES = ['Cargo', 'Container Ship', 'Cargo - Hazard A (Major)', 'Cargo - Hazard B']
 
@@ -37,17 +58,30 @@ def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def get_vessel_mmsi(vessel_name: str, supabase: Client = None) -> dict:
+def get_vessel_lookup(supabase: Client = None, warm_csv: bool = False) -> VesselLookup:
+    """Shared vessel_master lookup cache; a client is created at most once when none is passed"""
+    lookup = default_lookup(supabase, warm_csv=warm_csv)
+    if lookup.supabase is None:
+        lookup.supabase = get_supabase_client()
+    return lookup
+
+
+def get_vessel_mmsi(vessel_name: str, supabase: Client = None, lookup: VesselLookup = None) -> dict:
     """
     Get MMSI for a vessel by name using:
     1. Check hardcoded references
-    2. Check vessel_master cache table in Supabase
+    2. Check the in-process lookup cache, then vessel_master in Supabase
+    3. Fuzzy-match the name against an index of all vessel_master names; only
+       confident matches fill mmsi, weaker ones come back as a suggestion
+       (suggested_mmsi / suggested_vessel) with mmsi None, for review
     """
     normalized_name = vessel_name.strip().upper()
+    canonical = canonical_name(normalized_name)
     
     # Step 0: Check hardcoded references first
-    if normalized_name in HARDCODED_VESSELS:
-        hardcoded = HARDCODED_VESSELS[normalized_name]
+    hardcoded_name = normalized_name if normalized_name in HARDCODED_VESSELS else canonical
+    if hardcoded_name in HARDCODED_VESSELS:
+        hardcoded = HARDCODED_VESSELS[hardcoded_name]
         print(f"[get_vessel_mmsi] Found hardcoded MMSI for {normalized_name}: {hardcoded['mmsi']}")
         return {
             'mmsi': hardcoded['mmsi'],
@@ -56,25 +90,35 @@ def get_vessel_mmsi(vessel_name: str, supabase: Client = None) -> dict:
             'from_cache': True,
         }
     
-    # Get or create Supabase client
-    if supabase is None:
-        supabase = get_supabase_client()
-    
-    # Step 1: Check vessel_master table
-    if supabase:
-        try:
-            result = supabase.table('vessel_master').select('mmsi, imo, ship_type').eq('vessel_name', normalized_name).execute()
-            if result.data and len(result.data) > 0:
-                cached = result.data[0]
-                print(f"[get_vessel_mmsi] Database hit for {normalized_name}: {cached['mmsi']}")
-                return {
-                    'mmsi': cached['mmsi'],
-                    'imo': cached.get('imo'),
-                    'ship_type': cached.get('ship_type'),
-                    'from_cache': True,
-                }
-        except Exception as e:
-            print(f"[get_vessel_mmsi] Database lookup failed: {e}")
+    # Step 1: Cached vessel_master rows (one query per uncached name at most)
+    if lookup is None:
+        lookup = get_vessel_lookup(supabase)
+    cached = lookup.get(normalized_name)
+    if cached.get('mmsi'):
+        print(f"[get_vessel_mmsi] vessel_master hit for {normalized_name}: {cached['mmsi']}")
+        return cached
+    
+    # Step 2: Spelling variants ("M/V YM  CAPACITY.", "EVERWEB") via the name index
+    match = resolve_with_candidates(normalized_name, lookup.supabase)
+    if match and match.get('mmsi') and match['accepted']:
+        print(f"[get_vessel_mmsi] Matched {normalized_name} to {match['vessel_name']} "
+              f"(confidence {match['confidence']}): {match['mmsi']}")
+        return {
+            'mmsi': match['mmsi'],
+            'imo': match.get('imo'),
+            'ship_type': match.get('ship_type'),
+            'matched_name': match['vessel_name'],
+            'confidence': match['confidence'],
+        }
+    if match and match.get('mmsi'):
+        print(f"[get_vessel_mmsi] {normalized_name} needs review: closest is {match['vessel_name']} "
+              f"(confidence {match['confidence']}, MMSI {match['mmsi']}), not applied")
+        return {
+            'mmsi': None,
+            'suggested_mmsi': match['mmsi'],
+            'suggested_vessel': match['vessel_name'],
+            'confidence': match['confidence'],
+        }
     
     print(f"[get_vessel_mmsi] Vessel {normalized_name} not found in database or hardcoded list")
     return {'mmsi': None}
@@ -82,177 +126,12 @@ def get_vessel_mmsi(vessel_name: str, supabase: Client = None) -> dict:
 
 def extract_hmm_booking(text: str) -> dict:
     """Extract data from HMM booking confirmation (BKKM format)"""
-    data = {
-        'carrier_scac': None,
-        'booking_no': None,
-        'main_vessel_name': None,
-        'voyage_no': None,
-        'pod_name': None,
-        'eta_at_pod': None,
-        'shipper_name': None,
-        'consignee_name': None,
-        'agent_company': None,
-        'etd_at_pol': None,
-        'carrier_name': None,
-        'port_of_loading': None,
-        'place_of_receipt': None,
-        'origin': None,
-        'final_destination': None,
-    }
-    
-    # Booking No
-    match = re.search(r'Booking No\.\s*(\S+)', text)
-    if match:
-        data['booking_no'] = match.group(1)
-    
-    # SCAC Code
-    match = re.search(r'Carrier Scac Code\s*:\s*(\w+)', text, re.IGNORECASE)
-    if match:
-        data['carrier_scac'] = match.group(1)
-    
-    # Vessel and Voyage - format: "Vessel HMM HOPE V. 059E"
-    match = re.search(r'Vessel\s+(.+?)\s+V\.\s*(\S+)', text)
-    if match:
-        data['main_vessel_name'] = match.group(1).strip()
-        data['voyage_no'] = match.group(2)
-    
-    # POD - format: "Discharge Port TACOMA, WASHINGTON,U.S.A."
-    match = re.search(r'Discharge Port\s+(.+?)(?:\s+Dis\.Port|\s+ETA)', text)
-    if match:
-        pod = match.group(1).strip()
-        data['pod_name'] = pod.split(',')[0].strip()
-    
-    # ETA - format: "Dis.Port ETA 13-Feb-2026"
-    match = re.search(r'Dis\.Port ETA\s+(\d{1,2}-[A-Za-z]{3}-\d{4})', text)
-    if match:
-        data['eta_at_pod'] = parse_date(match.group(1))
-    
-    # Shipper
-    match = re.search(r'Shipper\s+(.+?)(?:\n|$)', text)
-    if match:
-        data['shipper_name'] = match.group(1).strip()
-    
-    # Consignee (TO field)
-    match = re.search(r'^To\s+(.+?)\s+Tel\.', text, re.MULTILINE)
-    if match:
-        data['consignee_name'] = match.group(1).strip()
-    
-    # Agent Company (first line of PDF - letterhead)
-    lines = text.strip().split('\n')
-    if lines and len(lines[0]) > 5:
-        data['agent_company'] = lines[0].strip()
-    
-    # ETD - format: "ETD - BKK 15-Jan-2026"
-    match = re.search(r'ETD\s*-?\s*\w*\s*(\d{1,2}-[A-Za-z]{3}-\d{4})', text)
-    if match:
-        data['etd_at_pol'] = parse_date(match.group(1))
-    
-    # Carrier - format: "Carrier HMM CO., LTD. BY HMM (THAILAND)"
-    match = re.search(r'Carrier\s+(.+?)(?:\s+BY|\n|$)', text)
-    if match:
-        data['carrier_name'] = match.group(1).strip()
-    
-    # Port of Loading - format: "Port of Loading LAEM CHABANG,THAILAND"
-    match = re.search(r'Port of Loading\s+(.+?)(?:\n|$)', text)
-    if match:
-        data['port_of_loading'] = match.group(1).strip()
-    
-    # Origin fallback: Use Port of Loading if Origin not explicitly found
-    if not data.get('origin') and data.get('port_of_loading'):
-        data['origin'] = data['port_of_loading']
-    
-    # Place of Receipt - format: "Place of Receipt BANGKOK,THAILAND"
-    match = re.search(r'Place of Receipt\s+(.+?)(?:\n|$)', text)
-    if match:
-        data['place_of_receipt'] = match.group(1).strip()
-    
-    # Final Dest - format: "Final Dest. TACOMA, WASHINGTON,U.S.A."
-    match = re.search(r'Final Dest\.\s+(.+?)(?:\n|$)', text)
-    if match:
-        data['final_destination'] = match.group(1).strip()
-    
-    return data
+    return HMM.extract(text)
 
 
 def extract_msc_booking(text: str) -> dict:
     """Extract data from MSC booking confirmation (EBKG format)"""
-    data = {
-        'carrier_scac': 'MSCU',  # MSC's SCAC code
-        'booking_no': None,
-        'main_vessel_name': None,
-        'voyage_no': None,
-        'pod_name': None,
-        'eta_at_pod': None,
-        'shipper_name': None,
-        'consignee_name': None,
-        'agent_company': 'MSC (Direct)',  # MSC books directly
-        'etd_at_pol': None,
-        'carrier_name': 'MSC',
-        'port_of_loading': None,
-        'place_of_receipt': None,
-        'origin': None,
-        'final_destination': None,
-    }
-    
-    # Booking Ref
-    match = re.search(r'BOOKING REF\s*:\s*(\S+)', text)
-    if match:
-        data['booking_no'] = match.group(1)
-    
-    # Connecting Vessel - format: "CONNECTING VESSEL: MSC OSCAR V.FY602A"
-    match = re.search(r'CONNECTING VESSEL:\s*(.+?)\s+V\.(\S+)', text)
-    if match:
-        data['main_vessel_name'] = match.group(1).strip()
-        data['voyage_no'] = match.group(2)
-    
-    # POD - format: "P . O . D : ABIDJAN"
-    match = re.search(r'P\s*\.\s*O\s*\.\s*D\s*:\s*(.+)', text)
-    if match:
-        data['pod_name'] = match.group(1).strip()
-    
-    # ETA - format: "ETA AT POD 09 MAR"
-    match = re.search(r'ETA AT POD\s+(\d{1,2}\s+[A-Za-z]{3})', text)
-    if match:
-        date_str = match.group(1) + " 2026"  # Assume 2026
-        data['eta_at_pod'] = parse_date(date_str)
-    
-    # Shipper - format: "SHIPPER : C.P.INTERTRADE CO.,LTD"
-    match = re.search(r'SHIPPER\s*:\s*(.+?)(?:\n|$)', text)
-    if match:
-        data['shipper_name'] = match.group(1).strip()
-    
-    # Consignee (TO field) - format: "TO : DYNAMIC INTERTRANSPORT CO.,LTD."
-    match = re.search(r'^TO\s*:\s*(.+?)(?:\n|$)', text, re.MULTILINE)
-    if match:
-        data['consignee_name'] = match.group(1).strip()
-    
-    # ETD - format: "ETD : 29-JAN-26" or in FEEDER VESSEL line
-    match = re.search(r'ETD\s*:\s*(\d{1,2}-[A-Za-z]{3}-\d{2,4})', text)
-    if match:
-        data['etd_at_pol'] = parse_date(match.group(1))
-    
-    # Origin - format: "ORIGIN : SIAM BANGKOK PORT"
-    match = re.search(r'ORIGIN\s*:\s*(.+?)(?:\n|$)', text)
-    if match:
-        data['origin'] = match.group(1).strip()
-    
-    # POL - format: "P . O . L / 1st T/S : LAEM CHABANG / SINGAPORE"
-    match = re.search(r'P\s*\.\s*O\s*\.\s*L\s*/?\s*(?:1st T/S)?\s*:\s*(.+?)(?:\s*/|$|\n)', text)
-    if match:
-        data['port_of_loading'] = match.group(1).strip()
-    
-    # Final Dest - format: "FINAL DEST :"
-    match = re.search(r'FINAL DEST\s*:\s*(.+?)(?:\s+DEST\.STATE|$|\n)', text)
-    if match:
-        dest = match.group(1).strip()
-        if dest:
-            data['final_destination'] = dest
-    
-    # Origin fallback: Use Port of Loading if Origin not explicitly found
-    if not data.get('origin') and data.get('port_of_loading'):
-        data['origin'] = data['port_of_loading']
-    
-    return data
+    return MSC.extract(text)
 
 
 def extract_evergreen_booking(text: str) -> dict:
@@ -262,245 +141,138 @@ def extract_evergreen_booking(text: str) -> dict:
         050600075718
         BOOKING NO. :
     """
-    data = {
-        'carrier_scac': None,
-        'booking_no': None,
-        'main_vessel_name': None,
-        'voyage_no': None,
-        'pod_name': None,
-        'eta_at_pod': None,
-        'shipper_name': None,
-        'consignee_name': None,
-        'agent_company': 'EVERGREEN SHIPPING AGENCY (THAILAND) CO., LTD.',
-        'etd_at_pol': None,
-        'carrier_name': 'EVERGREEN LINE',
-        'port_of_loading': None,
-        'place_of_receipt': None,
-        'origin': None,
-        'final_destination': None,
-    }
-    
-    # Booking No - value appears BEFORE "APPLICATION NO.:" label
-    # Format: "050600075718 APPLICATION NO.:26012002259145"
-    match = re.search(r'(\d{10,15})\s+APPLICATION NO\.', text)
-    if match:
-        data['booking_no'] = match.group(1)
-    
-    # SCAC - format: "SCAC:EGLV"
-    match = re.search(r'SCAC[:\s]*(EGLV)', text)
-    if match:
-        data['carrier_scac'] = match.group(1)
-    
-    # Vessel/Voyage - value appears BEFORE "VESSEL/VOYAGE :" label
-    # Format: "EVER WEB 0340-021A\nVESSEL/VOYAGE :"
-    match = re.search(r'(EVER\s+\w+)\s+(\S+)\s*\n\s*VESSEL/VOYAGE', text)
-    if match:
-        data['main_vessel_name'] = match.group(1).strip()
-        data['voyage_no'] = match.group(2).strip()
-    
-    # POD - format: "PORT OF DISCHARGING :VANCOUVER, BC,CANADA"
-    match = re.search(r'PORT OF DISCHARGING\s*:(.+?)(?:\r?\n|$)', text)
-    if match:
-        pod = match.group(1).strip()
-        data['pod_name'] = pod.split(',')[0].strip()
-    
-    # ETA - search for ETA DATE after PORT OF DISCHARGING
-    # Format: "ETA DATE :2026/03/29"
-    match = re.search(r'PORT OF DISCHARGING.+?ETA DATE\s*:(\d{4}/\d{2}/\d{2})', text, re.DOTALL)
-    if match:
-        data['eta_at_pod'] = parse_date(match.group(1))
-    
-    # Shipper - format: "SHIPPER :C.P. INTERTRADE CO.,LTD."
-    match = re.search(r'SHIPPER\s*:(.+?)(?:\n|$)', text)
-    if match:
-        data['shipper_name'] = match.group(1).strip()
-    
-    # Consignee (TO field) - format: "TO:C.P. INTERTRADE CO.,LTD."
-    match = re.search(r'^TO:(.+?)(?:\n|$)', text, re.MULTILINE)
-    if match:
-        data['consignee_name'] = match.group(1).strip()
-    
-    # ETD DATE - format: "ETD DATE :2026/02/23"
-    match = re.search(r'ETD DATE\s*:(\d{4}/\d{2}/\d{2})', text)
-    if match:
-        data['etd_at_pol'] = parse_date(match.group(1))
-    
-    # Port of Loading - format: "PORT OF LOADING :LAEM CHABANG,THAILAND"
-    match = re.search(r'PORT OF LOADING\s*:(.+?)(?:\n|$)', text)
-    if match:
-        data['port_of_loading'] = match.group(1).strip()
-    
-    # Place of Receipt - format: "PLACE OF RECEIPT :LAT KRABANG,THAILAND"
-    match = re.search(r'PLACE OF RECEIPT\s*:(.+?)(?:\n|$)', text)
-    if match:
-        data['place_of_receipt'] = match.group(1).strip()
-    
-    # Final Destination - format: "FINAL DESTINATION :VANCOUVER, BC,CANADA"
-    match = re.search(r'FINAL DESTINATION\s*:(.+?)(?:\n|$)', text)
-    if match:
-        data['final_destination'] = match.group(1).strip()
-    
-    # Origin fallback: Use Port of Loading if Origin not explicitly found
-    if not data.get('origin') and data.get('port_of_loading'):
-        data['origin'] = data['port_of_loading']
-    
-    return data
+    return EVERGREEN.extract(text)
 
 
 def extract_oocl_booking(text: str) -> dict:
     """Extract data from OOCL booking acknowledgement"""
-    data = {
-        'carrier_scac': 'OOLU',  # OOCL's SCAC code
-        'booking_no': None,
-        'main_vessel_name': None,
-        'voyage_no': None,
-        'pod_name': None,
-        'eta_at_pod': None,
-        'shipper_name': None,
-        'consignee_name': None,
-        'agent_company': 'OOCL (Thailand) Limited',
-        'etd_at_pol': None,
-        'carrier_name': 'OOCL',
-        'port_of_loading': None,
-        'place_of_receipt': None,
-        'origin': None,
-        'final_destination': None,
-    }
-    
-    # Booking No
-    match = re.search(r'BOOKING NUMBER:\s*(\d+)', text)
-    if match:
-        data['booking_no'] = match.group(1)
-    
-    # Vessel and Voyage - format: "INTENDED VESSEL/VOYAGE: YM CAPACITY 064N ETD: 30 Jan 2026"
-    match = re.search(r'INTENDED VESSEL/VOYAGE:\s*(.+?)\s+ETD:', text)
-    if match:
-        vessel_voyage = match.group(1).strip()
-        parts = vessel_voyage.split()
-        if len(parts) > 1:
-            data['voyage_no'] = parts[-1]
-            data['main_vessel_name'] = " ".join(parts[:-1])
-        else:
-            data['main_vessel_name'] = vessel_voyage
-    
-    # ETD
-    match = re.search(r'INTENDED VESSEL/VOYAGE:.+?ETD:\s*(\d{1,2}\s+[A-Za-z]{3}\s+\d{4})', text, re.DOTALL)
-    if match:
-        data['etd_at_pol'] = parse_date(match.group(1))
-
-    # POD - format: "PORT OF DISCHARGE: Nansha / Nansha new port (Guangzhou South ... ETA: 14 Feb 2026"
-    match = re.search(r'PORT OF DISCHARGE:\s*(.+?)(?:\s+ETA:|$)', text)
-    if match:
-        pod = match.group(1).strip()
-        data['pod_name'] = pod.split('/')[0].strip().split('\n')[0].strip()
-    
-    # ETA
-    match = re.search(r'PORT OF DISCHARGE:.+?ETA:\s*(\d{1,2}\s+[A-Za-z]{3}\s+\d{4})', text, re.DOTALL)
-    if match:
-        data['eta_at_pod'] = parse_date(match.group(1))
-    
-    # Shipper
-    match = re.search(r'SHIPPER:\s*(.+?)(?:\n|$)', text)
-    if match:
-        data['shipper_name'] = match.group(1).strip()
-    
-    # Booking Party as fallback for Shipper/Consignee
-    match = re.search(r'BOOKING PARTY:\s*(.+?)(?:\n|$)', text)
-    if match and not data['shipper_name']:
-        data['shipper_name'] = match.group(1).strip()
-    
-    # Port of Loading
-    match = re.search(r'PORT OF LOADING:\s*(.+?)(?:\s+ETA:|\n|$)', text)
-    if match:
-        data['port_of_loading'] = match.group(1).strip()
-        data['origin'] = data['port_of_loading']
-
-    # Place of Receipt
-    match = re.search(r'PLACE OF RECEIPT:\s*(.+?)(?:\n|$)', text)
-    if match:
-        data['place_of_receipt'] = match.group(1).strip()
-
-    # Final Destination
-    match = re.search(r'FINAL DESTINATION:\s*(.+?)(?:\s+ETA:|\n|$)', text)
-    if match:
-        data['final_destination'] = match.group(1).strip()
-    
-    return data
-
+    return OOCL.extract(text)
 
 
-def parse_date(date_str: str) -> str:
-    """Parse various date formats to YYYY-MM-DD"""
-    from datetime import datetime
-    
-    formats = [
-        '%d-%b-%Y',      # 13-Feb-2026
-        '%d %b %Y',      # 09 MAR 2026
-        '%Y/%m/%d',      # 2026/03/29
-        '%d-%b-%y',      # 13-Feb-26
-        '%d-%B-%Y',      # 13-February-2026
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_str.strip(), fmt)
-            return dt.strftime('%Y-%m-%d')
-        except ValueError:
-            continue
-    
-    return None
+def detect_booking_type(text: str) -> str:
+    """Detect the type of booking document (a carrier_templates name or 'UNKNOWN')"""
+    return REGISTRY.classify(text)
 
 
-def detect_booking_type(text: str) -> str:
-    """Detect the type of booking document"""
-    if 'Carrier Scac Code' in text and 'HDMU' in text:
-        return 'HMM'
-    elif 'BOOKING REF' in text and 'MSC' in text:
-        return 'MSC'
-    elif 'EVERGREEN' in text or 'EGLV' in text:
-        return 'EVERGREEN'
-    elif 'OOCL' in text or 'Booking Acknowledgement' in text:
-        return 'OOCL'
-    return 'UNKNOWN'
-
-
-def extract_booking_data(pdf_file: "str | object", supabase: Client = None) -> dict:
+def extract_booking_data(pdf_file: "str | object", supabase: Client = None, lookup: VesselLookup = None,
+                         cache: ExtractionCache = None) -> dict:
     """
     Extract booking data from PDF file with smart MMSI lookup.
     
     Args:
         pdf_file: Path to PDF file (str) or file-like object (BytesIO)
         supabase: Supabase client instance
+        lookup: Vessel lookup cache (default: the shared one)
+        cache: Extraction cache to reuse/store the parsed fields (default: none)
     """
+    if cache is not None:
+        return extract_booking_batch([pdf_file], supabase, lookup, cache=cache)[0]
+    data = extract_booking_fields(pdf_file)
+    if data:
+        attach_vessel_mmsi(data, supabase, lookup)
+    return data
+
+
+def extract_booking_fields(pdf_file: "str | object") -> dict:
+    """Carrier-specific booking fields from a PDF, without the MMSI lookup (None if unreadable/unknown)"""
     try:
-        with pdfplumber.open(pdf_file) as pdf:
-            text = ''
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + '\n'
+        return read_booking_pages(pdf_file)
     except Exception as e:
         print(f"Error opening PDF: {e}")
         return None
+
+
+def read_pdf_text(pdf_file: "str | object") -> str:
+    """Text of every page of a PDF (path or file-like object); raises if it cannot be opened"""
+    with pdfplumber.open(pdf_file) as pdf:
+        text = ''
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + '\n'
+    return text
+
+
+def read_booking_pages(pdf_file: "str | object") -> dict:
+    """
+    Staged extraction: only as many pages as the booking needs (raises if the PDF cannot be opened).
     
+    Page 1 picks the carrier template (later pages are read only while it is
+    still unknown). Pages are then added up to the template's page limit, stopping
+    as soon as every required field is filled, so the terms-and-conditions
+    pages of a long confirmation are never extracted.
+    """
+    with pdfplumber.open(pdf_file) as pdf:
+        pages = iter(pdf.pages)
+        text, read, booking_type = '', 0, UNKNOWN
+        for page in pages:
+            page_text = page.extract_text()
+            read += 1
+            if page_text:
+                text += page_text + '\n'
+                booking_type = detect_booking_type(text)
+                if booking_type != UNKNOWN:
+                    break
+        if booking_type == UNKNOWN:
+            print(f"Unknown booking type")
+            return None
+        
+        template = REGISTRY[booking_type]
+        data = template.extract(text)
+        for page in pages:
+            if template.complete(data) or read >= template.pages:
+                break
+            page_text = page.extract_text()
+            read += 1
+            if page_text:
+                text += page_text + '\n'
+                data = template.extract(text)
+    return data
+
+
+def parse_booking_text(text: str) -> dict:
+    """Dispatch PDF text to the matching carrier template (None for an unknown booking type)"""
     booking_type = detect_booking_type(text)
-    
-    if booking_type == 'HMM':
-        data = extract_hmm_booking(text)
-    elif booking_type == 'MSC':
-        data = extract_msc_booking(text)
-    elif booking_type == 'EVERGREEN':
-        data = extract_evergreen_booking(text)
-    elif booking_type == 'OOCL':
-        data = extract_oocl_booking(text)
-    else:
+    if booking_type == UNKNOWN:
         print(f"Unknown booking type")
         return None
-    
-    # Smart MMSI lookup for vessel
+    return REGISTRY[booking_type].extract(text)
+
+
+def extractor_version() -> str:
+    """EXTRACTOR_VERSION plus a hash of the carrier templates and parsers: changes whenever a regex does"""
+    parsers = (carrier_specs, carrier_templates, read_booking_pages, parse_booking_text, detect_booking_type)
+    # Templates registered from outside carrier_templates.py are covered by their patterns
+    digest = hashlib.sha256(repr([(t.name, t.signatures, t.required, t.pages,
+                                   [(f.keys, f.regex.pattern, f.regex.flags, f.label, f.after) for f in t.spec.fields])
+                                  for t in REGISTRY]).encode())
+    for parser in parsers:
+        digest.update(inspect.getsource(parser).encode())
+    return f"{EXTRACTOR_VERSION}-{digest.hexdigest()[:16]}"
+
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Process-wide extraction cache for the current extractor version (None if it cannot be opened)"""
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            try:
+                _extraction_cache = ExtractionCache(extractor_version())
+            except Exception as e:
+                print(f"[extraction_cache] Disabled: {e}")
+                return None
+        return _extraction_cache
+
+
+def attach_vessel_mmsi(data: dict, supabase: Client = None, lookup: VesselLookup = None) -> dict:
+    """Smart MMSI lookup for the booking's vessel (fills data['mmsi'] and a missing carrier_scac)"""
     vessel_name = data.get('main_vessel_name', '')
     if vessel_name:
-        mmsi_result = get_vessel_mmsi(vessel_name, supabase)
+        mmsi_result = get_vessel_mmsi(vessel_name, supabase, lookup)
         data['mmsi'] = mmsi_result.get('mmsi')
         
         # If we got carrier_scac from MMSI lookup (e.g., hardcoded), use it if not already set
@@ -510,38 +282,177 @@ def extract_booking_data(pdf_file: "str | object", supabase: Client = None) -> d
         # Log cache status
         if mmsi_result.get('from_cache'):
             print(f"  MMSI retrieved from cache")
+        elif mmsi_result.get('matched_name'):
+            print(f"  MMSI matched via {mmsi_result['matched_name']} (confidence {mmsi_result['confidence']})")
+        elif mmsi_result.get('suggested_mmsi'):
+            # Stored with the shipment (migration_add_vessel_match_review.sql) for someone to confirm
+            data['suggested_mmsi'] = mmsi_result['suggested_mmsi']
+            data['suggested_vessel'] = f"{mmsi_result['suggested_vessel']} ({mmsi_result['confidence']})"
+            print(f"  MMSI needs review: suggested {data['suggested_vessel']}")
         elif mmsi_result.get('mmsi'):
             print(f"  MMSI retrieved from API and cached")
     
     return data
 
 
-def insert_to_supabase(records: list[dict], supabase: Client = None) -> None:
-    """Insert booking records into Supabase shipments table"""
-    if supabase is None:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            print("ERROR: Supabase credentials not found in environment variables")
-            print(f"  SUPABASE_URL: {'Set' if SUPABASE_URL else 'Not set'}")
-            print(f"  SUPABASE_KEY: {'Set' if SUPABASE_KEY else 'Not set'}")
-            return
-        supabase = get_supabase_client()
+def _pdf_label(pdf_file) -> str:
+    if isinstance(pdf_file, str):
+        return os.path.basename(pdf_file)
+    return getattr(pdf_file, 'name', None) or 'PDF'
+
+
+UNKNOWN_BOOKING = "No data/unknown booking type"
+
+
+def extract_fields_worker(source) -> tuple:
+    """Process-pool entry point: PDF path or bytes -> (booking fields or None, error message or None)"""
+    try:
+        data = read_booking_pages(BytesIO(source) if isinstance(source, bytes) else source)
+    except Exception as e:
+        return None, f"Could not read PDF: {e}"
+    return data, None if data else UNKNOWN_BOOKING
+
+
+def iter_booking_fields(pdf_files: list, workers: int = 1):
+    """
+    Parse PDFs on up to `workers` processes, yielding (index, fields, error) as each one finishes.
     
-    for record in records:
-        if not record or not record.get('booking_no'):
-            continue
-        
-        try:
-            # Use upsert to avoid duplicates based on booking_no
-            result = supabase.table('shipments').upsert(
-                record,
-                on_conflict='booking_no'
-            ).execute()
-            print(f"[OK] Inserted/Updated: {record['booking_no']}")
-        except Exception as e:
-            print(f"[ERROR] inserting {record.get('booking_no')}: {e}")
+    Paths are opened by the workers; file-like objects (e.g. Streamlit uploads)
+    are read here and shipped as bytes. A PDF that fails only sets its error.
+    """
+    if workers <= 1 or len(pdf_files) <= 1:
+        for i, pdf_file in enumerate(pdf_files):
+            yield (i,) + extract_fields_worker(pdf_file)
+        return
+    
+    sources = [f if isinstance(f, str) else f.getvalue() if hasattr(f, 'getvalue') else f.read()
+               for f in pdf_files]
+    with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+        futures = {executor.submit(extract_fields_worker, source): i for i, source in enumerate(sources)}
+        for future in as_completed(futures):
+            try:
+                data, error = future.result()
+            except Exception as e:
+                # Includes BrokenProcessPool when a worker dies
+                data, error = None, f"Worker failed: {e}"
+            yield futures[future], data, error
+
+
+def extract_booking_batch(pdf_files: list, supabase: Client = None, lookup: VesselLookup = None,
+                          progress=None, workers: int = 1, errors: dict = None,
+                          cache: ExtractionCache = None, on_record=None) -> list:
+    """
+    Extract a batch of PDFs with one vessel_master prefetch for all their vessels.
+    
+    Returns one result per input, in order (None where extraction failed).
+    PDFs are parsed on `workers` processes; progress(done, total) is called as
+    each one finishes and errors (if given) collects {index: message} for failures.
+    With a cache, PDFs parsed before by the same extractor version are not parsed again.
+    
+    With on_record(index, data), each booking gets its MMSI as soon as it is
+    parsed and is handed over right away (e.g. to a ShipmentWriter) instead of
+    waiting for the whole batch; the prefetch is then skipped.
+    """
+    results = [None] * len(pdf_files)
+    pending = list(range(len(pdf_files)))
+    keys, done = {}, 0
+    if lookup is None:
+        lookup = get_vessel_lookup(supabase)
+    
+    def record(i, data, error):
+        nonlocal done
+        results[i] = data
+        done += 1
+        if error:
+            print(f"Error extracting {_pdf_label(pdf_files[i])}: {error}")
+            if errors is not None:
+                errors[i] = error
+        elif on_record and data:
+            on_record(i, attach_vessel_mmsi(data, supabase, lookup))
+        if progress:
+            progress(done, len(pdf_files))
+    
+    if cache is not None:
+        keys = {i: cache.key_for(f) for i, f in enumerate(pdf_files)}
+        cached = cache.get_many(keys.values())
+        pending = []
+        for i in range(len(pdf_files)):
+            if keys[i] in cached:
+                data = cached[keys[i]]
+                record(i, data, None if data else UNKNOWN_BOOKING)
+            else:
+                pending.append(i)
+        if len(pending) < len(pdf_files):
+            print(f"[extraction_cache] {len(pdf_files) - len(pending)} of {len(pdf_files)} PDFs unchanged, "
+                  f"parsing {len(pending)}")
+    
+    parsed = {}
+    for j, data, error in iter_booking_fields([pdf_files[i] for i in pending], workers):
+        i = pending[j]
+        # Read failures are not cached: the file may be fixed or still being written
+        # (copied before on_record can attach the MMSI, which is not cached)
+        if error in (None, UNKNOWN_BOOKING) and keys.get(i):
+            parsed[keys[i]] = dict(data) if data else data
+        record(i, data, error)
+    if cache is not None and parsed:
+        cache.put_many(parsed)
+    if on_record:
+        return results
+    
+    names = [d['main_vessel_name'] for d in results if d and d.get('main_vessel_name')]
+    names = [n for n in names if n.strip().upper() not in HARDCODED_VESSELS]
+    lookup.prefetch(names)
+    # Names vessel_master lacks verbatim: one candidate fetch for the whole batch's fuzzy matches
+    index = default_index()
+    unmatched = [n for n in names if not lookup.get(n).get('mmsi')
+                 and not (index.resolve(n) or {}).get('accepted')]
+    try:
+        index.fetch_candidates(lookup.supabase, unmatched)
+    except Exception as e:
+        print(f"[vessel_name_index] Candidate fetch failed: {e}")
+    for data in results:
+        if data:
+            attach_vessel_mmsi(data, supabase, lookup)
+    return results
+
+
+def insert_to_supabase(records: list[dict], supabase: Client = None) -> dict:
+    """
+    Upsert booking records into the Supabase shipments table (on booking_no) in
+    batches; returns {booking_no: error} for the records that were not stored.
+    Writes go to the given client's project, or to the environment's without one.
+    """
+    if supabase is not None:
+        # supabase_url is a URL object in newer supabase-py
+        base_url, api_key = str(supabase.supabase_url), supabase.supabase_key
+    else:
+        base_url, api_key = SUPABASE_URL, SUPABASE_KEY
+    if not base_url or not api_key:
+        print("ERROR: Supabase credentials not found in environment variables")
+        print(f"  SUPABASE_URL: {'Set' if base_url else 'Not set'}")
+        print(f"  SUPABASE_KEY: {'Set' if api_key else 'Not set'}")
+        return {(r or {}).get('booking_no'): "Supabase credentials not set" for r in records if r}
+    
+    # One PostgREST request per batch instead of a client call per record
+    writer = upsert_shipments(records, base_url, api_key)
+    print(f"[OK] {writer.summary()}")
+    for booking_no, error in writer.failed.items():
+        print(f"[ERROR] inserting {booking_no}: {error}")
+    return writer.failed
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract booking PDFs into the shipments table")
+    parser.add_argument('--warm-vessel-cache', action='store_true',
+                        help="Seed the vessel lookup cache from vessels_list.csv before querying vessel_master")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Processes parsing PDFs in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Parse every PDF again instead of reusing extraction_cache.sqlite")
+    parser.add_argument('--auto-commit', action='store_true',
+                        help="Upsert each booking into shipments as soon as it is extracted")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("PDF Booking Data Extraction")
     print("=" * 60)
@@ -560,12 +471,22 @@ def main():
     
     all_records = []
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(BOOKING_DIR, pdf_file)
+    # One vessel_master prefetch for the whole folder instead of a query per PDF
+    lookup = get_vessel_lookup(supabase, warm_csv=args.warm_vessel_cache)
+    pdf_paths = [os.path.join(BOOKING_DIR, f) for f in pdf_files]
+    cache = None if args.no_cache else get_extraction_cache()
+    writer = None
+    if args.auto_commit and SUPABASE_URL and SUPABASE_KEY:
+        writer = ShipmentWriter(SUPABASE_URL, SUPABASE_KEY)
+        batch = extract_booking_batch(pdf_paths, supabase, lookup, workers=args.workers, cache=cache,
+                                      on_record=lambda i, data: writer.submit([data]))
+        writer.close()
+    else:
+        batch = extract_booking_batch(pdf_paths, supabase, lookup, workers=args.workers, cache=cache)
+    
+    for pdf_file, data in zip(pdf_files, batch):
         print(f"Processing: {pdf_file}")
         
-        data = extract_booking_data(pdf_path, supabase)
-        
         if data:
             print(f"  Booking No: {data.get('booking_no')}")
             print(f"  Carrier:    {data.get('carrier_scac')}")
@@ -585,7 +506,12 @@ def main():
     print("=" * 60)
     print("Inserting into Supabase...")
     print("=" * 60)
-    insert_to_supabase(all_records, supabase)
+    if writer is not None:
+        print(f"[OK] Committed as extracted: {writer.summary()}")
+        for booking_no, error in writer.failed.items():
+            print(f"[ERROR] inserting {booking_no}: {error}")
+    else:
+        insert_to_supabase(all_records, supabase)
     
     print("\nDone!")
 
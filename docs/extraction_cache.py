@@ -0,0 +1,134 @@
+"""
+Booking Extraction Cache
+SQLite store of parsed booking fields keyed by the PDF's SHA-256 and the
+extractor version, so unchanged PDFs are not parsed again by the next CLI run
+or Streamlit rerun. The version is derived from the carrier parser source
+(extract_bookings.extractor_version), so editing a regex makes every cached
+result stale; stale versions are deleted when the cache is opened.
+
+Only the PDF's own fields are cached, not the vessel MMSI lookup, which keeps
+changing as vessel_master grows. PDFs with no recognizable booking are cached
+as such; read failures are not (the file may be fixed or still being written).
+
+For folder paths the (size, mtime) of each file is remembered with its hash,
+so a rescan of an unchanged folder does not re-hash thousands of PDFs.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_DB = os.path.join(os.path.dirname(__file__), 'extraction_cache.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    sha256 TEXT NOT NULL,
+    version TEXT NOT NULL,
+    fields TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (sha256, version)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+# Hashes per SQLite IN (...) lookup (stays under the default variable limit)
+LOOKUP_CHUNK = 500
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Parsed booking fields by PDF content and extractor version.
+
+        cache = ExtractionCache(extractor_version())
+        keys = [cache.key_for(f) for f in pdf_files]   # paths or file-like objects
+        found = cache.get_many(keys)                    # {key: fields} for the cached ones
+        cache.put_many({key: fields})
+
+    Safe to share between threads (Streamlit reruns run on different threads).
+    """
+
+    def __init__(self, version: str, path: str = CACHE_DB):
+        self.version = version
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            stale = self._conn.execute('DELETE FROM extractions WHERE version != ?', (version,)).rowcount
+        if stale:
+            print(f"[extraction_cache] Dropped {stale} results of an older extractor version")
+
+    def close(self):
+        self._conn.close()
+
+    def key_for(self, pdf_file) -> str:
+        """SHA-256 of a PDF path's or file-like object's content (None if it cannot be read)"""
+        try:
+            if hasattr(pdf_file, 'getvalue'):
+                return content_hash(pdf_file.getvalue())
+            if not isinstance(pdf_file, str):
+                data = pdf_file.read()
+                pdf_file.seek(0)
+                return content_hash(data)
+            stat = os.stat(pdf_file)
+            path = os.path.abspath(pdf_file)
+            with self._lock:
+                row = self._conn.execute('SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?',
+                                         (path,)).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                return row[2]
+            with open(pdf_file, 'rb') as f:
+                digest = content_hash(f.read())
+            with self._lock, self._conn:
+                self._conn.execute('INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)',
+                                   (path, stat.st_size, stat.st_mtime_ns, digest))
+            return digest
+        except OSError:
+            return None
+
+    def get_many(self, keys) -> dict:
+        """{key: fields} for every cached key (fields is None for a PDF with no recognizable booking)"""
+        keys = sorted({k for k in keys if k})
+        found = {}
+        with self._lock:
+            for k in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[k:k + LOOKUP_CHUNK]
+                marks = ', '.join('?' * len(chunk))
+                rows = self._conn.execute(f'SELECT sha256, fields FROM extractions WHERE version = ? AND sha256 IN ({marks})',
+                                          [self.version] + chunk)
+                for sha256, fields in rows:
+                    found[sha256] = json.loads(fields) if fields is not None else None
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results: dict):
+        """Store {key: fields} for the current version (one transaction)"""
+        now = time.time()
+        rows = [(key, self.version, json.dumps(fields) if fields is not None else None, now)
+                for key, fields in results.items() if key]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO extractions (sha256, version, fields, created_at) '
+                                   'VALUES (?, ?, ?, ?)', rows)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM extractions')
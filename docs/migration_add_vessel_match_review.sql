@@ -0,0 +1,12 @@
+-- ============================================
+-- Add vessel match review columns to Shipments
+-- ============================================
+-- Run this SQL in Supabase SQL Editor before running the extractor.
+-- When a booking's vessel name only loosely matches vessel_master, mmsi is left
+-- empty and the closest vessel is stored here for someone to confirm.
+
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS suggested_mmsi TEXT;
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS suggested_vessel TEXT;
+
+COMMENT ON COLUMN shipments.suggested_mmsi IS 'MMSI of the closest vessel_master name when the match needs review';
+COMMENT ON COLUMN shipments.suggested_vessel IS 'Closest vessel_master name and match confidence (e.g., MSC ANNICK (0.625))';
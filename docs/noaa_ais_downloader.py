@@ -5,24 +5,32 @@ Optimized version of the user-provided code with streaming and batching.
 """
 
 import os
+import argparse
 import requests
-import zstandard as zstd
 import pandas as pd
-import io
-import json
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from ais_staging import date_key_for, is_staged, stage_ais_file, iter_staged_chunks
+from ais_download import DEFAULT_DOWNLOAD_WORKERS, SPOOL_DIR, ais_day_urls, download_days
+from ais_pipeline import DEDUP_BATCH_ROWS, run_ais_pipeline
+from vessel_index import POLICIES, VesselIndex
+from vessel_records import clean_vessels
+from ais_reader import iter_cargo_chunks, iter_cargo_segments
+from ais_checkpoint import CheckpointStore, file_fingerprint
+from process_ais_data import upsert_to_vessel_master, load_vessel_snapshot
+
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
 SUPABASE_URL = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
 
+# Old whole-day tracking list, imported once into the checkpoint store
 TRACKING_FILE = os.path.join(os.path.dirname(__file__), 'noaa_processed_urls.json')
 
-# Vessel types for Cargo/Container ships
-CARGO_VESSEL_TYPES = range(70, 80)
+# Job name of this script in the checkpoint store (entries are keyed by URL)
+CHECKPOINT_JOB = 'noaa_ais_downloader'
 
 def get_supabase_client() -> Client:
     """Get Supabase client instance"""
@@ -31,119 +39,111 @@ def get_supabase_client() -> Client:
         return None
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def load_processed_urls():
-    """Load the list of already processed URLs"""
-    if os.path.exists(TRACKING_FILE):
-        try:
-            with open(TRACKING_FILE, 'r') as f:
-                return set(json.load(f))
-        except:
-            return set()
-    return set()
-
-def save_processed_urls(processed_list):
-    """Save the list of processed URLs"""
-    with open(TRACKING_FILE, 'w') as f:
-        json.dump(list(processed_list), f, indent=2)
-
-def process_noaa_ais(url, supabase: Client):
-    """Download, decompress stream, and upsert data in batches"""
+def open_checkpoints() -> CheckpointStore:
+    """This script's checkpoint store (seeded from noaa_processed_urls.json on first use)"""
+    return CheckpointStore(CHECKPOINT_JOB, legacy_file=TRACKING_FILE)
+
+def collect_cargo_rows(chunks, unique_vessels: VesselIndex) -> int:
+    """
+    Merge cleaned cargo rows into unique_vessels from (rows_scanned, DataFrame)
+    blocks as yielded by ais_reader.iter_cargo_chunks / ais_staging.iter_staged_chunks.
+    Blocks are coalesced to DEDUP_BATCH_ROWS before cleaning. Returns rows scanned.
+    """
+    rows, pending, pending_rows = 0, [], 0
+
+    def merge():
+        batch = pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True)
+        unique_vessels.add(clean_vessels(batch))
+
+    for i, (n_rows, chunk) in enumerate(chunks):
+        rows += n_rows
+        if not chunk.empty:
+            pending.append(chunk)
+            pending_rows += len(chunk)
+        if pending_rows >= DEDUP_BATCH_ROWS:
+            merge()
+            pending, pending_rows = [], 0
+        if i % 10 == 0:
+            print(f"  Processed {rows} rows... Current unique vessels: {len(unique_vessels)}")
+    if pending:
+        merge()
+    return rows
+
+def process_noaa_ais(url, supabase: Client, stage: bool = False, local_path: str = None,
+                     pipeline: bool = True, policy: str = 'last', snapshot=None, writer: str = 'rest',
+                     checkpoints: CheckpointStore = None):
+    """
+    Download, decompress stream, and upsert data in batches.
+    With local_path the day is read from an already downloaded spool file instead of the network.
+    With pipeline=True (and no staging) network, zstd, parsing, dedup and upserts run as
+    overlapped threads (see ais_pipeline); policy 'first' lets upserts start mid-download.
+    With a VesselSnapshot only new or changed vessels are upserted; writer='copy' loads
+    vessel_master with COPY over a direct Postgres connection (see pg_copy).
+    With checkpoints a spooled day is read in checkpointed segments (with or without
+    the pipeline), so an interrupted day resumes where it stopped.
+    """
     print(f"\n{'='*60}")
     print(f"Starting NOAA AIS Download & Process: {os.path.basename(url)}")
     print(f"{'='*60}")
 
     try:
-        # 1. Start streaming download
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # 2. Setup decompression stream
-        dctx = zstd.ZstdDecompressor()
+        unique_vessels = VesselIndex(key='vessel_name', policy=policy)
         
-        unique_vessels = {} # Use dict to maintain uniqueness in memory [vessel_name] -> data
+        if pipeline and not stage:
+            sink = lambda batch: upsert_to_vessel_master(batch, supabase, snapshot=snapshot, writer=writer)
+            if local_path:
+                vessels, ok, _ = run_ais_pipeline(local_path, sink=sink, policy=policy,
+                                                  checkpoints=checkpoints, checkpoint_name=url)
+            else:
+                with requests.get(url, stream=True, timeout=30) as response:
+                    response.raise_for_status()
+                    vessels, ok, _ = run_ais_pipeline(response.raw, sink=sink, policy=policy)
+            if ok:
+                print(f"  [OK] {len(vessels)} unique cargo vessels upserted.")
+            else:
+                print("  [Error] Some upsert batches failed - day will be retried.")
+            return ok
         
-        # 3. Process decompressed stream directly with pandas in chunks
-        with dctx.stream_reader(response.raw) as reader:
-            with io.TextIOWrapper(reader, encoding='utf-8') as text_stream:
-                # Use chunksize to keep RAM usage low
-                df_iter = pd.read_csv(text_stream, chunksize=50000)
-                
-                for i, chunk in enumerate(df_iter):
-                    # Clean column names
-                    chunk.columns = [c.strip() for c in chunk.columns]
-                    
-                    # Map columns (NOAA usually uses MMSI, VesselName, IMO, VesselType)
-                    col_map = {
-                        'MMSI': ['MMSI', 'mmsi'],
-                        'VesselName': ['VesselName', 'vessel_name', 'Vessel Name', 'NAME'],
-                        'IMO': ['IMO', 'imo'],
-                        'VesselType': ['VesselType', 'vessel_type', 'Vessel Type', 'TYPE']
-                    }
-                    
-                    actual_cols = {}
-                    for target, aliases in col_map.items():
-                        for alias in aliases:
-                            if alias in chunk.columns:
-                                actual_cols[target] = alias
-                                break
-                    
-                    if 'VesselType' not in actual_cols or 'MMSI' not in actual_cols:
-                        continue
-                    
-                    # Filter Cargo/Container
-                    mask = chunk[actual_cols['VesselType']].isin(CARGO_VESSEL_TYPES)
-                    filtered = chunk[mask].copy()
-                    
-                    if filtered.empty:
-                        continue
-                    
-                    # Clean and prepare for upsert
-                    for _, row in filtered.iterrows():
-                        v_name = str(row[actual_cols['VesselName']]).strip().upper() if 'VesselName' in actual_cols else None
-                        if not v_name or v_name == 'NAN':
-                            continue
-                            
-                        mmsi_raw = row[actual_cols['MMSI']]
-                        if pd.isna(mmsi_raw): continue
-                        
-                        mmsi = str(int(float(mmsi_raw)))
-                        
-                        imo = None
-                        if 'IMO' in actual_cols and not pd.isna(row[actual_cols['IMO']]):
-                            imo_str = str(row[actual_cols['IMO']]).upper().replace('IMO', '').strip()
-                            imo = ''.join(filter(str.isdigit, imo_str))
-                        
-                        ship_type = str(row[actual_cols['VesselType']]) if 'VesselType' in actual_cols else 'Cargo'
-                        
-                        # Add to our unique set (latest data wins for this session)
-                        unique_vessels[v_name] = {
-                            'vessel_name': v_name,
-                            'mmsi': mmsi,
-                            'imo': imo if imo else None,
-                            'ship_type': ship_type,
-                            'updated_at': pd.Timestamp.now(tz='UTC').isoformat()
-                        }
-                    
-                    if i % 10 == 0:
-                        print(f"  Processed {i*50000} rows... Current unique vessels: {len(unique_vessels)}")
-
-        # 4. Batch UPSERT to Supabase
-        if unique_vessels:
-            v_list = list(unique_vessels.values())
-            print(f"\nUpserting {len(v_list)} vessels to Supabase...")
+        if stage:
+            # Staged mode: download + convert once, then read only cargo row groups from Parquet
+            date_key = date_key_for(url)
+            if is_staged(date_key):
+                print(f"  Using staged Parquet for {date_key}")
+            elif local_path:
+                stage_ais_file(local_path, date_key)
+            else:
+                with requests.get(url, stream=True, timeout=30) as response:
+                    response.raise_for_status()
+                    stage_ais_file(response.raw, date_key)
             
-            batch_size = 1000
-            for k in range(0, len(v_list), batch_size):
-                batch = v_list[k:k+batch_size]
-                try:
-                    supabase.table("vessel_master").upsert(batch, on_conflict='vessel_name').execute()
-                    if k % 5000 == 0:
-                        print(f"  Batch starting at {k} upserted.")
-                except Exception as upsert_err:
-                    print(f"  [Error] Batch starting at {k} failed: {upsert_err}")
-            
-            print("  [OK] All batches processed.")
-            return True
+            collect_cargo_rows(iter_staged_chunks(date_key), unique_vessels)
+        elif local_path and checkpoints is not None:
+            # Segment-level checkpoints: offset, rows and vessels so far survive a crash
+            fingerprint = file_fingerprint(local_path)
+            checkpoint = checkpoints.resume(url, fingerprint)
+            rows, segments = checkpoint.rows_done, checkpoint.segments_done
+            if checkpoint.byte_offset:
+                unique_vessels.add(checkpoint.vessels)
+                print(f"  Resuming after {rows} rows ({segments} segments, {len(unique_vessels)} vessels)")
+            for offset, n_rows, chunk in iter_cargo_segments(local_path, start=checkpoint.byte_offset):
+                rows += n_rows
+                segments += 1
+                unique_vessels.add(clean_vessels(chunk))
+                checkpoints.save_progress(url, fingerprint, offset, rows, segments, unique_vessels.to_frame())
+                print(f"  Processed {rows} rows... Current unique vessels: {len(unique_vessels)}")
+        elif local_path:
+            collect_cargo_rows(iter_cargo_chunks(local_path), unique_vessels)
+        else:
+            # Column-projected, cargo-filtered read straight off the compressed response
+            with requests.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                collect_cargo_rows(iter_cargo_chunks(response.raw), unique_vessels)
+
+        # Concurrent batch UPSERT to Supabase (failed rows go to dead_letters/)
+        if len(unique_vessels):
+            ok = upsert_to_vessel_master(unique_vessels.to_frame(), supabase, snapshot=snapshot, writer=writer)
+            print("  [OK] All batches processed." if ok else "  [Error] Some rows were dead-lettered.")
+            return ok
         else:
             print("  No cargo vessels found in this file.")
             return True # Still considered success
@@ -153,27 +153,65 @@ def process_noaa_ais(url, supabase: Client):
         return False
 
 def main():
+    parser = argparse.ArgumentParser(description="Download NOAA AIS days and upsert cargo vessels")
+    parser.add_argument('--stage', action='store_true',
+                        help="Convert each downloaded day into the Parquet staging cache and read from it")
+    parser.add_argument('--start', default='2025-01-01', help="First AIS day to fetch (YYYY-MM-DD)")
+    parser.add_argument('--end', default='2025-01-02', help="Last AIS day to fetch (YYYY-MM-DD)")
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help="Days downloaded concurrently into the spool")
+    parser.add_argument('--spool-dir', default=SPOOL_DIR, help="Where downloads (and resumable .part files) live")
+    parser.add_argument('--keep-spool', action='store_true', help="Keep spooled archives after processing")
+    parser.add_argument('--max-spooled', type=int, default=None,
+                        help="Days downloading or waiting in the spool at once (default: download workers + 1)")
+    parser.add_argument('--no-pipeline', action='store_true',
+                        help="Parse on the main thread instead of the threaded download/parse/upsert pipeline")
+    parser.add_argument('--policy', choices=list(POLICIES), default='last',
+                        help="Which record wins when a vessel name repeats ('first' overlaps upserts with the download)")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="Upsert every vessel seen instead of only new/changed ones")
+    parser.add_argument('--writer', choices=['rest', 'copy'], default='rest',
+                        help="vessel_master writer: REST bulk upserts, or COPY + merge over SUPABASE_DB_URL")
+    parser.add_argument('--stream', action='store_true',
+                        help="Process each day straight from the HTTP response (no spool, no resume)")
+    args = parser.parse_args()
+    
     supabase = get_supabase_client()
     if not supabase: return
     
-    processed_urls = load_processed_urls()
+    checkpoints = open_checkpoints()
+    processed_urls = checkpoints.done()
+    snapshot = None if args.no_snapshot else load_vessel_snapshot(supabase)
     
-    # URL provided by user
-    urls_to_process = [
-        "https://coast.noaa.gov/htdata/CMSP/AISDataHandler/2025/ais-2025-01-01.csv.zst",
-        "https://coast.noaa.gov/htdata/CMSP/AISDataHandler/2025/ais-2025-01-02.csv.zst" # Adding one more for "more data"
-    ]
-    
-    for url in urls_to_process:
+    urls_to_process = []
+    for url in ais_day_urls(args.start, args.end):
         if url in processed_urls:
             print(f"Skipping already processed URL: {url}")
-            continue
-            
-        success = process_noaa_ais(url, supabase)
-        if success:
-            processed_urls.add(url)
-            save_processed_urls(processed_urls)
-            
+        else:
+            urls_to_process.append(url)
+    
+    if args.stream:
+        for url in urls_to_process:
+            success = process_noaa_ais(url, supabase, stage=args.stage,
+                                       pipeline=not args.no_pipeline, policy=args.policy,
+                                       snapshot=snapshot, writer=args.writer, checkpoints=checkpoints)
+            if success:
+                checkpoints.mark_done(url)
+    else:
+        # Downloads keep running in the background while finished days are processed here
+        for url, path, error in download_days(urls_to_process, args.download_workers, args.spool_dir,
+                                              max_spooled=args.max_spooled):
+            if error:
+                print(f"  [ERROR] Download failed for {url}: {error}")
+                continue
+            success = process_noaa_ais(url, supabase, stage=args.stage, local_path=path,
+                                       pipeline=not args.no_pipeline, policy=args.policy,
+                                       snapshot=snapshot, writer=args.writer, checkpoints=checkpoints)
+            if success:
+                checkpoints.mark_done(url)
+                if not args.keep_spool:
+                    os.remove(path)
+    
     print("\nAll NOAA tasks finished.")
 
 if __name__ == "__main__":
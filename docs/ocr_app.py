@@ -11,7 +11,10 @@ if current_dir not in sys.path:
 
 # Import backend logic
 try:
-    from extract_bookings import extract_booking_data, insert_to_supabase, get_supabase_client
+    from extract_bookings import (extract_booking_batch, insert_to_supabase, get_supabase_client, get_vessel_lookup,
+                                  get_extraction_cache, DEFAULT_WORKERS, SUPABASE_URL, SUPABASE_KEY)
+    from carrier_templates import REGISTRY
+    from shipment_writer import ShipmentWriter
 except ImportError as e:
     st.error(f"Failed to import backend module: {e}")
     st.stop()
@@ -43,8 +46,16 @@ def main():
             st.error("❌ Supabase Not Connected")
             st.warning("Check your .env.local file")
         
+        warm_cache = st.checkbox("Warm vessel cache from vessels_list.csv", value=False)
+        workers = st.number_input("Extraction processes", min_value=1, max_value=64, value=DEFAULT_WORKERS,
+                                  help="PDFs parsed in parallel; use 1 for small batches")
+        use_cache = st.checkbox("Reuse cached extractions", value=True,
+                                help="Skip PDFs already parsed by this version of the carrier parsers")
+        auto_commit = st.checkbox("Auto-commit as extracted", value=False, disabled=not supabase,
+                                  help="Upsert each booking into shipments as soon as it is parsed, in batches")
+        
         st.divider()
-        st.info("Supported Formats: HMM, MSC, Evergreen")
+        st.info(f"Supported Formats: {', '.join(t.name for t in REGISTRY)}")
 
     # Main Connection
     col1, col2 = st.columns([1, 2])
@@ -91,20 +102,30 @@ def main():
                 results = []
                 progress_bar = st.progress(0)
                 
-                for i, item in enumerate(files_to_process):
-                    try:
-                        # Extract data
-                        data = extract_booking_data(item["file"], supabase)
-                        if data:
-                            # Add filename for reference
-                            data['source_file'] = item["name"]
-                            results.append(data)
-                        else:
-                            st.toast(f"Skipped {item['name']} (No data/Unknown type)", icon="⚠️")
-                    except Exception as e:
-                        st.error(f"Error processing {item['name']}: {e}")
-                    
-                    progress_bar.progress((i + 1) / len(files_to_process))
+                # Parse every PDF (in parallel), then resolve all vessels with one vessel_master prefetch
+                lookup = get_vessel_lookup(supabase, warm_csv=warm_cache)
+                errors = {}
+                # Auto-commit streams each parsed booking to the batched writer instead of waiting for Confirm
+                writer = ShipmentWriter(SUPABASE_URL, SUPABASE_KEY) if auto_commit and supabase else None
+                batch = extract_booking_batch(
+                    [item["file"] for item in files_to_process], supabase, lookup, workers=int(workers), errors=errors,
+                    cache=get_extraction_cache() if use_cache else None,
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"Parsed {done}/{total} PDFs"),
+                    on_record=(lambda i, data: writer.submit([data])) if writer else None)
+                if writer:
+                    writer.close()
+                    if writer.failed:
+                        st.error(f"Auto-commit: {len(writer.failed)} bookings not stored: " +
+                                 ", ".join(f"{b} ({e[:80]})" for b, e in writer.failed.items()))
+                    st.info(f"Auto-commit: {writer.summary()}")
+                
+                for i, (item, data) in enumerate(zip(files_to_process, batch)):
+                    if data:
+                        # Add filename for reference
+                        data['source_file'] = item["name"]
+                        results.append(data)
+                    else:
+                        st.toast(f"Skipped {item['name']} ({errors.get(i, 'No data/Unknown type')})", icon="⚠️")
                 
                 st.session_state.extracted_data = results
                 st.session_state.processed_count = len(results)
@@ -117,9 +138,9 @@ def main():
             df = pd.DataFrame(st.session_state.extracted_data)
             
             # Reorder columns slightly for better view
-            cols = ['booking_no', 'main_vessel_name', 'carrier_scac', 'mmsi', 'eta_at_pod', 'source_file']
+            cols = ['booking_no', 'main_vessel_name', 'carrier_scac', 'mmsi', 'suggested_vessel', 'eta_at_pod', 'source_file']
             # Add other cols that exist in df
-            all_cols = cols + [c for c in df.columns if c not in cols]
+            all_cols = [c for c in cols if c in df.columns] + [c for c in df.columns if c not in cols]
             
             # Use data_editor to allow modifications
             edited_df = st.data_editor(
@@ -141,22 +162,15 @@ def main():
                             # We work with the edited_df now
                             records = edited_df.to_dict('records')
                             
-                            # Clean records (remove source_file if not needed, handle NaNs)
-                            clean_records = []
-                            for r in records:
-                                clean_r = r.copy()
-                                #Remove source_file if it helps, though usually ignored if not in DB schema
-                                if 'source_file' in clean_r:
-                                    del clean_r['source_file']
-                                    
-                                # Convert NaN/None properly if needed, but extract_bookings return None for missing
-                                # Pandas might turn None to NaN. Supabase handles nulls often.
-                                # Let's ensure strict dict structure
-                                clean_records.append(clean_r)
-                            
-                            insert_to_supabase(clean_records, supabase)
-                            st.balloons()
-                            st.success("Data successfully uploaded to Supabase!")
+                            # Batched upsert; source_file and NaN cells are cleaned per row by shipment_writer
+                            failed = insert_to_supabase(records, supabase)
+                            if failed:
+                                st.error(f"{len(failed)} of {len(records)} bookings were not stored:")
+                                st.dataframe(pd.DataFrame([{'booking_no': b, 'error': e} for b, e in failed.items()]),
+                                             use_container_width=True)
+                            else:
+                                st.balloons()
+                                st.success("Data successfully uploaded to Supabase!")
                     else:
                         st.error("Cannot upload: Supabase client not initialized.")
             
@@ -0,0 +1,104 @@
+"""
+PostgreSQL COPY Writer for vessel_master
+Bulk path for full-year backfills over a direct Postgres connection instead of
+JSON through PostgREST: cleaned rows are streamed with COPY into a temporary
+table and merged with a single INSERT ... ON CONFLICT (vessel_name) DO UPDATE,
+all in one transaction.
+
+Connection string comes from SUPABASE_DB_URL (or DATABASE_URL), e.g. the
+"Connection string" shown in the Supabase dashboard. Requires psycopg2
+(pip install psycopg2-binary).
+"""
+
+import io
+import os
+
+import pandas as pd
+
+from vessel_records import RECORD_FIELDS
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+except ImportError:
+    psycopg2 = None
+
+# Rows per COPY block (bounded memory for the CSV text of one block)
+COPY_BLOCK_ROWS = 100000
+
+# NULL marker in the COPY stream; CSV treats an unquoted empty field as NULL by
+# default, which would turn '' into NULL where the REST writer stores ''
+COPY_NULL = r'\N'
+
+_connections = {}
+
+
+def require_psycopg2():
+    """The COPY writer needs psycopg2; fail with a clear message when it is missing"""
+    if psycopg2 is None:
+        raise RuntimeError("The COPY writer requires psycopg2 (pip install psycopg2-binary)")
+
+
+def database_url() -> str:
+    """Direct Postgres connection string from the environment"""
+    return os.getenv('SUPABASE_DB_URL') or os.getenv('DATABASE_URL')
+
+
+def _connect(dsn: str):
+    """One cached connection per DSN (reconnects if the previous one was closed)"""
+    conn = _connections.get(dsn)
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(dsn)
+        _connections[dsn] = conn
+    return conn
+
+
+def copy_merge(clean: pd.DataFrame, dsn: str = None, table: str = 'vessel_master',
+               updated_at: str = None, block_rows: int = COPY_BLOCK_ROWS) -> int:
+    """
+    COPY cleaned vessel rows (vessel_records.clean_vessels layout) into a temp
+    table and merge them into `table` on vessel_name; for a repeated name the
+    last row wins, as with the REST writer. Returns rows merged.
+    Raises on failure; the transaction is rolled back so nothing is half-applied.
+    """
+    require_psycopg2()
+    dsn = dsn or database_url()
+    if not dsn:
+        raise RuntimeError("No Postgres connection string (set SUPABASE_DB_URL or pass --pg-dsn)")
+    if clean.empty:
+        return 0
+
+    frame = clean[list(RECORD_FIELDS[:-1])].copy()
+    frame['updated_at'] = updated_at or pd.Timestamp.now(tz='UTC').isoformat()
+    columns = sql.SQL(', ').join(sql.Identifier(c) for c in RECORD_FIELDS)
+    target = sql.Identifier(table)
+    stage = sql.Identifier(f'{table}_stage')
+
+    conn = _connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL(
+                # copy_seq numbers the rows in COPY order so the merge can keep the last one
+                "CREATE TEMP TABLE {stage} (LIKE {target} INCLUDING DEFAULTS, "
+                "copy_seq BIGINT GENERATED ALWAYS AS IDENTITY) ON COMMIT DROP"
+            ).format(stage=stage, target=target))
+            copy_sql = sql.SQL("COPY {stage} ({columns}) FROM STDIN WITH (FORMAT csv, NULL {null})").format(
+                stage=stage, columns=columns, null=sql.Literal(COPY_NULL)).as_string(conn)
+            for start in range(0, len(frame), block_rows):
+                block = frame.iloc[start:start + block_rows].to_csv(index=False, header=False, na_rep=COPY_NULL)
+                cur.copy_expert(copy_sql, io.StringIO(block))
+
+            updates = sql.SQL(', ').join(
+                sql.SQL("{c} = EXCLUDED.{c}").format(c=sql.Identifier(c)) for c in RECORD_FIELDS[1:]
+            )
+            cur.execute(sql.SQL(
+                "INSERT INTO {target} ({columns}) "
+                "SELECT DISTINCT ON (vessel_name) {columns} FROM {stage} ORDER BY vessel_name, copy_seq DESC "
+                "ON CONFLICT (vessel_name) DO UPDATE SET {updates}"
+            ).format(target=target, columns=columns, stage=stage, updates=updates))
+            merged = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return merged
@@ -0,0 +1,316 @@
+"""
+Port Geofence
+Answers "which booked vessels are within X nm of their POD / POL" over AIS
+positions and emits arrival/departure events per shipment.
+
+- PORTS: coordinate table for the ports our bookings use (pod_name / port_of_loading)
+- PositionGrid: lat/lon grid index over a day of positions (tens of millions of rows);
+  a query only runs the vectorized haversine on the cells around one port
+- GeofenceMonitor: streaming arrival/departure detection fed with the same position
+  blocks produced by ais_reader.iter_position_chunks / ais_tracks.read_tracks
+"""
+
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ais_tracks import _select_all, read_tracks, track_dates
+
+EARTH_RADIUS_NM = 3440.065
+
+# Default fence radius around a port
+DEFAULT_RADIUS_NM = 10.0
+
+# Port coordinates (terminal area, approximate) with optional per-port radius and aliases
+PORTS = {
+    'TACOMA': {'lat': 47.27, 'lon': -122.41},
+    'SEATTLE': {'lat': 47.58, 'lon': -122.35},
+    'VANCOUVER': {'lat': 49.29, 'lon': -123.11},
+    'LOS ANGELES': {'lat': 33.74, 'lon': -118.26},
+    'LONG BEACH': {'lat': 33.75, 'lon': -118.21},
+    'OAKLAND': {'lat': 37.80, 'lon': -122.32},
+    'NEW YORK': {'lat': 40.67, 'lon': -74.10, 'aliases': ['NEWARK', 'NEW YORK/NEWARK']},
+    'SAVANNAH': {'lat': 32.12, 'lon': -81.14},
+    'HOUSTON': {'lat': 29.68, 'lon': -95.00},
+    'ABIDJAN': {'lat': 5.29, 'lon': -4.01},
+    'LAEM CHABANG': {'lat': 13.08, 'lon': 100.88},
+    'BANGKOK': {'lat': 13.70, 'lon': 100.57, 'aliases': ['SIAM BANGKOK PORT', 'KLONG TOEY', 'KHLONG TOEI', 'BANGKOK PORT']},
+    'SINGAPORE': {'lat': 1.26, 'lon': 103.80},
+    'PORT KLANG': {'lat': 3.00, 'lon': 101.39},
+    'TANJUNG PELEPAS': {'lat': 1.36, 'lon': 103.55},
+    'HO CHI MINH': {'lat': 10.76, 'lon': 106.79, 'aliases': ['CAT LAI', 'HOCHIMINH']},
+    'HAIPHONG': {'lat': 20.86, 'lon': 106.68},
+    'MANILA': {'lat': 14.60, 'lon': 120.96},
+    'JAKARTA': {'lat': -6.10, 'lon': 106.88, 'aliases': ['TANJUNG PRIOK']},
+    'NANSHA': {'lat': 22.70, 'lon': 113.65, 'aliases': ['GUANGZHOU']},
+    'SHENZHEN': {'lat': 22.48, 'lon': 113.88, 'aliases': ['SHEKOU', 'YANTIAN']},
+    'HONG KONG': {'lat': 22.33, 'lon': 114.12},
+    'SHANGHAI': {'lat': 30.63, 'lon': 122.07, 'aliases': ['YANGSHAN']},
+    'NINGBO': {'lat': 29.93, 'lon': 121.85},
+    'BUSAN': {'lat': 35.08, 'lon': 128.80, 'aliases': ['PUSAN']},
+    'KAOHSIUNG': {'lat': 22.57, 'lon': 120.30},
+    'TOKYO': {'lat': 35.62, 'lon': 139.79},
+    'YOKOHAMA': {'lat': 35.45, 'lon': 139.66},
+    'COLOMBO': {'lat': 6.95, 'lon': 79.84},
+    'JEBEL ALI': {'lat': 25.01, 'lon': 55.06},
+    'ROTTERDAM': {'lat': 51.95, 'lon': 4.05},
+    'ANTWERP': {'lat': 51.28, 'lon': 4.32},
+    'HAMBURG': {'lat': 53.53, 'lon': 9.93},
+}
+
+# Grid cell size in degrees (~15 nm of latitude)
+GRID_CELL_DEG = 0.25
+
+
+def haversine_nm(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in nautical miles"""
+    lat1, lon1, lat2, lon2 = (np.deg2rad(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _port_lookup():
+    """Normalized name/alias -> canonical port name"""
+    lookup = {}
+    for name, info in PORTS.items():
+        lookup[name] = name
+        for alias in info.get('aliases', []):
+            lookup[alias] = name
+    return lookup
+
+
+_PORT_LOOKUP = _port_lookup()
+
+
+def resolve_port(name: str):
+    """
+    Map a booking port string to a PORTS entry, e.g.
+    'TACOMA, WASHINGTON,U.S.A.' -> 'TACOMA', 'Nansha / Nansha new port' -> 'NANSHA'.
+    Returns None for unknown ports.
+    """
+    if not name:
+        return None
+    text = re.sub(r'\s+', ' ', str(name).upper()).strip()
+    candidates = [text] + [p.strip() for p in re.split(r'[,/()]', text) if p.strip()]
+    for candidate in candidates:
+        if candidate in _PORT_LOOKUP:
+            return _PORT_LOOKUP[candidate]
+    # Longest known name contained in the text ('LAEM CHABANG,THAILAND', 'PORT OF TACOMA')
+    for known in sorted(_PORT_LOOKUP, key=len, reverse=True):
+        if re.search(r'\b' + re.escape(known) + r'\b', text):
+            return _PORT_LOOKUP[known]
+    return None
+
+
+class PositionGrid:
+    """
+    Grid index over a block of positions. Rows are bucketed by (lat, lon) cell and
+    stored sorted by cell id, so a radius query touches only the cells that can
+    intersect the circle and runs haversine on those rows alone.
+    """
+
+    def __init__(self, lat, lon, cell_deg: float = GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.n_lon = int(np.ceil(360.0 / cell_deg))
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        cells = self._cell_ids(lat, lon)
+        self.order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[self.order]
+        self.cells, self.starts = np.unique(sorted_cells, return_index=True)
+        self.ends = np.append(self.starts[1:], len(sorted_cells))
+        self.lat = lat[self.order]
+        self.lon = lon[self.order]
+
+    def _cell_ids(self, lat, lon):
+        row = np.floor((np.clip(lat, -90, 89.999999) + 90.0) / self.cell_deg).astype(np.int64)
+        col = np.floor(((lon + 180.0) % 360.0) / self.cell_deg).astype(np.int64) % self.n_lon
+        return row * self.n_lon + col
+
+    def query(self, lat: float, lon: float, radius_nm: float) -> np.ndarray:
+        """Original row indices within radius_nm of (lat, lon)"""
+        radius_deg = radius_nm / 60.0
+        row_lo = int(np.floor((max(lat - radius_deg, -90.0) + 90.0) / self.cell_deg))
+        row_hi = int(np.floor((min(lat + radius_deg, 89.999999) + 90.0) / self.cell_deg))
+        cos_lat = max(np.cos(np.deg2rad(min(abs(lat) + radius_deg, 89.9))), 1e-6)
+        lon_span = min(radius_deg / cos_lat, 180.0)
+        col_c = int(np.floor(((lon + 180.0) % 360.0) / self.cell_deg))
+        col_r = int(np.ceil(lon_span / self.cell_deg))
+        cols = np.unique((np.arange(col_c - col_r, col_c + col_r + 1)) % self.n_lon)
+
+        wanted = (np.arange(row_lo, row_hi + 1)[:, None] * self.n_lon + cols[None, :]).ravel()
+        pos = np.searchsorted(self.cells, wanted)
+        hit = (pos < len(self.cells)) & (self.cells[np.minimum(pos, len(self.cells) - 1)] == wanted)
+        ranges = [np.arange(self.starts[p], self.ends[p]) for p in pos[hit]]
+        if not ranges:
+            return np.arange(0)
+        candidates = np.concatenate(ranges)
+        near = haversine_nm(self.lat[candidates], self.lon[candidates], lat, lon) <= radius_nm
+        return self.order[candidates[near]]
+
+
+def load_shipment_watches(supabase, radius_nm: float = DEFAULT_RADIUS_NM) -> list:
+    """One watch per (shipment, resolvable POL/POD) for shipments that have an MMSI"""
+    shipments = _select_all(supabase, 'shipments', 'id, booking_no, mmsi, pod_name, port_of_loading, eta_at_pod',
+                            not_null='mmsi')
+    return build_watches(shipments, radius_nm)
+
+
+def build_watches(shipments: list, radius_nm: float = DEFAULT_RADIUS_NM) -> list:
+    """Expand shipment rows into geofence watches"""
+    watches = []
+    for s in shipments:
+        mmsi = str(s.get('mmsi') or '').strip()
+        if not mmsi.isdigit():
+            continue
+        for role, field in (('POL', 'port_of_loading'), ('POD', 'pod_name')):
+            port = resolve_port(s.get(field))
+            if not port:
+                continue
+            info = PORTS[port]
+            watches.append({
+                'shipment_id': s.get('id'),
+                'booking_no': s.get('booking_no'),
+                'mmsi': int(mmsi),
+                'role': role,
+                'port': port,
+                'lat': info['lat'],
+                'lon': info['lon'],
+                'radius_nm': info.get('radius_nm', radius_nm),
+            })
+    return watches
+
+
+class GeofenceMonitor:
+    """
+    Streaming arrival/departure detector. Feed it position blocks in time order;
+    inside/outside state per watch carries across blocks, so a day can be streamed
+    chunk by chunk with memory bounded by the block size.
+    """
+
+    def __init__(self, watches: list):
+        self.watches = sorted(watches, key=lambda w: w['mmsi'])
+        self.w_mmsi = np.array([w['mmsi'] for w in self.watches], dtype=np.int64)
+        self.w_lat = np.array([w['lat'] for w in self.watches], dtype=np.float64)
+        self.w_lon = np.array([w['lon'] for w in self.watches], dtype=np.float64)
+        self.w_radius = np.array([w['radius_nm'] for w in self.watches], dtype=np.float64)
+        # -1 unknown, 0 outside, 1 inside
+        self.state = np.full(len(self.watches), -1, dtype=np.int8)
+        self.last_ts = np.full(len(self.watches), -1, dtype=np.int64)
+        self.max_per_mmsi = int(np.unique(self.w_mmsi, return_counts=True)[1].max()) if len(self.watches) else 0
+
+    def feed(self, mmsi, ts, lat, lon) -> list:
+        """Process one block of positions; returns the events it produced"""
+        if not len(self.watches):
+            return []
+        mmsi = np.asarray(mmsi, dtype=np.int64)
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        # A position without coordinates says nothing about the fence; compared as
+        # "outside" it would end every stay with a false departure
+        keep = np.isin(mmsi, self.w_mmsi) & np.isfinite(lat) & np.isfinite(lon)
+        if not keep.any():
+            return []
+        mmsi, ts = mmsi[keep], np.asarray(ts, dtype=np.int64)[keep]
+        lat, lon = lat[keep], lon[keep]
+
+        # Pair every row with each watch on its MMSI (watches are sorted by mmsi)
+        first = np.searchsorted(self.w_mmsi, mmsi, side='left')
+        count = np.searchsorted(self.w_mmsi, mmsi, side='right') - first
+        rows, widx = [], []
+        for k in range(self.max_per_mmsi):
+            has = count > k
+            rows.append(np.flatnonzero(has))
+            widx.append(first[has] + k)
+        rows = np.concatenate(rows)
+        widx = np.concatenate(widx)
+
+        inside = haversine_nm(lat[rows], lon[rows], self.w_lat[widx], self.w_lon[widx]) <= self.w_radius[widx]
+        order = np.lexsort((ts[rows], widx))
+        widx, t, inside = widx[order], ts[rows][order], inside[order].astype(np.int8)
+
+        # Previous state: carried state for the first row of each watch, else the prior row
+        new_watch = np.ones(len(widx), dtype=bool)
+        new_watch[1:] = widx[1:] != widx[:-1]
+        prev = np.empty_like(inside)
+        prev[1:] = inside[:-1]
+        prev[new_watch] = self.state[widx[new_watch]]
+
+        changed = np.flatnonzero((prev >= 0) & (prev != inside))
+        events = []
+        for i in changed:
+            w = self.watches[widx[i]]
+            events.append({
+                'shipment_id': w['shipment_id'],
+                'booking_no': w['booking_no'],
+                'mmsi': str(w['mmsi']),
+                'role': w['role'],
+                'port': w['port'],
+                'event': 'arrival' if inside[i] else 'departure',
+                'ts': pd.Timestamp(int(t[i]), unit='s', tz='UTC').isoformat(),
+            })
+
+        events.sort(key=lambda e: e['ts'])
+        last = np.append(new_watch[1:], True)
+        self.state[widx[last]] = inside[last]
+        self.last_ts[widx[last]] = t[last]
+        return events
+
+    def inside_now(self) -> list:
+        """Watches whose latest position is inside the fence"""
+        return [dict(w, last_seen=int(self.last_ts[i])) for i, w in enumerate(self.watches) if self.state[i] == 1]
+
+
+def vessels_near_ports(watches: list, mmsi, lat, lon, ts=None) -> list:
+    """
+    'Which booked vessels are within their fence in this block?' using a PositionGrid,
+    so tens of millions of positions are not all run through haversine.
+    """
+    mmsi = np.asarray(mmsi, dtype=np.int64)
+    grid = PositionGrid(lat, lon)
+    hits = []
+    for w in watches:
+        idx = grid.query(w['lat'], w['lon'], w['radius_nm'])
+        idx = idx[mmsi[idx] == w['mmsi']]
+        if len(idx):
+            hit = dict(w, positions=int(len(idx)))
+            if ts is not None:
+                hit['last_seen'] = int(np.asarray(ts)[idx].max())
+            hits.append(hit)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Port arrival/departure events from AIS tracks")
+    parser.add_argument('--date', help="Track day (YYYY-MM-DD) from ais_tracks/ to scan")
+    parser.add_argument('--radius', type=float, default=DEFAULT_RADIUS_NM, help="Fence radius in nm")
+    args = parser.parse_args()
+
+    from process_ais_data import get_supabase_client
+
+    supabase = get_supabase_client()
+    if not supabase:
+        return
+    watches = load_shipment_watches(supabase, args.radius)
+    print(f"Watching {len(watches)} POL/POD fences")
+
+    dates = [args.date] if args.date else track_dates()
+    monitor = GeofenceMonitor(watches)
+    for date_key in dates:
+        tracks = read_tracks(date_key, mmsis={w['mmsi'] for w in watches})
+        if not tracks:
+            continue
+        mmsi = np.concatenate([np.full(len(t['ts']), m, dtype=np.int64) for m, t in tracks.items()])
+        cols = {c: np.concatenate([t[c] for t in tracks.values()]) for c in ('ts', 'lat', 'lon')}
+        order = np.argsort(cols['ts'], kind='stable')
+        for e in monitor.feed(mmsi[order], cols['ts'][order], cols['lat'][order], cols['lon'][order]):
+            print(f"  {e['ts']}  {e['booking_no']:<16} {e['event']:<9} {e['role']} {e['port']} (MMSI {e['mmsi']})")
+
+    print("\nCurrently inside a fence:")
+    for w in monitor.inside_now():
+        print(f"  {w['booking_no']:<16} {w['role']} {w['port']} (MMSI {w['mmsi']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,25 @@ Uncompresses .csv.zst files, filters for cargo vessels, and upserts to vessel_ma
 """
 
 import os
-import zstandard as zstd
+import argparse
 import pandas as pd
-import io
-import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from ais_reader import iter_cargo_chunks, iter_cargo_range, iter_cargo_segments, decompress_to_file, split_row_ranges
+from vessel_index import VesselIndex, POLICIES
+from ais_staging import date_key_for, is_staged, stage_ais_file, iter_staged_chunks, staged_dates
+from ais_tracks import load_tracked_mmsis, extract_tracks, tracks_path
+from track_simplify import SIMPLIFY_TOLERANCE_M
+from ais_pipeline import run_ais_pipeline
+from vessel_records import clean_vessels, to_records
+from vessel_snapshot import VesselSnapshot, HEARTBEAT_DAYS
+from bulk_upsert import BulkUpserter, DEFAULT_CONCURRENCY
+from pg_copy import copy_merge
+from ais_checkpoint import CheckpointStore, CHECKPOINT_DB, file_fingerprint
+
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
@@ -19,27 +31,22 @@ SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_
 
 AIS_DIR = os.path.join(os.path.dirname(__file__), 'ais')
 OUTPUT_CSV = os.path.join(os.path.dirname(__file__), 'vessels_list.csv')
+# Old whole-file tracking list, imported once into the checkpoint store
 TRACKING_FILE = os.path.join(os.path.dirname(__file__), 'processed_files.json')
 
-# Vessel types for Cargo/Container ships
+# Job name of this script in the checkpoint store
+CHECKPOINT_JOB = 'process_ais_data'
+
+# Vessel types for Cargo/Container ships (filter is applied in ais_reader)
 CARGO_VESSEL_TYPES = range(70, 80)
 
+# Which record wins when a vessel name repeats: 'first', 'last' or 'most_complete'
+DEDUP_POLICY = 'first'
 
-def load_processed_files():
-    """Load the list of already processed files"""
-    if os.path.exists(TRACKING_FILE):
-        try:
-            with open(TRACKING_FILE, 'r') as f:
-                return set(json.load(f))
-        except:
-            return set()
-    return set()
 
-
-def save_processed_files(processed_list):
-    """Save the list of processed files"""
-    with open(TRACKING_FILE, 'w') as f:
-        json.dump(list(processed_list), f, indent=2)
+def open_checkpoints(path: str = CHECKPOINT_DB) -> CheckpointStore:
+    """This script's checkpoint store (seeded from processed_files.json on first use)"""
+    return CheckpointStore(CHECKPOINT_JOB, path, legacy_file=TRACKING_FILE)
 
 
 def get_supabase_client() -> Client:
@@ -50,141 +57,330 @@ def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def process_ais_file(file_path: str):
-    """Read, filter, and extract unique vessels from a .csv.zst file"""
+def _read_checkpointed(file_path: str, unique_vessels: VesselIndex, checkpoints: CheckpointStore,
+                       engine: str = 'auto') -> int:
+    """
+    Read a raw AIS file segment by segment, checkpointing the offset and the
+    vessels found after each one; resumes from the file's last checkpoint.
+    Returns rows scanned (including rows read by earlier runs).
+    """
+    name = os.path.basename(file_path)
+    fingerprint = file_fingerprint(file_path)
+    checkpoint = checkpoints.resume(name, fingerprint)
+    rows_scanned, segments = checkpoint.rows_done, checkpoint.segments_done
+    if checkpoint.byte_offset:
+        unique_vessels.add(checkpoint.vessels)
+        print(f"  Resuming after {rows_scanned} rows ({segments} segments, {len(unique_vessels)} vessels)")
+
+    for offset, n_rows, filtered_chunk in iter_cargo_segments(file_path, start=checkpoint.byte_offset, engine=engine):
+        rows_scanned += n_rows
+        segments += 1
+        unique_vessels.add(filtered_chunk)
+        checkpoints.save_progress(name, fingerprint, offset, rows_scanned, segments, unique_vessels.to_frame())
+        print(f"  Processed {rows_scanned} rows... Found {len(unique_vessels)} unique vessels.")
+    return rows_scanned
+
+
+def process_ais_file(file_path: str, engine: str = 'auto', policy: str = DEDUP_POLICY, strict: bool = False,
+                     stage: bool = False, checkpoints: CheckpointStore = None):
+    """
+    Read, filter, and extract unique vessels from a .csv.zst file.
+    With strict=True read errors are raised instead of returning a partial set.
+    With stage=True the day is read from (and if needed first converted into) the Parquet staging cache.
+    With a CheckpointStore (and no staging) progress is saved per segment and an interrupted file resumes.
+    """
     print(f"Processing: {os.path.basename(file_path)}")
     
-    # Initialize decompressor
-    dctx = zstandard.ZstdDecompressor() if 'zstandard' in globals() else zstd.ZstdDecompressor()
+    unique_vessels = VesselIndex(key='vessel_name', policy=policy)
+    rows_scanned = 0
     
-    unique_vessels = pd.DataFrame()
-    
-    # Read in chunks to handle large files
+    # Column-projected read; non-cargo rows are dropped as each block is parsed
     try:
-        with open(file_path, 'rb') as f:
-            with dctx.stream_reader(f) as reader:
-                with io.TextIOWrapper(reader, encoding='utf-8') as text_stream:
-                    # Read in chunks of 100,000 rows
-                    chunk_iter = pd.read_csv(text_stream, chunksize=100000)
-                    
-                    for i, chunk in enumerate(chunk_iter):
-                        # Clean column names
-                        chunk.columns = [c.strip() for c in chunk.columns]
-                        
-                        # Find relevant columns
-                        col_map = {
-                            'MMSI': ['MMSI', 'mmsi'],
-                            'VesselName': ['VesselName', 'Vessel Name', 'vessel_name', 'NAME', 'name'],
-                            'IMO': ['IMO', 'imo'],
-                            'VesselType': ['VesselType', 'Vessel Type', 'vessel_type', 'TYPE', 'type']
-                        }
-                        
-                        actual_cols = {}
-                        for target, aliases in col_map.items():
-                            for alias in aliases:
-                                if alias in chunk.columns:
-                                    actual_cols[target] = alias
-                                    break
-                        
-                        if 'VesselType' not in actual_cols or 'MMSI' not in actual_cols:
-                            continue
-                        
-                        # Apply filter
-                        mask = chunk[actual_cols['VesselType']].isin(CARGO_VESSEL_TYPES)
-                        filtered_chunk = chunk[mask].copy()
-                        
-                        if filtered_chunk.empty:
-                            continue
-                            
-                        # Select and rename
-                        select_cols = []
-                        rename_map = {}
-                        
-                        if 'MMSI' in actual_cols:
-                            select_cols.append(actual_cols['MMSI'])
-                            rename_map[actual_cols['MMSI']] = 'mmsi'
-                        if 'VesselName' in actual_cols:
-                            select_cols.append(actual_cols['VesselName'])
-                            rename_map[actual_cols['VesselName']] = 'vessel_name'
-                        if 'IMO' in actual_cols:
-                            select_cols.append(actual_cols['IMO'])
-                            rename_map[actual_cols['IMO']] = 'imo'
-                        if 'VesselType' in actual_cols:
-                            select_cols.append(actual_cols['VesselType'])
-                            rename_map[actual_cols['VesselType']] = 'ship_type'
-                        
-                        filtered_chunk = filtered_chunk[select_cols].rename(columns=rename_map)
-                        unique_vessels = pd.concat([unique_vessels, filtered_chunk]).drop_duplicates(subset=['vessel_name'])
-                        
-                        if i % 10 == 0:
-                            print(f"  Processed {i*100000} rows... Found {len(unique_vessels)} unique vessels.")
+        if checkpoints is not None and not stage:
+            _read_checkpointed(file_path, unique_vessels, checkpoints, engine)
+            return unique_vessels.to_frame()
+        
+        if stage:
+            date_key = date_key_for(file_path)
+            if not is_staged(date_key):
+                stage_ais_file(file_path, date_key)
+            chunks = iter_staged_chunks(date_key)
+        else:
+            chunks = iter_cargo_chunks(file_path, chunksize=100000, engine=engine)
+        
+        for i, (n_rows, filtered_chunk) in enumerate(chunks):
+            rows_scanned += n_rows
+            
+            if filtered_chunk.empty:
+                continue
+            
+            # Incremental dedup: only the new chunk's rows are hashed
+            unique_vessels.add(filtered_chunk)
+            
+            if i % 10 == 0:
+                print(f"  Processed {rows_scanned} rows... Found {len(unique_vessels)} unique vessels.")
 
     except Exception as e:
         print(f"  Error processing {os.path.basename(file_path)}: {e}")
+        if strict:
+            raise
+        
+    return unique_vessels.to_frame()
+
+
+def _process_file_worker(file_path: str, engine: str, policy: str, stage: bool,
+                         checkpoint_path: str = None) -> pd.DataFrame:
+    """Process-pool entry point: one file -> its compact unique-vessel frame"""
+    checkpoints = open_checkpoints(checkpoint_path) if checkpoint_path else None
+    try:
+        return process_ais_file(file_path, engine=engine, policy=policy, strict=True, stage=stage,
+                                checkpoints=checkpoints)
+    finally:
+        if checkpoints is not None:
+            checkpoints.close()
+
+
+def process_files_parallel(file_paths: list, workers: int, engine: str = 'auto', policy: str = DEDUP_POLICY,
+                           stage: bool = False, checkpoint_path: str = None):
+    """
+    Process AIS files across a process pool.
+
+    Returns (merged vessels DataFrame, list of files that completed). Files whose
+    worker raised or died are left out of the completed list. With checkpoint_path
+    each worker checkpoints its file, so a crashed worker's file resumes next run.
+    """
+    partials = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_process_file_worker, path, engine, policy, stage, checkpoint_path): path
+                   for path in file_paths}
+        for future in as_completed(futures):
+            name = os.path.basename(futures[future])
+            try:
+                partials[name] = future.result()
+                print(f"  [OK] {name}: {len(partials[name])} unique vessels")
+            except Exception as e:
+                # Includes BrokenProcessPool when a worker is killed (e.g. out of memory)
+                print(f"  [Error] {name} failed in worker: {e}")
+
+    # Merge in file order so 'first'/'last' policies are deterministic
+    merged = VesselIndex(key='vessel_name', policy=policy)
+    for name in sorted(partials):
+        merged.add(partials[name])
+    return merged.to_frame(), sorted(partials)
+
+
+def _process_range_worker(csv_path: str, start: int, end: int, header: list, engine: str, policy: str) -> pd.DataFrame:
+    """Process-pool entry point: one byte range of a decompressed day -> unique vessels"""
+    unique_vessels = VesselIndex(key='vessel_name', policy=policy)
+    for _, filtered_chunk in iter_cargo_range(csv_path, start, end, header, engine=engine):
+        unique_vessels.add(filtered_chunk)
+    return unique_vessels.to_frame()
+
+
+def process_ais_file_split(file_path: str, workers: int, engine: str = 'auto', policy: str = DEDUP_POLICY,
+                           spool_dir: str = None) -> pd.DataFrame:
+    """
+    Process one large AIS day on several cores.
+
+    The file is decompressed once into a spool CSV, split on row boundaries into
+    byte ranges, and each range is parsed and filtered in its own process. The
+    partial vessel sets are merged by vessel key in file order. Errors are raised.
+    """
+    print(f"Processing (split x{workers}): {os.path.basename(file_path)}")
+    fd, csv_path = tempfile.mkstemp(suffix='.csv', prefix='ais_spool_', dir=spool_dir)
+    os.close(fd)
+    try:
+        size = decompress_to_file(file_path, csv_path)
+        header, ranges = split_row_ranges(csv_path, workers)
+        print(f"  Decompressed {size / 1e6:.0f} MB into {len(ranges)} ranges")
         
-    return unique_vessels
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_process_range_worker, csv_path, start, end, header, engine, policy)
+                       for start, end in ranges]
+            # Results are collected in range order so the dedup policy sees rows in file order
+            partials = [future.result() for future in futures]
+    finally:
+        os.remove(csv_path)
+    
+    merged = VesselIndex(key='vessel_name', policy=policy)
+    for partial in partials:
+        merged.add(partial)
+    print(f"  Found {len(merged)} unique vessels.")
+    return merged.to_frame()
+
+
+def load_vessel_snapshot(supabase: Client, full_refresh: bool = False):
+    """Local vessel_master snapshot, refreshed with rows changed since the last run (None if that fails)"""
+    snapshot = VesselSnapshot.load()
+    try:
+        pulled = snapshot.refresh(supabase, full=full_refresh or not len(snapshot))
+    except Exception as e:
+        print(f"  [Warning] Could not refresh vessel_master snapshot ({e}); upserting every vessel")
+        return None
+    print(f"vessel_master snapshot: {len(snapshot)} vessels ({pulled} refreshed)")
+    return snapshot
 
 
-def upsert_to_vessel_master(vessels: pd.DataFrame, supabase: Client):
-    """UPSERT vessel data into Supabase vessel_master table"""
+def upsert_to_vessel_master(vessels: pd.DataFrame, supabase: Client, concurrency: int = DEFAULT_CONCURRENCY,
+                            snapshot: VesselSnapshot = None, heartbeat_days: float = HEARTBEAT_DAYS,
+                            writer: str = 'rest', dsn: str = None) -> bool:
+    """
+    UPSERT vessel data into Supabase vessel_master table with concurrent, retrying batches
+    (writer='rest'), or with COPY + one merge over a direct Postgres connection (writer='copy').
+    With a snapshot only new vessels, changed fields and due heartbeats are sent.
+    Returns False if any rows ended up in the dead-letter file or the COPY merge failed.
+    """
     if vessels.empty or not supabase:
+        return True
+    
+    clean = clean_vessels(vessels)
+    if snapshot is not None:
+        changed = snapshot.changed(clean, heartbeat_days)
+        print(f"Upserting {int(changed.sum())} new or changed of {len(clean)} vessels to vessel_master...")
+        clean = clean[changed]
+    else:
+        print(f"Upserting {len(clean)} vessels to vessel_master...")
+    if clean.empty:
+        return True
+
+    if writer == 'copy':
+        try:
+            merged = copy_merge(clean, dsn)
+        except Exception as e:
+            print(f"  [Error] COPY into vessel_master failed: {e}")
+            return False
+        print(f"  {merged} rows merged via COPY")
+        if snapshot is not None:
+            snapshot.mark_sent(clean)
+            snapshot.save()
+        return True
+
+    # Same project and key as the client passed in (supabase_url is a URL object in newer supabase-py)
+    with BulkUpserter('vessel_master', 'vessel_name', str(supabase.supabase_url), supabase.supabase_key,
+                      concurrency=concurrency) as upserter:
+        upserter.submit(to_records(clean))
+    print(f"  {upserter.stats.summary(upserter.batch_size)}")
+    if snapshot is not None and upserter.ok:
+        snapshot.mark_sent(clean)
+        snapshot.save()
+    return upserter.ok
+
+
+def _upsert_kwargs(args, supabase) -> dict:
+    """upsert_to_vessel_master options from the command line"""
+    snapshot = None if args.no_snapshot else load_vessel_snapshot(supabase, args.refresh_snapshot)
+    return {'concurrency': args.upsert_workers, 'snapshot': snapshot, 'heartbeat_days': args.heartbeat_days,
+            'writer': args.writer, 'dsn': args.pg_dsn}
+
+
+def reprocess_staged(args):
+    """Rebuild vessel_master input from every staged day without touching the raw files"""
+    dates = staged_dates()
+    if not dates:
+        print("No staged AIS days found.")
         return
     
-    print(f"Upserting {len(vessels)} vessels to vessel_master...")
-    records = vessels.to_dict('records')
+    print(f"Re-processing {len(dates)} staged days...")
+    merged = VesselIndex(key='vessel_name', policy=args.policy)
+    for date_key in dates:
+        for _, filtered_chunk in iter_staged_chunks(date_key):
+            merged.add(filtered_chunk)
+        print(f"  {date_key}: {len(merged)} unique vessels so far")
     
-    clean_records = []
-    for r in records:
-        v_name = str(r.get('vessel_name', '')).strip().upper()
-        if not v_name or v_name == 'NAN':
-            continue
-            
-        mmsi_raw = r.get('mmsi')
-        mmsi = None
-        if not pd.isna(mmsi_raw):
-            mmsi = str(int(float(mmsi_raw))) if str(mmsi_raw).replace('.', '').isdigit() else str(mmsi_raw)
-
-        imo_raw = r.get('imo')
-        imo = None
-        if not pd.isna(imo_raw):
-            imo_str = str(imo_raw).upper().replace('IMO', '').strip()
-            imo = ''.join(filter(str.isdigit, imo_str)) if imo_str else None
-
-        clean_r = {
-            'vessel_name': v_name,
-            'mmsi': mmsi,
-            'imo': imo if imo else None,
-            'ship_type': str(r['ship_type']) if not pd.isna(r['ship_type']) else 'Cargo',
-            'updated_at': pd.Timestamp.now(tz='UTC').isoformat()
-        }
-        
-        if not clean_r['mmsi'] or not clean_r['vessel_name']:
-            continue
-            
-        clean_records.append(clean_r)
+    supabase = get_supabase_client()
+    if supabase:
+        upsert_to_vessel_master(merged.to_frame(), supabase, **_upsert_kwargs(args, supabase))
+    print("\nStaged Re-processing Complete!")
+
 
-    batch_size = 1000
-    for i in range(0, len(clean_records), batch_size):
-        batch = clean_records[i:i + batch_size]
+def extract_tracks_mode(args):
+    """Write per-MMSI position histories for tracked vessels from every AIS day"""
+    supabase = get_supabase_client()
+    if not supabase:
+        return
+    
+    mmsis = load_tracked_mmsis(supabase, include_vessel_master=args.tracks_all_vessels)
+    print(f"Tracking positions for {len(mmsis)} MMSIs")
+    if not mmsis:
+        return
+    
+    ais_files = sorted(f for f in os.listdir(AIS_DIR) if f.endswith('.csv.zst'))
+    for ais_file in ais_files:
+        date_key = date_key_for(ais_file)
+        if os.path.exists(tracks_path(date_key)):
+            print(f"Skipping already extracted day: {date_key}")
+            continue
+        print(f"Extracting tracks: {ais_file}")
         try:
-            supabase.table('vessel_master').upsert(batch, on_conflict='vessel_name').execute()
-            if i % 5000 == 0:
-                print(f"  Upserted {i + len(batch)} records...")
+            extract_tracks(os.path.join(AIS_DIR, ais_file), mmsis, date_key, engine=args.engine,
+                           tolerance_m=args.track_tolerance)
         except Exception as e:
-            print(f"  [Error] Batch starting at {i} failed: {e}")
+            print(f"  Error extracting tracks from {ais_file}: {e}")
+    
+    print("\nTrack Extraction Complete!")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract cargo vessels from AIS files into vessel_master")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Process files in a pool of N processes and upsert once at the end")
+    parser.add_argument('--split-workers', type=int, default=1,
+                        help="Split each (large) file into row ranges parsed on N processes")
+    parser.add_argument('--spool-dir', default=None,
+                        help="Directory for decompressed spool files in split mode (default: system temp)")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Read, decompress, parse, dedup and upsert each file as overlapped threads")
+    parser.add_argument('--stage', action='store_true',
+                        help="Convert each day once into the Parquet staging cache and read from it")
+    parser.add_argument('--reprocess-staged', action='store_true',
+                        help="Re-run every staged day from the Parquet cache, ignoring finished-file checkpoints")
+    parser.add_argument('--tracks', action='store_true',
+                        help="Extract position histories for tracked MMSIs into ais_tracks/ instead of updating vessel_master")
+    parser.add_argument('--tracks-all-vessels', action='store_true',
+                        help="With --tracks, keep positions for every vessel_master MMSI, not only shipments")
+    parser.add_argument('--track-tolerance', type=float, default=SIMPLIFY_TOLERANCE_M,
+                        help="Max positional error in metres when simplifying tracks (0 keeps every report)")
+    parser.add_argument('--upsert-workers', type=int, default=DEFAULT_CONCURRENCY,
+                        help="vessel_master upsert batches in flight at once")
+    parser.add_argument('--writer', choices=['rest', 'copy'], default='rest',
+                        help="vessel_master writer: REST bulk upserts, or COPY + merge over a direct Postgres connection")
+    parser.add_argument('--pg-dsn', default=None,
+                        help="Postgres connection string for --writer copy (default: SUPABASE_DB_URL / DATABASE_URL)")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="Upsert every vessel seen instead of only new/changed ones")
+    parser.add_argument('--refresh-snapshot', action='store_true',
+                        help="Rebuild the local vessel_master snapshot from the table before running")
+    parser.add_argument('--heartbeat-days', type=float, default=HEARTBEAT_DAYS,
+                        help="Re-send unchanged vessels not written for this many days (0 = never)")
+    parser.add_argument('--engine', choices=['auto', 'pyarrow', 'pandas'], default='auto',
+                        help="CSV engine used by ais_reader")
+    parser.add_argument('--policy', choices=list(POLICIES), default=DEDUP_POLICY,
+                        help="Which record wins when a vessel name repeats")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     print("=" * 60)
     print("Incremental AIS Data Extraction & Vessel Master Update")
     print("=" * 60)
     
+    if args.reprocess_staged:
+        reprocess_staged(args)
+        return
+    
+    if args.tracks:
+        extract_tracks_mode(args)
+        return
+    
     if not os.path.exists(AIS_DIR):
         print(f"ERROR: AIS directory not found: {AIS_DIR}")
         return
     
     all_files = [f for f in os.listdir(AIS_DIR) if f.endswith('.csv.zst')]
-    processed_files = load_processed_files()
+    checkpoints = open_checkpoints()
+    processed_files = checkpoints.done()
     
     files_to_process = [f for f in all_files if f not in processed_files]
     
@@ -195,21 +391,74 @@ def main():
     print(f"Found {len(all_files)} files total. {len(files_to_process)} new files to process.")
     
     supabase = get_supabase_client()
+    upsert_kwargs = _upsert_kwargs(args, supabase) if supabase else {}
+    
+    if args.workers > 1:
+        print(f"Processing with {args.workers} workers...")
+        file_paths = [os.path.join(AIS_DIR, f) for f in sorted(files_to_process)]
+        vessels, completed = process_files_parallel(file_paths, args.workers, engine=args.engine,
+                                                    policy=args.policy, stage=args.stage,
+                                                    checkpoint_path=checkpoints.path)
+        
+        # Single upsert for the merged set; files are only recorded once it has landed
+        upserted = upsert_to_vessel_master(vessels, supabase, **upsert_kwargs) if supabase else True
+        if upserted and completed:
+            checkpoints.mark_done(completed)
+            print(f"Successfully processed and recorded {len(completed)} files.")
+        elif not upserted:
+            print("Upsert had failed batches - files not recorded, they will be retried next run.")
+        
+        failed = len(files_to_process) - len(completed)
+        if failed:
+            print(f"{failed} files failed and will be retried next run.")
+        print("\nIncremental Extraction Complete!")
+        return
     
     for ais_file in files_to_process:
         file_path = os.path.join(AIS_DIR, ais_file)
-        vessels = process_ais_file(file_path)
+        upserted = False
+        if args.split_workers > 1:
+            try:
+                vessels = process_ais_file_split(file_path, args.split_workers, engine=args.engine,
+                                                 policy=args.policy, spool_dir=args.spool_dir)
+            except Exception as e:
+                print(f"  Error processing {ais_file}: {e}")
+                print("-" * 30)
+                continue
+        elif args.pipeline and not args.stage:
+            print(f"Processing (pipeline): {ais_file}")
+            sink = (lambda batch: upsert_to_vessel_master(batch, supabase, **upsert_kwargs)) if supabase else None
+            try:
+                vessels, ok, _ = run_ais_pipeline(file_path, sink=sink, policy=args.policy, engine=args.engine,
+                                                  checkpoints=checkpoints)
+            except Exception as e:
+                print(f"  Error processing {ais_file}: {e} - it will resume from its last checkpoint next run.")
+                print("-" * 30)
+                continue
+            if not ok:
+                print(f"  Upsert had failed batches - {ais_file} will be retried next run.")
+                print("-" * 30)
+                continue
+            upserted = True
+        else:
+            try:
+                vessels = process_ais_file(file_path, engine=args.engine, policy=args.policy, strict=True,
+                                           stage=args.stage, checkpoints=checkpoints)
+            except Exception as e:
+                print(f"  Error processing {ais_file}: {e} - it will resume from its last checkpoint next run.")
+                print("-" * 30)
+                continue
         
-        if not vessels.empty:
-            # Upsert immediately for this file
-            if supabase:
-                upsert_to_vessel_master(vessels, supabase)
-            
-            # Record that this file is done
-            processed_files.add(ais_file)
-            save_processed_files(processed_files)
-            print(f"Successfully processed and recorded: {ais_file}")
+        # Upsert immediately for this file (the pipeline already upserted as it went)
+        if supabase and not upserted and not vessels.empty:
+            if not upsert_to_vessel_master(vessels, supabase, **upsert_kwargs):
+                print(f"  Upsert had failed batches - {ais_file} will be retried next run.")
+                print("-" * 30)
+                continue
         
+        # Record that this file is done (also when it held no cargo vessels)
+        checkpoints.mark_done(ais_file)
+        print(f"Successfully processed and recorded: {ais_file}")
         print("-" * 30)
     
     print("\nIncremental Extraction Complete!")
@@ -0,0 +1,150 @@
+"""
+Shipment Writer
+Batched, concurrent upserts of extracted bookings into the shipments table
+(on booking_no) through bulk_upsert.BulkUpserter: many records per request,
+a bounded number of requests in flight, retries for transient errors, and
+rejected batches bisected down to the offending records, which are reported
+per booking_no (and kept in dead_letters/shipments.jsonl) instead of failing
+the rest.
+
+Records can be submitted all at once (upsert_shipments) or one by one as the
+extraction pool finishes them (ShipmentWriter.submit, the "auto-commit as
+extracted" mode of extract_bookings.py and ocr_app.py).
+"""
+
+import os
+import math
+import threading
+
+from bulk_upsert import BulkUpserter, DEAD_LETTER_DIR, missing_column
+
+# Columns sent only when set: a lookup miss must not clear a stored (or hand-corrected) MMSI,
+# and bookings without a suggestion still store on databases without the review columns
+LOOKUP_COLUMNS = ('mmsi', 'suggested_mmsi', 'suggested_vessel')
+
+# Failure reported when the shipments table predates the suggested_* columns
+MISSING_REVIEW_COLUMNS = ("shipments has no suggested_mmsi/suggested_vessel columns; "
+                          "run docs/migration_add_vessel_match_review.sql in the Supabase SQL Editor")
+
+# Extraction / UI keys that are not shipments columns
+NON_COLUMNS = ('source_file',)
+
+# Records per request and requests in flight; bookings are small rows
+SHIPMENT_BATCH = 200
+DEFAULT_CONCURRENCY = 4
+
+DEAD_LETTER_FILE = os.path.join(DEAD_LETTER_DIR, 'shipments.jsonl')
+
+
+def shipment_row(record: dict) -> dict:
+    """shipments row for an extracted (or edited) booking: the record's own columns, NaN as null"""
+    row = {}
+    for key, value in record.items():
+        if key in NON_COLUMNS:
+            continue
+        # st.data_editor hands back NaN for empty cells, which is not valid JSON, and
+        # floats for an integer column with gaps (mmsi), which bigint columns reject
+        if isinstance(value, float):
+            value = None if math.isnan(value) else int(value) if value.is_integer() else value
+        if value is None and key in LOOKUP_COLUMNS:
+            continue
+        row[key] = value
+    return row
+
+
+class ShipmentWriter:
+    """
+    Streams booking records into shipments in batches.
+
+        with ShipmentWriter(SUPABASE_URL, SUPABASE_KEY) as writer:
+            writer.submit(records)          # any number of calls
+        writer.written, writer.failed       # booking_nos stored / {booking_no: error}
+
+    submit() is meant to be called from one thread (e.g. the loop collecting
+    extraction results); the requests themselves run on the upserter's threads,
+    which also call on_settled(booking_nos, error) once a batch is stored (error
+    None) or given up on.
+    """
+
+    def __init__(self, base_url: str, api_key: str, batch_size: int = SHIPMENT_BATCH,
+                 concurrency: int = DEFAULT_CONCURRENCY, dead_letter_path: str = DEAD_LETTER_FILE,
+                 on_settled=None):
+        self.on_settled = on_settled
+        self.written = set()
+        self.failed = {}
+        self.submitted = 0
+        self._schema_reported = False
+        self._lock = threading.Lock()
+        self._upserter = BulkUpserter('shipments', 'booking_no', base_url, api_key, concurrency=concurrency,
+                                      batch_size=batch_size, min_batch=min(batch_size, 50),
+                                      max_batch=max(batch_size, 1000), dead_letter_path=dead_letter_path,
+                                      on_settled=self._settled)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def stats(self):
+        return self._upserter.stats
+
+    def _settled(self, rows: list, error: str):
+        if error and 'suggested_' in error and missing_column(400, error):
+            # Reported once; every booking then carries the fix instead of the raw 400
+            error = MISSING_REVIEW_COLUMNS
+            with self._lock:
+                report, self._schema_reported = not self._schema_reported, True
+            if report:
+                print(f"  [Error] {error}")
+        with self._lock:
+            for row in rows:
+                if error is None:
+                    self.written.add(row['booking_no'])
+                    self.failed.pop(row['booking_no'], None)
+                else:
+                    self.failed[row['booking_no']] = error
+        if self.on_settled:
+            self.on_settled([row['booking_no'] for row in rows], error)
+
+    def submit(self, records: list):
+        """Queue booking records (records without a booking_no are reported as failed)"""
+        rows = []
+        for record in records:
+            if not record:
+                continue
+            if not record.get('booking_no'):
+                with self._lock:
+                    self.failed[record.get('source_file') or '(no booking_no)'] = "missing booking_no"
+                continue
+            rows.append(shipment_row(record))
+        self.submitted += len(rows)
+        self._upserter.submit(rows)
+
+    def flush(self) -> bool:
+        """Send the partial batch and wait for everything in flight; True if nothing failed"""
+        self._upserter.flush()
+        return not self.failed
+
+    def close(self) -> bool:
+        try:
+            return self.flush()
+        finally:
+            self._upserter.close()
+
+    def summary(self) -> str:
+        return f"{len(self.written)} bookings upserted, {len(self.failed)} failed; {self.stats.summary(self._upserter.batch_size)}"
+
+
+def upsert_shipments(records: list, base_url: str, api_key: str, batch_size: int = SHIPMENT_BATCH,
+                     concurrency: int = DEFAULT_CONCURRENCY, dead_letter_path: str = DEAD_LETTER_FILE) -> ShipmentWriter:
+    """Upsert a whole list (the last record wins for a repeated booking_no); returns the closed writer"""
+    latest = {}
+    for record in records:
+        if record:
+            latest[record.get('booking_no') or id(record)] = record
+    with ShipmentWriter(base_url, api_key, batch_size=batch_size, concurrency=concurrency,
+                        dead_letter_path=dead_letter_path) as writer:
+        writer.submit(list(latest.values()))
+    return writer
@@ -0,0 +1,136 @@
+"""
+AIS Track Simplification
+Vectorized down-sampling of per-MMSI position arrays before they are stored or
+sent to the map. Douglas-Peucker runs on the synchronized Euclidean distance
+(SED): each dropped report is compared to the position interpolated at its own
+timestamp between the kept neighbours, so the bound holds in space and time.
+An optional time bucket pre-thins bursts of reports first.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Default maximum positional error for stored tracks
+SIMPLIFY_TOLERANCE_M = 50.0
+
+
+def _project(lat: np.ndarray, lon: np.ndarray):
+    """Local equirectangular projection to metres (accurate over a single track)"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat0 = np.deg2rad(np.nanmean(lat)) if len(lat) else 0.0
+    # Unwrap the antimeridian so a Pacific crossing is not a 360 degree jump
+    lon = np.rad2deg(np.unwrap(np.deg2rad(lon)))
+    x = np.deg2rad(lon) * np.cos(lat0) * EARTH_RADIUS_M
+    y = np.deg2rad(lat) * EARTH_RADIUS_M
+    return x, y
+
+
+def _sed(x, y, t, a: int, b: int) -> np.ndarray:
+    """SED of points a+1..b-1 against the segment a->b"""
+    span = t[b] - t[a]
+    ts = t[a + 1:b]
+    frac = (ts - t[a]) / span if span > 0 else np.zeros(len(ts))
+    ix = x[a] + frac * (x[b] - x[a])
+    iy = y[a] + frac * (y[b] - y[a])
+    return np.hypot(x[a + 1:b] - ix, y[a + 1:b] - iy)
+
+
+def time_bucket_mask(ts: np.ndarray, bucket_s: int) -> np.ndarray:
+    """Keep the first report per bucket_s window (plus the last report)"""
+    keep = np.zeros(len(ts), dtype=bool)
+    if not len(ts):
+        return keep
+    if bucket_s <= 0:
+        keep[:] = True
+        return keep
+    _, first = np.unique(np.asarray(ts) // bucket_s, return_index=True)
+    keep[first] = True
+    keep[-1] = True
+    return keep
+
+
+def douglas_peucker_mask(ts, lat, lon, tolerance_m: float) -> np.ndarray:
+    """
+    Boolean keep-mask for one time-sorted track using SED Douglas-Peucker.
+    Iterative (no recursion limit); each split evaluates its segment in one NumPy pass.
+    """
+    n = len(ts)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3:
+        return keep
+
+    x, y = _project(lat, lon)
+    t = np.asarray(ts, dtype=np.float64)
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        d = _sed(x, y, t, a, b)
+        i = int(np.argmax(d))
+        if d[i] > tolerance_m:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return keep
+
+
+def simplify_track(ts, lat, lon, tolerance_m: float = SIMPLIFY_TOLERANCE_M, bucket_s: int = 0) -> np.ndarray:
+    """
+    Indices of the reports to keep for one time-sorted track.
+
+    Args:
+        ts: Epoch seconds (sorted ascending)
+        lat, lon: Degrees
+        tolerance_m: Maximum SED error of any dropped report (<= 0 keeps everything)
+        bucket_s: Optional pre-thinning to one report per bucket_s seconds
+    """
+    n = len(ts)
+    if tolerance_m <= 0 or n < 3:
+        return np.arange(n)
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    candidates = np.flatnonzero(valid & time_bucket_mask(ts, bucket_s))
+    if len(candidates) < 3:
+        return candidates
+    keep = douglas_peucker_mask(np.asarray(ts)[candidates], lat[candidates], lon[candidates], tolerance_m)
+    return candidates[keep]
+
+
+def track_error_m(ts, lat, lon, kept: np.ndarray) -> np.ndarray:
+    """
+    SED error of every original report against the simplified track
+    (position interpolated at its timestamp between the enclosing kept reports).
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if len(kept) < 2:
+        return np.zeros(len(ts))
+    x, y = _project(lat, lon)
+    kx, ky, kt = x[kept], y[kept], ts[kept]
+    ix = np.interp(ts, kt, kx)
+    iy = np.interp(ts, kt, ky)
+    err = np.hypot(x - ix, y - iy)
+    return np.where(np.isfinite(err), err, 0.0)
+
+
+def simplify_sorted_block(mmsi: np.ndarray, ts: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+                          tolerance_m: float = SIMPLIFY_TOLERANCE_M, bucket_s: int = 0) -> np.ndarray:
+    """
+    Keep-indices for a block of many tracks already sorted by (mmsi, ts).
+    Used by TrackWriter so each spilled row group is simplified per vessel.
+    """
+    if tolerance_m <= 0 or not len(mmsi):
+        return np.arange(len(mmsi))
+    _, starts = np.unique(mmsi, return_index=True)
+    ends = np.append(starts[1:], len(mmsi))
+    kept = [s + simplify_track(ts[s:e], lat[s:e], lon[s:e], tolerance_m, bucket_s) for s, e in zip(starts, ends)]
+    return np.concatenate(kept) if kept else np.arange(0)
@@ -0,0 +1,316 @@
+"""
+Vessel Position Sync
+Python counterpart of app/api/tracking/sync/route.ts: fetches the current
+position of every shipment's vessel from the AIS Vessel Finder API (RapidAPI)
+and records it in tracking_logs.
+
+Unlike the route, which calls the API once per shipment in sequence:
+- MMSIs are deduplicated, so ten bookings on one vessel cost one request
+- requests run concurrently under a shared token bucket sized to the API plan;
+  a 429 pauses the whole bucket for its Retry-After instead of letting every
+  thread keep hammering the API
+- each position is fanned out to every shipment on that vessel and all rows
+  are inserted into tracking_logs in one call
+
+The API base URL can be pointed at a local mock (see bench_tracking_sync.py).
+
+Usage:
+    python docs/tracking_sync.py --rate 5 --concurrency 8
+"""
+
+import os
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from supabase import create_client
+
+from bulk_upsert import RETRY_STATUSES, make_session, retry_after
+
+# Load environment variables
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
+
+SUPABASE_URL = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY')
+
+AIS_API_HOST = 'ais-vessel-finder.p.rapidapi.com'
+AIS_API_URL = os.getenv('AIS_API_URL') or f'https://{AIS_API_HOST}'
+
+# Requests per second and burst allowed by the RapidAPI plan
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 5
+
+# Requests in flight (enough to keep the bucket busy at the API's latency)
+DEFAULT_CONCURRENCY = 8
+
+# Attempts per MMSI for throttling, 5xx and connection errors
+MAX_RETRIES = 4
+
+# Pause after a 429 without a usable Retry-After header (seconds)
+DEFAULT_RETRY_AFTER_S = 2.0
+
+# Page size for the shipments read (PostgREST caps responses at 1000 rows)
+PAGE_SIZE = 1000
+
+
+def api_headers(api_key: str) -> dict:
+    """RapidAPI headers, as used by test_ais_api.py and services/vesselTracking.ts"""
+    return {
+        'x-rapidapi-key': api_key,
+        'x-rapidapi-host': AIS_API_HOST,
+        '11497305': '11497305',
+    }
+
+
+class TokenBucket:
+    """
+    Requests allowed at `rate` per second with bursts of up to `burst`,
+    shared by every fetch thread. pause() holds everyone back after a 429.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = max(1, burst or int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now"""
+        with self._lock:
+            now = self._refill()
+            if now < self.paused_until or self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = self._refill()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class SyncStats:
+    """Counters for one sync run"""
+
+    def __init__(self):
+        self.shipments = 0
+        self.mmsis = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.no_data = 0
+        self.errors = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.shipments} shipments on {self.mmsis} vessels: {self.rows} positions in {elapsed:.1f}s, "
+                f"{self.requests} API requests ({self.throttled} throttled, {self.retries} retries), "
+                f"{self.no_data} without data, {self.errors} failed")
+
+
+def vessel_record(payload) -> dict:
+    """The vessel in an API response (a list or a single object), or None"""
+    if isinstance(payload, list):
+        return payload[0] if payload else None
+    if isinstance(payload, dict) and (payload.get('mmsi') or payload.get('MMSI')):
+        return payload
+    return None
+
+
+def fetch_vessel(session: requests.Session, api_url: str, headers: dict, mmsi: str, bucket: TokenBucket,
+                 stats: SyncStats, timeout: float = 15) -> tuple:
+    """One MMSI's latest AIS data -> (vessel dict or None, error message or None)"""
+    error = None
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            stats.add(retries=1)
+        bucket.acquire()
+        stats.add(requests=1)
+        try:
+            response = session.get(f"{api_url.rstrip('/')}/getAisData", params={'mmsi': mmsi},
+                                   headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        else:
+            if response.status_code == 200:
+                try:
+                    return vessel_record(response.json()), None
+                except ValueError:
+                    return None, "Invalid JSON from API"
+            error = f"status {response.status_code}: {response.text[:200]}"
+            if response.status_code == 429:
+                stats.add(throttled=1)
+                wait_s = retry_after(response)
+                bucket.pause(DEFAULT_RETRY_AFTER_S if wait_s is None else wait_s)
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                break
+        time.sleep(min(0.5 * 2 ** attempt, 10) * (0.5 + random.random()))
+    return None, error
+
+
+def fetch_positions(mmsis, api_url: str = AIS_API_URL, api_key: str = RAPIDAPI_KEY, rate: float = DEFAULT_RATE,
+                    burst: int = DEFAULT_BURST, concurrency: int = DEFAULT_CONCURRENCY, stats: SyncStats = None) -> dict:
+    """{mmsi: (vessel dict or None, error or None)} for distinct MMSIs, fetched concurrently under the rate limit"""
+    stats = stats or SyncStats()
+    mmsis = sorted(set(mmsis))
+    bucket = TokenBucket(rate, burst)
+    session = make_session(concurrency)
+    headers = api_headers(api_key)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='ais-fetch') as executor:
+        results = executor.map(lambda m: fetch_vessel(session, api_url, headers, m, bucket, stats), mmsis)
+        return dict(zip(mmsis, results))
+
+
+def tracking_log_row(shipment_id: str, vessel: dict, synced_at: str) -> dict:
+    """tracking_logs row for one shipment (same mapping as the sync route)"""
+    return {
+        'shipment_id': shipment_id,
+        'latitude': vessel.get('latitude'),
+        'longitude': vessel.get('longitude'),
+        'vessel_name': vessel.get('vesselName'),
+        'mmsi': vessel.get('mmsi'),
+        'imo': vessel.get('imo'),
+        'flag': vessel.get('flag'),
+        'call_sign': vessel.get('callSign'),
+        'vessel_type': vessel.get('vesselType'),
+        'length': vessel.get('length'),
+        'beam': vessel.get('beam'),
+        'draught': vessel.get('draught'),
+        'area': vessel.get('area'),
+        'speed_knots': vessel.get('speedKnots'),
+        'course': vessel.get('course'),
+        'status': vessel.get('status'),
+        'previous_port': vessel.get('previousPort'),
+        'current_port': vessel.get('currentPort'),
+        'next_port': vessel.get('nextPort'),
+        'api_updated_at': vessel.get('updatedAt'),
+        'last_sync': synced_at,
+    }
+
+
+def build_tracking_rows(shipments: list, positions: dict, stats: SyncStats = None) -> tuple:
+    """
+    Fan each vessel's position out to its shipments.
+    Returns (tracking_logs rows, per-shipment results like the route's 'details').
+    """
+    synced_at = datetime.now(timezone.utc).isoformat()
+    rows, details = [], []
+    for shipment in shipments:
+        vessel, error = positions.get(str(shipment['mmsi']).strip(), (None, "not fetched"))
+        if vessel:
+            rows.append(tracking_log_row(shipment['id'], vessel, synced_at))
+            details.append({'booking_no': shipment.get('booking_no'), 'status': 'success'})
+        else:
+            details.append({'booking_no': shipment.get('booking_no'), 'status': 'error' if error else 'skipped',
+                            'message': error or 'No data from API'})
+    if stats is not None:
+        stats.add(rows=len(rows), no_data=sum(1 for v, e in positions.values() if not v and not e),
+                  errors=sum(1 for _, e in positions.values() if e))
+    return rows, details
+
+
+def load_tracked_shipments(supabase) -> list:
+    """id, mmsi and booking_no of every shipment with an MMSI"""
+    shipments, start = [], 0
+    while True:
+        query = supabase.table('shipments').select('id, mmsi, booking_no').not_.is_('mmsi', 'null')
+        page = query.range(start, start + PAGE_SIZE - 1).execute().data or []
+        shipments.extend(s for s in page if str(s.get('mmsi') or '').strip())
+        if len(page) < PAGE_SIZE:
+            return shipments
+        start += PAGE_SIZE
+
+
+def sync_positions(shipments: list, api_url: str = AIS_API_URL, api_key: str = RAPIDAPI_KEY,
+                   rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                   concurrency: int = DEFAULT_CONCURRENCY) -> tuple:
+    """Shipments -> (tracking_logs rows, per-shipment details, SyncStats); nothing is written"""
+    stats = SyncStats()
+    stats.shipments = len(shipments)
+    mmsis = {str(s['mmsi']).strip() for s in shipments}
+    stats.mmsis = len(mmsis)
+    positions = fetch_positions(mmsis, api_url, api_key, rate, burst, concurrency, stats)
+    rows, details = build_tracking_rows(shipments, positions, stats)
+    return rows, details, stats
+
+
+def insert_tracking_logs(supabase, rows: list):
+    """All positions of a sync in one insert"""
+    if rows:
+        supabase.table('tracking_logs').insert(rows).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vessel positions for all shipments into tracking_logs")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="API requests per second")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--api-url', default=AIS_API_URL, help="Vessel API base URL (e.g. a local mock)")
+    parser.add_argument('--dry-run', action='store_true', help="Fetch positions but do not insert them")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("ERROR: Supabase service role credentials not found in environment variables")
+        return
+    if not RAPIDAPI_KEY:
+        print("ERROR: RAPIDAPI_KEY is missing from environment variables")
+        return
+
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    shipments = load_tracked_shipments(supabase)
+    if not shipments:
+        print("No shipments with MMSI found")
+        return
+
+    rows, details, stats = sync_positions(shipments, args.api_url, RAPIDAPI_KEY, args.rate, args.burst,
+                                          args.concurrency)
+    for detail in details:
+        if detail['status'] != 'success':
+            print(f"  [{detail['status'].upper()}] {detail['booking_no']}: {detail['message']}")
+    if not args.dry_run:
+        try:
+            insert_tracking_logs(supabase, rows)
+        except Exception as e:
+            print(f"  [Error] Inserting {len(rows)} tracking_logs rows failed: {e}")
+            return
+    print(stats.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Incremental Vessel Dedup Index
+Hash index over vessel records keyed on normalized vessel name (or MMSI),
+with array-backed columns. Each chunk only touches its own rows, so building
+the unique vessel set is linear in the rows read.
+"""
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('mmsi', 'vessel_name', 'imo', 'ship_type')
+
+# Which record wins when a key is seen more than once
+POLICIES = ('first', 'last', 'most_complete')
+
+# Keys added since the last hash-table rebuild are probed through a plain dict
+# until they outnumber this (or the indexed keys), keeping rebuilds amortized O(1)
+MIN_REBUILD = 1024
+
+
+def normalize_keys(values: pd.Series, key: str) -> pd.Series:
+    """Vectorized key normalization: upper-cased stripped names or integer MMSI strings"""
+    if key == 'mmsi':
+        numeric = pd.to_numeric(values, errors='coerce')
+        return numeric.astype('Int64').astype('string')
+    return values.astype('string').str.strip().str.upper()
+
+
+class VesselIndex:
+    """
+    Incremental unique-vessel accumulator.
+
+    Args:
+        key: 'vessel_name' (vessel_master primary key) or 'mmsi'
+        policy: 'first' seen wins, 'last' seen wins, or 'most_complete'
+                (the record with the most non-null fields wins; ties keep the earlier one)
+    """
+
+    def __init__(self, key: str = 'vessel_name', policy: str = 'first'):
+        if key not in ('vessel_name', 'mmsi'):
+            raise ValueError(f"Unsupported dedup key: {key}")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown dedup policy: {policy} (expected one of {POLICIES})")
+        self.key = key
+        self.policy = policy
+        self._size = 0
+        self._columns = {f: np.empty(0, dtype=object) for f in FIELDS}
+        self._scores = np.empty(0, dtype=np.int8)
+        self._indexed = pd.Index([], dtype=object)
+        self._pending = {}
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra: int):
+        """Grow the column arrays geometrically"""
+        needed = self._size + extra
+        capacity = len(self._scores)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for f, col in self._columns.items():
+            grown = np.empty(capacity, dtype=object)
+            grown[:self._size] = col[:self._size]
+            self._columns[f] = grown
+        scores = np.zeros(capacity, dtype=np.int8)
+        scores[:self._size] = self._scores[:self._size]
+        self._scores = scores
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Slot for each key, -1 for unseen keys"""
+        slots = self._indexed.get_indexer(keys) if len(self._indexed) else np.full(len(keys), -1)
+        if self._pending:
+            misses = np.flatnonzero(slots == -1)
+            pending = self._pending
+            slots[misses] = [pending.get(k, -1) for k in keys[misses]]
+        return slots
+
+    def _register(self, keys: np.ndarray, first_slot: int):
+        """Record slots for newly appended keys, rebuilding the hash table when due"""
+        self._pending.update(zip(keys.tolist(), range(first_slot, first_slot + len(keys))))
+        if len(self._pending) > max(MIN_REBUILD, len(self._indexed)):
+            self._indexed = self._indexed.append(pd.Index(list(self._pending), dtype=object))
+            self._pending = {}
+
+    def add(self, chunk: pd.DataFrame) -> int:
+        """Merge a chunk of vessel rows into the index; returns the number of new vessels"""
+        if chunk.empty or self.key not in chunk.columns:
+            return 0
+
+        present = [f for f in FIELDS if f in chunk.columns]
+        keep = 'last' if self.policy == 'last' else 'first'
+        column = chunk[self.key]
+
+        # Row positions ordered so that keep='first' picks the most complete record
+        if self.policy == 'most_complete':
+            scores = chunk[present].notna().sum(axis=1).to_numpy(dtype=np.int8)
+            order = np.argsort(-scores, kind='stable')
+        else:
+            scores = np.zeros(len(chunk), dtype=np.int8)
+            order = np.arange(len(chunk))
+
+        # Collapse exact repeats before the (costlier) string normalization
+        raw = column.iloc[order].reset_index(drop=True)
+        positions = order[~raw.duplicated(keep=keep).to_numpy()]
+        keys = normalize_keys(column.iloc[positions].reset_index(drop=True), self.key)
+        unique = (keys.notna() & (keys != '') & ~keys.duplicated(keep=keep)).to_numpy()
+        positions = positions[unique]
+        if not len(positions):
+            return 0
+        if self.policy == 'most_complete':
+            order_back = np.argsort(positions, kind='stable')
+            positions = positions[order_back]
+            keys = keys.to_numpy(dtype=object)[unique][order_back]
+        else:
+            keys = keys.to_numpy(dtype=object)[unique]
+
+        values = {f: chunk[f].iloc[positions].to_numpy(dtype=object) for f in present}
+        scores = scores[positions]
+        slots = self._lookup(keys)
+
+        # Append unseen vessels in one vectorized block
+        new = slots == -1
+        n_new = int(new.sum())
+        if n_new:
+            self._reserve(n_new)
+            start = self._size
+            for f in FIELDS:
+                self._columns[f][start:start + n_new] = values[f][new] if f in values else None
+            self._scores[start:start + n_new] = scores[new]
+            self._size += n_new
+            self._register(keys[new], start)
+
+        # Overwrite existing vessels where the policy says the new record wins
+        if self.policy != 'first':
+            replace = ~new
+            if self.policy == 'most_complete':
+                replace &= scores > self._scores[np.where(new, 0, slots)]
+            if replace.any():
+                target_slots = slots[replace]
+                for f in present:
+                    self._columns[f][target_slots] = values[f][replace]
+                self._scores[target_slots] = scores[replace]
+        return n_new
+
+    def merge(self, other: "VesselIndex") -> int:
+        """Fold another index (e.g. from a later file) into this one under this index's policy"""
+        return self.add(other.to_frame())
+
+    def to_frame(self, start: int = 0) -> pd.DataFrame:
+        """
+        Materialize the unique vessels as a DataFrame. Vessels are kept in first-seen
+        order, so start=len(index) taken before add() selects exactly the new ones.
+        """
+        frame = pd.DataFrame({f: self._columns[f][start:self._size] for f in FIELDS}, columns=list(FIELDS))
+        return frame.infer_objects()
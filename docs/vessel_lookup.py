@@ -0,0 +1,188 @@
+"""
+Vessel Lookup Cache
+In-process vessel_name -> MMSI/IMO cache in front of vessel_master for booking
+extraction. Entries expire after a TTL and the least recently used ones are
+evicted past max_entries. Names that are not in vessel_master are cached too
+(for a shorter TTL), so a batch with repeated unknown vessels asks once.
+
+A batch of bookings prefetches every vessel name it mentions with a few
+vessel_master in_() queries, after which each booking's lookup is a dict hit.
+The cache can also be warmed from the local vessels_list.csv AIS export.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from vessel_records import clean_vessels
+
+VESSELS_CSV = os.path.join(os.path.dirname(__file__), 'vessels_list.csv')
+
+# Cache bounds
+MAX_ENTRIES = 10000
+TTL_S = 6 * 3600
+# Unknown names are re-checked sooner: the AIS job may add them at any time
+NEGATIVE_TTL_S = 10 * 60
+
+# Names per vessel_master in_() query (keeps the PostgREST URL well under 8 KB)
+PREFETCH_CHUNK = 150
+
+_MISSING = object()
+
+
+def normalize_name(vessel_name: str) -> str:
+    """Lookup key as stored in vessel_master"""
+    return (vessel_name or '').strip().upper()
+
+
+class VesselLookup:
+    """
+    LRU + TTL cache of vessel_master rows keyed by normalized vessel name.
+
+        lookup = VesselLookup(supabase)
+        lookup.prefetch(names)        # one or two queries for the whole batch
+        lookup.get('HMM HOPE')        # {'mmsi': ..., 'imo': ..., 'ship_type': ..., 'from_cache': True}
+
+    supabase may be None (e.g. offline); then only warmed entries are found.
+    """
+
+    def __init__(self, supabase=None, max_entries: int = MAX_ENTRIES, ttl_s: float = TTL_S,
+                 negative_ttl_s: float = NEGATIVE_TTL_S, clock=time.monotonic):
+        self.supabase = supabase
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.clock = clock
+        self.warmed = False
+        self.queries = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cached(self, key: str):
+        """Fresh cached row (None for a negative entry) or _MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires, row = entry
+        if expires < self.clock():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return row
+
+    def _store(self, key: str, row):
+        ttl = self.ttl_s if row is not None else self.negative_ttl_s
+        self._entries[key] = (self.clock() + ttl, row)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _query(self, keys: list) -> dict:
+        """vessel_master rows for keys, chunked into in_() queries"""
+        found = {}
+        for k in range(0, len(keys), PREFETCH_CHUNK):
+            chunk = keys[k:k + PREFETCH_CHUNK]
+            result = (self.supabase.table('vessel_master').select('vessel_name, mmsi, imo, ship_type')
+                      .in_('vessel_name', chunk).execute())
+            with self._lock:
+                self.queries += 1
+            for row in result.data or []:
+                found[row['vessel_name']] = {'mmsi': row.get('mmsi'), 'imo': row.get('imo'),
+                                             'ship_type': row.get('ship_type')}
+        return found
+
+    def prefetch(self, vessel_names) -> int:
+        """Load every uncached name in one pass; returns how many names were queried"""
+        with self._lock:
+            keys = sorted({k for k in map(normalize_name, vessel_names) if k and self._cached(k) is _MISSING})
+        if not keys or self.supabase is None:
+            return 0
+        queries = self.queries
+        try:
+            found = self._query(keys)
+        except Exception as e:
+            print(f"[vessel_lookup] Prefetch failed: {e}")
+            return 0
+        with self._lock:
+            for key in keys:
+                self._store(key, found.get(key))
+        print(f"[vessel_lookup] Prefetched {len(keys)} vessel names ({len(found)} known) "
+              f"in {self.queries - queries} queries")
+        return len(keys)
+
+    def get(self, vessel_name: str) -> dict:
+        """Cached row for a vessel (querying vessel_master on a miss); {'mmsi': None} when unknown"""
+        key = normalize_name(vessel_name)
+        if not key:
+            return {'mmsi': None}
+        with self._lock:
+            row = self._cached(key)
+            if row is not _MISSING:
+                self.hits += 1
+        if row is _MISSING:
+            with self._lock:
+                self.misses += 1
+            if self.supabase is None:
+                return {'mmsi': None}
+            try:
+                row = self._query([key]).get(key)
+            except Exception as e:
+                # Not cached: a failed lookup is not evidence the vessel is unknown
+                print(f"[vessel_lookup] Database lookup failed: {e}")
+                return {'mmsi': None}
+            with self._lock:
+                self._store(key, row)
+        if row is None:
+            return {'mmsi': None}
+        return dict(row, from_cache=True)
+
+    def warm_from_csv(self, path: str = VESSELS_CSV) -> int:
+        """Seed positive entries from an AIS vessel export (mmsi, vessel_name, imo, ship_type); returns rows loaded"""
+        if not os.path.exists(path):
+            return 0
+        try:
+            clean = clean_vessels(pd.read_csv(path, dtype=str))
+        except Exception as e:
+            print(f"[vessel_lookup] Could not read {os.path.basename(path)}: {e}")
+            return 0
+        clean = clean.drop_duplicates('vessel_name', keep='last')
+        columns = [clean[c].to_numpy(dtype=object, na_value=None).tolist()
+                   for c in ('vessel_name', 'mmsi', 'imo', 'ship_type')]
+        with self._lock:
+            for name, mmsi, imo, ship_type in zip(*columns):
+                self._store(name, {'mmsi': mmsi, 'imo': imo, 'ship_type': ship_type})
+        return len(clean)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_lookup = None
+_default_lock = threading.Lock()
+
+
+def default_lookup(supabase=None, warm_csv: bool = False) -> VesselLookup:
+    """
+    Process-wide VesselLookup. The first caller's client is kept (so callers that
+    pass none do not create a client per lookup); a later client fills in a missing one.
+    warm_csv seeds it from vessels_list.csv (once, on the call that asks for it).
+    """
+    global _default_lookup
+    with _default_lock:
+        if _default_lookup is None:
+            _default_lookup = VesselLookup(supabase)
+        elif _default_lookup.supabase is None and supabase is not None:
+            _default_lookup.supabase = supabase
+        lookup = _default_lookup
+    if warm_csv and not lookup.warmed:
+        lookup.warmed = lookup.warm_from_csv() > 0
+    return lookup
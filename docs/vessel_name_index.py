@@ -0,0 +1,286 @@
+"""
+Fuzzy Vessel Name Index
+In-memory index over vessel_master names for booking MMSI lookups that do not
+match vessel_name exactly ("MSC OSCAR.", "YM  CAPACITY", "M/V EVER WEB").
+
+Names are reduced to a canonical key (upper case, punctuation dropped, single
+spaces, M/V-style prefixes removed) for exact matches. Everything else goes
+through a trigram inverted index: postings are numpy arrays, so scoring all
+candidates of a query is one bincount plus a vectorized Dice coefficient,
+well under a millisecond at ~100k vessels. New or changed vessel_master rows
+are added incrementally; only the touched postings are rebuilt.
+
+The shared index starts from the local vessels_list.csv and never pulls the
+whole of vessel_master: for names it cannot match confidently it fetches only
+the rows sharing one of their words (fetch_candidates, a query or two per
+booking batch).
+"""
+
+import re
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Below this Dice score a fuzzy match is not reported, even as a suggestion
+MIN_SCORE = 0.6
+
+# A fuzzy match is taken without review only at this score and this far ahead of
+# the runner-up; sister ships ("MSC ANNA" / "MSC ANNICK", 0.625) score well below
+AUTO_ACCEPT_SCORE = 0.9
+AUTO_ACCEPT_MARGIN = 0.1
+
+# Confidence for a canonical-key match and for a match that only differs in spacing
+CANONICAL_CONFIDENCE = 1.0
+COMPACT_CONFIDENCE = 0.97
+
+# PostgREST page size for loads / refreshes
+PAGE_SIZE = 1000
+
+# Words whose vessel_master candidates were fetched are not asked again for this long
+REFRESH_S = 10 * 60
+
+# Candidate fetch: words per or=(...ilike...) query (URL length) and pages per query
+CANDIDATE_WORDS_PER_QUERY = 40
+CANDIDATE_MAX_PAGES = 3
+
+# Shortest word used to look for candidates (shorter ones match too much of the table)
+CANDIDATE_MIN_WORD = 4
+
+# Leading M/V, M.V., MV, MS, MT: ship-type prefixes, not part of the registered name
+_PREFIX = re.compile(r'^M\s*[/.]?\s*[VST]\b\.?\s*(?=\S)')
+_PUNCTUATION = re.compile(r'[^A-Z0-9 ]+')
+_SPACES = re.compile(r' {2,}')
+
+
+def canonical_name(name: str) -> str:
+    """'m/v  MSC Oscar.' -> 'MSC OSCAR'"""
+    text = _PREFIX.sub('', str(name or '').upper().strip())
+    return _SPACES.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+
+
+def trigrams(key: str) -> set:
+    """Character trigrams of a canonical key without spaces, with start/end markers"""
+    padded = f"^{key.replace(' ', '')}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class VesselNameIndex:
+    """
+    vessel_name -> (mmsi, imo, ship_type) with exact, canonical and trigram lookups.
+
+        index = VesselNameIndex.from_supabase(supabase)
+        index.resolve('YM  CAPACITY')   # {'mmsi': ..., 'vessel_name': 'YM CAPACITY', 'confidence': 0.97,
+                                        #  'accepted': True, ...}
+        index.refresh(supabase)         # pull rows changed since the last load
+        index.fetch_candidates(supabase, names)   # or only the rows that could match names
+    """
+
+    def __init__(self):
+        self.names = []
+        self.rows = []
+        self.synced_at = None
+        self._ids = {}
+        self._canonical = {}
+        self._compact = {}
+        self._gram_ids = {}
+        self._postings = []
+        self._arrays = []
+        self._sizes = np.zeros(0, dtype=np.int32)
+        self._fetched_words = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, rows) -> int:
+        """Insert or update vessel rows (dicts with vessel_name, mmsi, imo, ship_type); returns names added"""
+        added = 0
+        new_sizes, touched = [], set()
+        for row in rows:
+            name = str(row.get('vessel_name') or '').strip().upper()
+            if not name:
+                continue
+            record = {'mmsi': row.get('mmsi'), 'imo': row.get('imo'), 'ship_type': row.get('ship_type')}
+            slot = self._ids.get(name)
+            if slot is not None:
+                self.rows[slot] = record
+                continue
+            slot = len(self.names)
+            self._ids[name] = slot
+            self.names.append(name)
+            self.rows.append(record)
+            key = canonical_name(name)
+            self._canonical.setdefault(key, slot)
+            self._compact.setdefault(key.replace(' ', ''), slot)
+            grams = trigrams(key)
+            new_sizes.append(len(grams))
+            for gram in grams:
+                gram_id = self._gram_ids.get(gram)
+                if gram_id is None:
+                    gram_id = self._gram_ids[gram] = len(self._postings)
+                    self._postings.append([])
+                    self._arrays.append(None)
+                self._postings[gram_id].append(slot)
+                touched.add(gram_id)
+            added += 1
+        # Only postings that gained names are re-materialized as arrays
+        for gram_id in touched:
+            self._arrays[gram_id] = np.array(self._postings[gram_id], dtype=np.int32)
+        if new_sizes:
+            self._sizes = np.concatenate([self._sizes, np.array(new_sizes, dtype=np.int32)])
+        return added
+
+    def add_frame(self, frame: pd.DataFrame) -> int:
+        """add() for a DataFrame with vessel_master columns (e.g. vessel_records.clean_vessels output)"""
+        columns = ['vessel_name', 'mmsi', 'imo', 'ship_type']
+        frame = frame.reindex(columns=columns)
+        values = [frame[c].to_numpy(dtype=object, na_value=None).tolist() for c in columns]
+        return self.add(dict(zip(columns, row)) for row in zip(*values))
+
+    def _result(self, slot: int, confidence: float) -> dict:
+        return dict(self.rows[slot], vessel_name=self.names[slot], confidence=round(float(confidence), 3))
+
+    def candidates(self, name: str, limit: int = 5, min_score: float = MIN_SCORE) -> list:
+        """Best trigram matches for a name, highest Dice score first"""
+        key = canonical_name(name)
+        query = trigrams(key)
+        grams = [self._gram_ids[g] for g in query if g in self._gram_ids]
+        if not key or not grams:
+            return []
+        hits = np.concatenate([self._arrays[g] for g in grams])
+        shared = np.bincount(hits, minlength=len(self.names))
+        # Score per posting hit (a name appears once per shared trigram) rather than scanning all names
+        scores = 2.0 * shared[hits] / (len(query) + self._sizes[hits])
+        keep = scores >= min_score
+        slots, scores = hits[keep], scores[keep]
+        slots, first = np.unique(slots, return_index=True)
+        scores = scores[first]
+        if len(slots) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            slots, scores = slots[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return [self._result(int(slots[i]), scores[i]) for i in order]
+
+    def resolve(self, name: str, min_score: float = MIN_SCORE) -> dict:
+        """
+        Best match for a booking's vessel name with a 0-1 confidence, or None.
+        'accepted' is True for exact, canonical and spacing-only matches and for
+        fuzzy matches that clear AUTO_ACCEPT_SCORE with AUTO_ACCEPT_MARGIN over the
+        runner-up; anything else is only a suggestion for someone to review.
+        """
+        upper = str(name or '').strip().upper()
+        if upper in self._ids:
+            return dict(self._result(self._ids[upper], 1.0), accepted=True)
+        key = canonical_name(upper)
+        if key in self._canonical:
+            return dict(self._result(self._canonical[key], CANONICAL_CONFIDENCE), accepted=True)
+        if key.replace(' ', '') in self._compact:
+            return dict(self._result(self._compact[key.replace(' ', '')], COMPACT_CONFIDENCE), accepted=True)
+        found = self.candidates(key, limit=2, min_score=min_score)
+        if not found:
+            return None
+        best = found[0]
+        runner_up = found[1]['confidence'] if len(found) > 1 else 0.0
+        best['accepted'] = best['confidence'] >= AUTO_ACCEPT_SCORE and best['confidence'] - runner_up >= AUTO_ACCEPT_MARGIN
+        return best
+
+    def refresh(self, supabase, full: bool = False) -> int:
+        """Add vessel_master rows changed since the last load (all rows when full or never loaded)"""
+        since = None if full else self.synced_at
+        read, start, latest = 0, 0, None
+        while True:
+            query = supabase.table('vessel_master').select('vessel_name, mmsi, imo, ship_type, updated_at')
+            if since:
+                query = query.gt('updated_at', since)
+            page = query.order('vessel_name').range(start, start + PAGE_SIZE - 1).execute().data or []
+            self.add(page)
+            read += len(page)
+            stamps = [r['updated_at'] for r in page if r.get('updated_at')]
+            if stamps:
+                page_latest = max(pd.to_datetime(stamps, utc=True, format='ISO8601'))
+                latest = page_latest if latest is None else max(latest, page_latest)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        if latest is not None:
+            self.synced_at = latest.isoformat()
+        return read
+
+    def fetch_candidates(self, supabase, names, clock=time.monotonic) -> int:
+        """
+        Pull the vessel_master rows containing any word of names (CANDIDATE_MIN_WORD
+        characters or more; the longest word when none is that long), in one
+        or=(...ilike...) query per CANDIDATE_WORDS_PER_QUERY words. Words fetched
+        within REFRESH_S are skipped. Returns rows read.
+        """
+        now = clock()
+        words = set()
+        for name in names:
+            tokens = canonical_name(name).split()
+            if not tokens:
+                continue
+            long_words = [t for t in tokens if len(t) >= CANDIDATE_MIN_WORD] or [max(tokens, key=len)]
+            words.update(w for w in long_words if now - self._fetched_words.get(w, -REFRESH_S) >= REFRESH_S)
+        if supabase is None or not words:
+            return 0
+        words = sorted(words)
+        read = 0
+        for k in range(0, len(words), CANDIDATE_WORDS_PER_QUERY):
+            chunk = words[k:k + CANDIDATE_WORDS_PER_QUERY]
+            pattern = ','.join(f'vessel_name.ilike.*{w}*' for w in chunk)
+            for page_no in range(CANDIDATE_MAX_PAGES):
+                start = page_no * PAGE_SIZE
+                page = (supabase.table('vessel_master').select('vessel_name, mmsi, imo, ship_type').or_(pattern)
+                        .order('vessel_name').range(start, start + PAGE_SIZE - 1).execute().data or [])
+                self.add(page)
+                read += len(page)
+                if len(page) < PAGE_SIZE:
+                    break
+            for word in chunk:
+                self._fetched_words[word] = now
+        return read
+
+    @classmethod
+    def from_supabase(cls, supabase) -> "VesselNameIndex":
+        index = cls()
+        started = time.perf_counter()
+        index.refresh(supabase, full=True)
+        print(f"[vessel_name_index] Indexed {len(index)} vessels in {time.perf_counter() - started:.1f}s")
+        return index
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index() -> VesselNameIndex:
+    """
+    Process-wide VesselNameIndex, seeded from vessels_list.csv on first use (no
+    database calls); vessel_master rows are added through fetch_candidates.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            from vessel_lookup import VESSELS_CSV
+            from vessel_records import clean_vessels
+            _default_index = VesselNameIndex()
+            try:
+                _default_index.add_frame(clean_vessels(pd.read_csv(VESSELS_CSV, dtype=str)))
+            except Exception as e:
+                print(f"[vessel_name_index] Could not read {VESSELS_CSV}: {e}")
+        return _default_index
+
+
+def resolve_with_candidates(name: str, supabase=None, index: VesselNameIndex = None) -> dict:
+    """resolve() on the shared index, fetching vessel_master candidates first unless the match is already accepted"""
+    index = index or default_index()
+    match = index.resolve(name)
+    if match and match['accepted']:
+        return match
+    try:
+        if index.fetch_candidates(supabase, [name]):
+            match = index.resolve(name)
+    except Exception as e:
+        print(f"[vessel_name_index] Candidate fetch failed: {e}")
+    return match
@@ -0,0 +1,94 @@
+"""
+Vessel Record Normalization
+Vectorized cleaning of AIS vessel rows into vessel_master records, shared by
+noaa_ais_downloader.py and process_ais_data.upsert_to_vessel_master. Every
+column is normalized with pandas string ops over the whole block and each
+batch gets a single updated_at timestamp.
+"""
+
+import pandas as pd
+
+# vessel_master columns in record order
+RECORD_FIELDS = ('vessel_name', 'mmsi', 'imo', 'ship_type', 'updated_at')
+
+# ship_type used when the AIS row has no VesselType
+DEFAULT_SHIP_TYPE = 'Cargo'
+
+
+def _per_unique(values: pd.Series, clean) -> pd.Series:
+    """
+    Run a column cleaner on the distinct values only and broadcast the result back.
+    An AIS block repeats each vessel many times, so this does far fewer conversions.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    cleaned = clean(pd.Series(uniques, dtype=values.dtype if len(uniques) else object))
+    result = cleaned.take(codes)
+    result.index = values.index
+    return result
+
+
+def _clean_names(values: pd.Series) -> pd.Series:
+    """Stripped, upper-cased names; missing, blank and 'NAN' become <NA>"""
+    names = values.astype('string').str.strip().str.upper()
+    return names.mask(names.isin(['', 'NAN']))
+
+
+def _clean_mmsi(values: pd.Series) -> pd.Series:
+    """Integer MMSI strings (9.0e8 / '900000000.0' -> '900000000'); non-numeric values are kept as text"""
+    numeric = pd.to_numeric(values, errors='coerce')
+    as_int = numeric.round().astype('Int64').astype('string')
+    text = values.astype('string').str.strip()
+    return as_int.fillna(text.mask(text == ''))
+
+
+def _clean_imo(values: pd.Series) -> pd.Series:
+    """Digits of the IMO number ('IMO 9334567' -> '9334567'); empty results become <NA>"""
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.round().astype('Int64')
+    digits = (values.astype('string').str.upper()
+              .str.replace('IMO', '', regex=False)
+              .str.replace(r'\D', '', regex=True))
+    return digits.mask(digits == '')
+
+
+def _clean_ship_type(values: pd.Series) -> pd.Series:
+    """VesselType as text (as stored so far: '70.0' for float columns); missing -> DEFAULT_SHIP_TYPE"""
+    text = values.astype(str)
+    return text.where(values.notna(), DEFAULT_SHIP_TYPE)
+
+
+def clean_vessels(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize a block of vessel rows (mmsi / vessel_name / imo / ship_type columns).
+    Rows without a usable name or MMSI are dropped; the index is reset.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=['vessel_name', 'mmsi', 'imo', 'ship_type'])
+    missing = pd.Series(pd.NA, index=frame.index, dtype='object')
+    cleaners = {'vessel_name': _clean_names, 'mmsi': _clean_mmsi, 'imo': _clean_imo, 'ship_type': _clean_ship_type}
+    clean = pd.DataFrame({
+        name: _per_unique(frame[name] if name in frame else missing, cleaner)
+        for name, cleaner in cleaners.items()
+    })
+    keep = clean['vessel_name'].notna() & clean['mmsi'].notna()
+    return clean[keep].reset_index(drop=True)
+
+
+def vessel_records(frame: pd.DataFrame, updated_at: str = None) -> list:
+    """
+    vessel_master upsert payload for a block of vessel rows: cleaned, with one
+    updated_at shared by the whole batch and None in place of missing values.
+    """
+    return to_records(clean_vessels(frame), updated_at)
+
+
+def to_records(clean: pd.DataFrame, updated_at: str = None) -> list:
+    """Upsert payload for rows already passed through clean_vessels"""
+    if clean.empty:
+        return []
+    updated_at = updated_at or pd.Timestamp.now(tz='UTC').isoformat()
+    columns = [clean[c].to_numpy(dtype=object, na_value=None).tolist() for c in RECORD_FIELDS[:-1]]
+    return [
+        {'vessel_name': name, 'mmsi': mmsi, 'imo': imo, 'ship_type': ship_type, 'updated_at': updated_at}
+        for name, mmsi, imo, ship_type in zip(*columns)
+    ]
@@ -0,0 +1,153 @@
+"""
+vessel_master Change Detection
+Local snapshot of vessel_master as one content hash per vessel_name, so daily
+AIS runs upsert only new vessels and real field changes instead of re-sending
+every vessel seen that day with a fresh updated_at.
+
+The snapshot is refreshed incrementally from rows whose updated_at is newer
+than the last sync, and rows that have not changed can still be re-sent every
+heartbeat_days so updated_at keeps meaning "seen recently".
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'vessel_master_snapshot.json')
+
+# Fields whose change triggers an upsert (vessel_name is the key, updated_at is ours)
+HASHED_FIELDS = ('mmsi', 'imo', 'ship_type')
+
+# Re-send unchanged vessels after this many days (0 disables the heartbeat)
+HEARTBEAT_DAYS = 7
+
+# PostgREST page size for refreshes
+PAGE_SIZE = 1000
+
+
+def content_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """Vectorized uint64 hash of HASHED_FIELDS per row (missing values hash like '')"""
+    values = pd.DataFrame({
+        f: (frame[f] if f in frame else pd.Series(pd.NA, index=frame.index)).astype('string').fillna('')
+        for f in HASHED_FIELDS
+    })
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class VesselSnapshot:
+    """
+    vessel_name -> (content hash, last time we sent it), held as a DataFrame indexed by name.
+
+        snapshot = VesselSnapshot.load()
+        snapshot.refresh(supabase)
+        mask = snapshot.changed(clean)      # rows worth upserting
+        ...upsert clean[mask]...
+        snapshot.mark_sent(clean[mask])
+        snapshot.save()
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.synced_at = None
+        self.table = pd.DataFrame({'hash': pd.Series(dtype=np.uint64), 'last_sent': pd.Series(dtype=np.int64)})
+        self.table.index.name = 'vessel_name'
+
+    def __len__(self):
+        return len(self.table)
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_PATH) -> "VesselSnapshot":
+        """Read the snapshot file; a missing or unreadable file gives an empty snapshot"""
+        snapshot = cls(path)
+        if not os.path.exists(path):
+            return snapshot
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            snapshot.synced_at = data.get('synced_at')
+            snapshot.table = pd.DataFrame({
+                'hash': np.array([int(h, 16) for h in data['hashes']], dtype=np.uint64),
+                'last_sent': np.array(data['last_sent'], dtype=np.int64),
+            }, index=pd.Index(data['names'], name='vessel_name'))
+        except Exception as e:
+            print(f"  [Warning] Ignoring unreadable vessel snapshot ({e}); starting empty")
+            snapshot = cls(path)
+        return snapshot
+
+    def save(self):
+        """Atomic write (temp file + rename)"""
+        data = {
+            'synced_at': self.synced_at,
+            'names': self.table.index.tolist(),
+            'hashes': [format(int(h), 'x') for h in self.table['hash'].to_numpy()],
+            'last_sent': self.table['last_sent'].tolist(),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _merge(self, names, hashes, last_sent):
+        update = pd.DataFrame({'hash': hashes, 'last_sent': last_sent}, index=pd.Index(names, name='vessel_name'))
+        update = update[~update.index.duplicated(keep='last')]
+        self.table = pd.concat([self.table[~self.table.index.isin(update.index)], update])
+
+    def refresh(self, supabase, full: bool = False) -> int:
+        """
+        Pull vessel_master rows changed since the last sync (all rows when full or
+        never synced). Rows written by anyone else since then are picked up, so a
+        manual fix is not mistaken for "unchanged". Returns rows read.
+        """
+        since = None if full else self.synced_at
+        if full:
+            self.table = self.table.iloc[0:0]
+        rows, start = [], 0
+        while True:
+            query = supabase.table('vessel_master').select('vessel_name, mmsi, imo, ship_type, updated_at')
+            if since:
+                query = query.gt('updated_at', since)
+            page = query.order('vessel_name').range(start, start + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        if not rows:
+            return 0
+
+        frame = pd.DataFrame(rows)
+        # Rows read back from the table count as sent at their own updated_at
+        stamps = pd.to_datetime(frame['updated_at'], utc=True, errors='coerce', format='ISO8601')
+        sent = (stamps.astype('int64') // 10**9).where(stamps.notna(), 0).to_numpy(dtype=np.int64)
+        self._merge(frame['vessel_name'].astype(str).str.strip().str.upper().to_numpy(), content_hashes(frame), sent)
+        latest = stamps.max()
+        if pd.notna(latest):
+            self.synced_at = latest.isoformat()
+        return len(rows)
+
+    def changed(self, clean: pd.DataFrame, heartbeat_days: float = HEARTBEAT_DAYS, now: float = None) -> np.ndarray:
+        """
+        Boolean mask over cleaned vessel rows (see vessel_records.clean_vessels):
+        True for new vessels, changed fields, or a heartbeat that is due.
+        """
+        if clean.empty:
+            return np.zeros(0, dtype=bool)
+        pos = self.table.index.get_indexer(clean['vessel_name'])
+        known = pos >= 0
+        hashes = content_hashes(clean)
+        flags = ~known
+        flags[known] |= hashes[known] != self.table['hash'].to_numpy()[pos[known]]
+        if heartbeat_days and heartbeat_days > 0:
+            now = time.time() if now is None else now
+            last_sent = self.table['last_sent'].to_numpy()[pos[known]]
+            flags[known] |= last_sent < now - heartbeat_days * 86400
+        return flags
+
+    def mark_sent(self, clean: pd.DataFrame, now: float = None):
+        """Record rows as written with their current content"""
+        if clean.empty:
+            return
+        now = int(time.time() if now is None else now)
+        self._merge(clean['vessel_name'].to_numpy(), content_hashes(clean), np.full(len(clean), now, dtype=np.int64))